@@ -22,7 +22,7 @@ class Token(BaseModel):
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     # 查找用户
     statement = select(User).where(User.username == form_data.username)
@@ -54,7 +54,7 @@ async def login(
 # 获取当前用户
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     from jose import JWTError, jwt
     
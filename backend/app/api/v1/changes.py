@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_read_db
+from app.crud.change import get_changes_async
+from app.schemas.change import ChangeFeedResponse
+
+router = APIRouter()
+
+@router.get("/", response_model=ChangeFeedResponse)
+async def read_changes(
+    since: int = Query(0, ge=0, description="上次同步返回的next_since，首次同步为0"), 
+    limit: int = Query(100, ge=1, le=1000), 
+    entity: str | None = Query(None, description="只返回该类实体的变更：product / warehouse / inventory"), 
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    获取增量变更，用于下游系统同步商品、仓库和库存
+    删除的实体以墓碑返回（op为delete，data为空）；游标早于已清理的变更时返回410，需要全量同步后从最新序号继续
+    """
+    try:
+        return await get_changes_async(db=db, since=since, limit=limit, entity=entity)
+    except ValueError as e:
+        status_code = 410 if str(e) == "Change feed cursor expired" else 400
+        raise HTTPException(status_code=status_code, detail=str(e))
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException
+from app.jobs import handlers  # noqa: F401  注册任务类型
+from app.jobs.queue import job_queue, job_to_dict
+from app.jobs.registry import get_job_type, job_types
+from app.schemas.job import JobCreate, JobResponse
+
+router = APIRouter()
+
+@router.post("/", response_model=JobResponse, status_code=202)
+async def submit_job(job_in: JobCreate):
+    """提交后台任务，立即返回任务ID，之后通过 GET /jobs/{id} 查询进度和结果"""
+    if get_job_type(job_in.type) is None:
+        raise HTTPException(status_code=400, detail=f"Unknown job type, expected one of: {', '.join(job_types())}")
+    job = await job_queue.submit(job_in.type, job_in.params)
+    return job_to_dict(job)
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def read_job(job_id: str):
+    """查询任务状态、进度和结果（结果在任务结束后保留 JOB_RESULT_TTL 秒）"""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+@router.post("/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """取消任务：排队中的任务立即取消，运行中的任务在下次心跳时中断"""
+    try:
+        job = await job_queue.request_cancel(job_id)
+    except ValueError as e:
+        status_code = 404 if str(e) == "Job not found" else 409
+        raise HTTPException(status_code=status_code, detail=str(e))
+    return job_to_dict(job)
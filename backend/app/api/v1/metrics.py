@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from app.core.cache import cache
+from app.core import idempotency
+from app.core.singleflight import single_flight_stats
+
+router = APIRouter()
+
+@router.get("/")
+async def read_metrics():
+    """当前工作进程的运行指标（每个工作进程单独统计）"""
+    return {
+        "single_flight": single_flight_stats(),
+        "cache": cache.stats(),
+        "idempotency": idempotency.stats.as_dict(),
+    }
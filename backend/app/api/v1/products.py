@@ -1,40 +1,52 @@
+from typing import Literal
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_async_db
+from app.core.database import get_async_db, get_async_read_db
+from app.core.dataloader import batch_ids
+from app.core.idempotency import IdempotentRoute
 from app.crud.product import (
     # 商品相关
-    create_product_async, get_product_async, get_products_async, update_product_async, delete_product_async,
+    create_product_async, get_product_cached_async, get_products_cached_async, update_product_async, delete_product_async,
     # 仓库相关
-    create_warehouse_async, get_warehouse_async, get_warehouses_async, update_warehouse_async, delete_warehouse_async,
+    create_warehouse_async, get_warehouse_cached_async, get_warehouses_cached_async, update_warehouse_async, delete_warehouse_async,
     # 库存相关
     create_inventory_async, get_inventory_async, get_inventories_async, update_inventory_async, delete_inventory_async,
-    update_inventory_quantity_async
+    update_inventory_quantity_async, get_low_stock_items_async, set_inventory_shards_async, transfer_inventory_async,
+    # 按ID批量获取
+    get_products_by_ids_async, get_warehouses_by_ids_async, get_inventories_by_ids_async,
+    # 批量删除
+    delete_products_async, delete_warehouses_async, delete_inventories_async
 )
+from app.crud.pricing import bulk_update_prices_async, apply_price_list_async
 from app.schemas.product import (
     ProductCreate, ProductUpdate, ProductResponse,
     WarehouseCreate, WarehouseUpdate, WarehouseResponse,
-    InventoryCreate, InventoryUpdate, InventoryResponse
+    InventoryCreate, InventoryUpdate, InventoryResponse,
+    LowStockItemResponse, TransferCreate, TransferOrderCreate, TransferResponse,
+    BulkPriceUpdate, PriceListUpdate, BulkPriceResult,
+    ProductBulkDelete, WarehouseBulkDelete, InventoryBulkDelete, BulkDeleteResult
 )
 
-router = APIRouter()
+# 写接口支持 Idempotency-Key 请求头，客户端重试时返回首次的响应，不会重复入库或创建
+router = APIRouter(route_class=IdempotentRoute)
 
 # 商品相关API
 
 @router.post("/", response_model=ProductResponse)
 async def create_new_product(
     product: ProductCreate, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """创建新商品"""
     return await create_product_async(db=db, product=product)
 
-@router.get("/{product_id}", response_model=ProductResponse)
+@router.get("/{product_id:int}", response_model=ProductResponse)
 async def read_product(
     product_id: int, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """根据ID获取商品"""
-    product = await get_product_async(db=db, product_id=product_id)
+    product = await get_product_cached_async(db=db, product_id=product_id)
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
@@ -43,35 +55,74 @@ async def read_product(
 async def read_products(
     skip: int = Query(0, ge=0, le=1000, description="跳过的记录数"), 
     limit: int = Query(100, ge=10, le=1000, description="返回的记录数"), 
-    db: AsyncSession = Depends(get_async_db)
+    ids: list[int] | None = Depends(batch_ids), 
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取商品列表，支持分页"""
-    result = await get_products_async(db=db, skip=skip, limit=limit)
-    return result["items"]
+    """获取商品列表，支持分页；指定ids时按给定顺序批量获取"""
+    if ids is not None:
+        return await get_products_by_ids_async(db=db, ids=ids)
+    return await get_products_cached_async(db=db, skip=skip, limit=limit)
 
-@router.put("/{product_id}", response_model=ProductResponse)
+@router.put("/{product_id:int}", response_model=ProductResponse)
 async def update_existing_product(
     product_id: int, 
     product: ProductUpdate, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """更新商品信息"""
     return await update_product_async(db=db, product_id=product_id, product=product)
 
-@router.delete("/{product_id}")
+@router.delete("/{product_id:int}")
 async def delete_existing_product(
     product_id: int, 
-    db: AsyncSession = Depends(get_async_db)
+    on_inventory: Literal["block", "cascade"] = Query("block", description="商品仍有库存时拒绝删除（block）或一并删除库存（cascade）"), 
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """删除商品"""
-    return await delete_product_async(db=db, product_id=product_id)
+    try:
+        return await delete_product_async(db=db, product_id=product_id, on_inventory=on_inventory)
+    except ValueError as e:
+        raise HTTPException(status_code=404 if str(e) == "Product not found" else 400, detail=str(e))
+
+@router.post("/bulk-delete", response_model=BulkDeleteResult)
+async def bulk_delete_products(
+    request: ProductBulkDelete, 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """按类别、编码前缀或商品ID列表批量删除商品，分批提交"""
+    try:
+        return await delete_products_async(db=db, product_filter=request.filter, on_inventory=request.on_inventory)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/bulk-update", response_model=BulkPriceResult)
+async def bulk_update_prices(
+    request: BulkPriceUpdate, 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """按类别、编码前缀或商品ID列表批量调整售价和成本（百分比、固定金额或指定值）"""
+    try:
+        return await bulk_update_prices_async(db=db, request=request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/price-list", response_model=BulkPriceResult)
+async def apply_price_list(
+    price_list: PriceListUpdate, 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """按价目表批量设置售价和成本，不存在的商品在结果中列出"""
+    try:
+        return await apply_price_list_async(db=db, items=price_list.items)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # 仓库相关API
 
 @router.post("/warehouses", response_model=WarehouseResponse)
 async def create_new_warehouse(
     warehouse: WarehouseCreate, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """创建新仓库"""
     return await create_warehouse_async(db=db, warehouse=warehouse)
@@ -79,10 +130,10 @@ async def create_new_warehouse(
 @router.get("/warehouses/{warehouse_id}", response_model=WarehouseResponse)
 async def read_warehouse(
     warehouse_id: int, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """根据ID获取仓库"""
-    warehouse = await get_warehouse_async(db=db, warehouse_id=warehouse_id)
+    warehouse = await get_warehouse_cached_async(db=db, warehouse_id=warehouse_id)
     if warehouse is None:
         raise HTTPException(status_code=404, detail="Warehouse not found")
     return warehouse
@@ -91,17 +142,19 @@ async def read_warehouse(
 async def read_warehouses(
     skip: int = Query(0, ge=0, le=1000, description="跳过的记录数"), 
     limit: int = Query(100, ge=10, le=1000, description="返回的记录数"), 
-    db: AsyncSession = Depends(get_async_db)
+    ids: list[int] | None = Depends(batch_ids), 
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取仓库列表，支持分页"""
-    result = await get_warehouses_async(db=db, skip=skip, limit=limit)
-    return result["items"]
+    """获取仓库列表，支持分页；指定ids时按给定顺序批量获取"""
+    if ids is not None:
+        return await get_warehouses_by_ids_async(db=db, ids=ids)
+    return await get_warehouses_cached_async(db=db, skip=skip, limit=limit)
 
 @router.put("/warehouses/{warehouse_id}", response_model=WarehouseResponse)
 async def update_existing_warehouse(
     warehouse_id: int, 
     warehouse: WarehouseUpdate, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """更新仓库信息"""
     return await update_warehouse_async(db=db, warehouse_id=warehouse_id, warehouse=warehouse)
@@ -109,25 +162,55 @@ async def update_existing_warehouse(
 @router.delete("/warehouses/{warehouse_id}")
 async def delete_existing_warehouse(
     warehouse_id: int, 
-    db: AsyncSession = Depends(get_async_db)
+    on_inventory: Literal["block", "cascade", "nullify"] = Query("nullify", description="仓库仍有库存时拒绝删除、一并删除库存或解除关联"), 
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """删除仓库"""
-    return await delete_warehouse_async(db=db, warehouse_id=warehouse_id)
+    try:
+        return await delete_warehouse_async(db=db, warehouse_id=warehouse_id, on_inventory=on_inventory)
+    except ValueError as e:
+        raise HTTPException(status_code=404 if str(e) == "Warehouse not found" else 400, detail=str(e))
+
+@router.post("/warehouses/bulk-delete", response_model=BulkDeleteResult)
+async def bulk_delete_warehouses(
+    request: WarehouseBulkDelete, 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """按ID列表批量删除仓库，分批提交"""
+    try:
+        return await delete_warehouses_async(db=db, warehouse_ids=request.ids, on_inventory=request.on_inventory)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # 库存相关API
 
 @router.post("/inventories", response_model=InventoryResponse)
 async def create_new_inventory(
     inventory: InventoryCreate, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """创建新库存"""
-    return await create_inventory_async(db=db, inventory=inventory)
+    try:
+        return await create_inventory_async(db=db, inventory=inventory)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# 必须声明在 /inventories/{inventory_id} 之前，否则会被当作库存ID匹配
+@router.get("/inventories/low-stock", response_model=list[LowStockItemResponse])
+async def read_low_stock_items(
+    skip: int = Query(0, ge=0, description="跳过的记录数"), 
+    limit: int = Query(100, ge=1, le=1000, description="返回的记录数"), 
+    warehouse_id: int | None = Query(None, description="只返回该仓库的记录"), 
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """获取低于补货点、需要补货的库存列表"""
+    result = await get_low_stock_items_async(db=db, skip=skip, limit=limit, warehouse_id=warehouse_id)
+    return result["items"]
 
 @router.get("/inventories/{inventory_id}", response_model=InventoryResponse)
 async def read_inventory(
     inventory_id: int, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """根据ID获取库存"""
     inventory = await get_inventory_async(db=db, inventory_id=inventory_id)
@@ -139,9 +222,12 @@ async def read_inventory(
 async def read_inventories(
     skip: int = Query(0, ge=0, le=1000, description="跳过的记录数"), 
     limit: int = Query(100, ge=10, le=1000, description="返回的记录数"), 
-    db: AsyncSession = Depends(get_async_db)
+    ids: list[int] | None = Depends(batch_ids), 
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取库存列表，支持分页"""
+    """获取库存列表，支持分页；指定ids时按给定顺序批量获取"""
+    if ids is not None:
+        return await get_inventories_by_ids_async(db=db, ids=ids)
     result = await get_inventories_async(db=db, skip=skip, limit=limit)
     return result["items"]
 
@@ -149,18 +235,44 @@ async def read_inventories(
 async def update_existing_inventory(
     inventory_id: int, 
     inventory: InventoryUpdate, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """更新库存信息"""
-    return await update_inventory_async(db=db, inventory_id=inventory_id, inventory=inventory)
+    try:
+        return await update_inventory_async(db=db, inventory_id=inventory_id, inventory=inventory)
+    except ValueError as e:
+        raise HTTPException(status_code=404 if str(e) == "Inventory not found" else 400, detail=str(e))
+
+@router.put("/inventories/{inventory_id}/shards", response_model=InventoryResponse)
+async def update_inventory_shards(
+    inventory_id: int, 
+    count: int = Query(..., ge=1, le=64, description="数量分片数，1表示取消分片"), 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """设置热门商品库存的数量分片数，出入库分散到多个分片以减少行锁争用"""
+    try:
+        return await set_inventory_shards_async(db=db, inventory_id=inventory_id, shard_count=count)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 @router.delete("/inventories/{inventory_id}")
 async def delete_existing_inventory(
     inventory_id: int, 
-    db: AsyncSession = Depends(get_async_db)
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """删除库存"""
-    return await delete_inventory_async(db=db, inventory_id=inventory_id)
+    try:
+        return await delete_inventory_async(db=db, inventory_id=inventory_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/inventories/bulk-delete", response_model=BulkDeleteResult)
+async def bulk_delete_inventories(
+    request: InventoryBulkDelete, 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """按ID列表批量删除库存，分批提交"""
+    return await delete_inventories_async(db=db, inventory_ids=request.ids)
 
 # 库存操作API（入库/出库）
 
@@ -168,11 +280,14 @@ async def delete_existing_inventory(
 async def inventory_inbound(
     product_id: int, 
     quantity: int = Query(..., ge=1, description="入库数量"), 
-    db: AsyncSession = Depends(get_async_db)
+    warehouse_id: int | None = Query(None, description="仓库ID，商品在多个仓库有库存时必须指定"),
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """商品入库"""
     try:
-        return await update_inventory_quantity_async(db=db, product_id=product_id, quantity_change=quantity)
+        return await update_inventory_quantity_async(
+            db=db, product_id=product_id, quantity_change=quantity, warehouse_id=warehouse_id
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -180,10 +295,37 @@ async def inventory_inbound(
 async def inventory_outbound(
     product_id: int, 
     quantity: int = Query(..., ge=1, description="出库数量"), 
-    db: AsyncSession = Depends(get_async_db)
+    warehouse_id: int | None = Query(None, description="仓库ID，商品在多个仓库有库存时必须指定"),
+    db: AsyncSession = Depends(get_async_db, scope="function")
 ):
     """商品出库"""
     try:
-        return await update_inventory_quantity_async(db=db, product_id=product_id, quantity_change=-quantity)
+        return await update_inventory_quantity_async(
+            db=db, product_id=product_id, quantity_change=-quantity, warehouse_id=warehouse_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# 库存调拨API
+
+@router.post("/inventories/transfer", response_model=TransferResponse)
+async def transfer_inventory(
+    transfer: TransferCreate, 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """在仓库之间调拨库存，源库存减少和目标库存增加在同一事务中完成"""
+    try:
+        return await transfer_inventory_async(db=db, transfers=[transfer])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/inventories/transfers", response_model=TransferResponse)
+async def transfer_inventory_order(
+    order: TransferOrderCreate, 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """执行整张调拨单，所有行在同一事务中生效，任一行库存不足则整单不生效"""
+    try:
+        return await transfer_inventory_async(db=db, transfers=order.lines)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
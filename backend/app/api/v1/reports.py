@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_read_db
+from app.crud.report import get_valuation_report_async
+from app.schemas.report import ValuationReport
+
+router = APIRouter()
+
+@router.get("/valuation", response_model=ValuationReport, response_model_exclude_none=True)
+async def read_valuation_report(
+    a_share: float = Query(0.8, description="A类商品的累计金额占比上限"), 
+    b_share: float = Query(0.95, description="B类商品的累计金额占比上限"), 
+    detail: bool = Query(False, description="是否包含仓库和类别组合的汇总"), 
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """库存估值报表：按仓库和类别汇总库存金额与毛利，并按库存金额做ABC分类"""
+    try:
+        return await get_valuation_report_async(db=db, a_share=a_share, b_share=b_share, detail=detail)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db, get_async_read_db
+from app.core.reservations import reservation_product_id
+from app.crud.reservation import (
+    create_reservation_async, confirm_reservation_async, release_reservation_async, get_availability_async
+)
+from app.schemas.reservation import (
+    ReservationCreate, ReservationResponse, ReservationStatusResponse, AvailabilityResponse
+)
+
+router = APIRouter()
+
+def _http_error(e: ValueError) -> HTTPException:
+    status_code = 404 if str(e).endswith("not found") else 400
+    return HTTPException(status_code=status_code, detail=str(e))
+
+@router.post("/", response_model=ReservationResponse)
+async def create_reservation(
+    reservation: ReservationCreate, 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """预留库存（到期未确认自动释放）"""
+    try:
+        return await create_reservation_async(db=db, reservation=reservation)
+    except ValueError as e:
+        raise _http_error(e)
+
+@router.post("/{reservation_id}/confirm", response_model=ReservationStatusResponse)
+async def confirm_reservation(reservation_id: str):
+    """确认预留，确认的数量随后批量扣减库存"""
+    try:
+        entry = await confirm_reservation_async(reservation_id)
+    except ValueError as e:
+        raise _http_error(e)
+    return {"id": reservation_id, "product_id": entry.product_id, "quantity": entry.quantity, "status": "confirmed"}
+
+@router.post("/{reservation_id}/release", response_model=ReservationStatusResponse)
+async def release_reservation(reservation_id: str):
+    """释放预留"""
+    try:
+        quantity = await release_reservation_async(reservation_id)
+    except ValueError as e:
+        raise _http_error(e)
+    return {"id": reservation_id, "product_id": reservation_product_id(reservation_id), "quantity": quantity, "status": "released"}
+
+@router.get("/availability/{product_id}", response_model=AvailabilityResponse)
+async def read_availability(
+    product_id: int, 
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """获取商品的可承诺量（库存数量减去有效预留和尚未扣减的确认）"""
+    try:
+        return await get_availability_async(db=db, product_id=product_id)
+    except ValueError as e:
+        raise _http_error(e)
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.crud.stocktake import reconcile_stocktake_async
+from app.schemas.stocktake import StocktakeReport
+
+router = APIRouter()
+
+@router.post("/", response_model=StocktakeReport)
+async def reconcile_stocktake(
+    request: Request, 
+    dry_run: bool = Query(False, description="只计算差异，不调整库存"), 
+    db: AsyncSession = Depends(get_async_db, scope="function")
+):
+    """
+    提交盘点表（CSV请求体，流式读取），按盘点数量调整库存并返回差异报表
+    表头：product_id 或 product_code、warehouse_id（可选）、quantity
+    """
+    try:
+        return await reconcile_stocktake_async(db=db, chunks=request.stream(), dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,49 @@
+import asyncio
+import json
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.events import event_hub
+
+router = APIRouter()
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+@router.get("/inventory")
+async def stream_inventory(
+    warehouse_id: list[int] | None = Query(None, description="只接收这些仓库的事件"), 
+    product_id: list[int] | None = Query(None, description="只接收这些商品的事件")
+):
+    """
+    库存变更事件流（Server-Sent Events）
+    连接不占用数据库连接，空闲时定期发送心跳；事件积压时发送resync事件，客户端应重新拉取列表
+    """
+    subscriber = event_hub.subscribe(
+        set(warehouse_id) if warehouse_id else None,
+        set(product_id) if product_id else None,
+    )
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=settings.event_stream_heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:  # 应用关闭
+                    break
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    yield _sse("resync", {})
+                yield _sse("inventory", event)
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_async_db
+from app.core.database import get_async_db, get_async_read_db
+from app.core.dataloader import batch_ids
 from app.crud.user import (
-    create_user_async, get_user_async, get_users_async, update_user_async, delete_user_async
+    create_user_async, get_user_async, get_users_async, get_users_by_ids_async, update_user_async, delete_user_async
 )
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
 from app.core.redis import get_redis_client
@@ -12,11 +13,11 @@ router = APIRouter()
 
 # 异步路由（性能优化）
 @router.post("/", response_model=UserResponse)
-async def create_new_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+async def create_new_user(user: UserCreate, db: AsyncSession = Depends(get_async_db, scope="function")):
     return await create_user_async(db=db, user=user)
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def read_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+async def read_user(user_id: int, db: AsyncSession = Depends(get_async_read_db)):
     db_user = await get_user_async(db=db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
@@ -26,15 +27,19 @@ async def read_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
 async def read_users(
     skip: int = Query(0, ge=0, le=1000, description="跳过的记录数"), 
     limit: int = Query(100, ge=10, le=1000, description="返回的记录数"), 
-    db: AsyncSession = Depends(get_async_db)
+    ids: list[int] | None = Depends(batch_ids), 
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取用户列表，支持分页"""
-    return await get_users_async(db=db, skip=skip, limit=limit)
+    """获取用户列表，支持分页；指定ids时按给定顺序批量获取"""
+    if ids is not None:
+        return await get_users_by_ids_async(db=db, ids=ids)
+    result = await get_users_async(db=db, skip=skip, limit=limit)
+    return result["items"]
 
 @router.put("/{user_id}", response_model=UserResponse)
-async def update_existing_user(user_id: int, user: UserUpdate, db: AsyncSession = Depends(get_async_db)):
+async def update_existing_user(user_id: int, user: UserUpdate, db: AsyncSession = Depends(get_async_db, scope="function")):
     return await update_user_async(db=db, user_id=user_id, user=user)
 
 @router.delete("/{user_id}")
-async def delete_existing_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+async def delete_existing_user(user_id: int, db: AsyncSession = Depends(get_async_db, scope="function")):
     return await delete_user_async(db=db, user_id=user_id)
\ No newline at end of file
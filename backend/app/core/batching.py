@@ -0,0 +1,78 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+from app.core.logger import logger
+
+class GroupCommitBatcher:
+    """
+    组提交批处理器
+    将短时间内到达的多个写操作合并到同一个事务中提交，减少事务提交（fsync）次数。
+    每个调用方仍然得到各自的结果或异常。
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[list], Awaitable[list]],
+        max_delay_ms: float = 5.0,
+        max_batch_size: int = 100,
+    ):
+        """
+        :param handler: 批处理函数，接收一批操作，按顺序返回每个操作的结果（异常实例表示该操作失败）
+        :param max_delay_ms: 第一个操作到达后最多等待的时间（毫秒）
+        :param max_batch_size: 单个批次的最大操作数，达到后立即提交
+        """
+        self.handler = handler
+        self.max_delay_ms = max_delay_ms
+        self.max_batch_size = max_batch_size
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flush_lock = asyncio.Lock()  # 批次按到达顺序依次提交
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """提交一个操作，等待其所在批次提交后返回结果"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay_ms / 1000, self._schedule_flush)
+
+        return await future
+
+    def _schedule_flush(self):
+        """取出待处理操作并在后台提交"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = asyncio.ensure_future(self._flush(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch: list[tuple[Any, asyncio.Future]]):
+        """执行一个批次并把结果分发给各调用方"""
+        async with self._flush_lock:
+            try:
+                results = await self.handler([item for item, _ in batch])
+            except Exception as e:
+                logger.exception("Group commit batch failed")
+                results = [e] * len(batch)
+
+            for (_, future), result in zip(batch, results):
+                if future.done():  # 调用方已取消
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def drain(self):
+        """提交所有待处理操作并等待完成（用于应用关闭）"""
+        self._schedule_flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
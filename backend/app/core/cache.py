@@ -0,0 +1,297 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core import redis as redis_core
+from app.core.logger import logger
+
+# 两级缓存：进程内LRU（本地层）在前，Redis（共享层）在后
+# 写操作在会话中登记失效，事务提交时立即清除本进程的本地缓存，
+# 提交后删除Redis中的缓存并通过发布订阅通知其他工作进程清除本地缓存。
+# 通知丢失（如Redis断开）时，本地缓存最长在 cache_local_ttl 秒后过期；
+# 读取与写入并发时，Redis中的旧数据最长保留 cache_redis_ttl 秒。
+
+_PENDING_KEY = "pending_cache_invalidations"
+_COMMITTED_KEY = "committed_cache_invalidations"
+_REDIS_PREFIX = "ims:cache"
+_REDIS_RETRY_INTERVAL = 5.0  # Redis不可用后跳过共享层的时间（秒）
+_MAX_INVALIDATION_IDS = 1000  # 一次登记的实体ID超过该数量时改为清除整个命名空间
+
+class LocalCache:
+    """按字节数限制大小的LRU缓存，条目带过期时间；大小按JSON序列化后的长度估算"""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()  # 键 -> (过期时间, 字节数, 值)
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[2]
+
+    def set(self, key: str, value: Any, size: int):
+        if size > self.max_bytes // 8:  # 过大的值只放在共享层，避免挤掉大量小条目
+            return
+        self._remove(key)
+        while self._entries and self.bytes + size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self.bytes += size
+
+    def evict(self, key: str):
+        self._remove(key)
+
+    def evict_prefix(self, prefix: str):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def _dump(value: Any, schema: type[BaseModel] | None) -> Any:
+    """把查询结果转换为可JSON序列化的数据"""
+    if value is None or schema is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [schema.model_validate(item).model_dump(mode="json") for item in value]
+    return schema.model_validate(value).model_dump(mode="json")
+
+class TwoTierCache:
+    """
+    按命名空间组织的两级缓存，命名空间对应一类实体（如product）
+    键为 命名空间:实体ID 或 命名空间:list:参数，实体变更时清除该实体的键和该命名空间的所有列表
+    """
+
+    def __init__(self):
+        self.local = LocalCache(settings.cache_local_max_bytes, settings.cache_local_ttl)
+        self._origin = uuid.uuid4().hex  # 本进程发出的通知不重复处理
+        self._generations: dict[str, int] = {}  # 命名空间 -> 失效次数，加载期间发生失效时不写入缓存
+        self._redis_down_until = 0.0
+        self._redis_failing = False
+        self._listener: asyncio.Task | None = None
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get_or_load(
+        self, namespace: str, key: Hashable, load: Callable[[], Awaitable[Any]], schema: type[BaseModel] | None = None
+    ) -> Any:
+        """
+        读取缓存，未命中时调用load从数据库加载
+        :param load: 无参数的异步函数，返回ORM对象、ORM对象列表或None
+        :param schema: 响应结构，用于把ORM对象转换为可缓存的数据
+        """
+        if not settings.cache_enabled:
+            return _dump(await load(), schema)
+        self._ensure_listener()
+        cache_key = f"{namespace}:{key}"
+        hit, value = self.local.get(cache_key)
+        if hit:
+            self.local_hits += 1
+            return value
+
+        generation = self._generations.get(namespace, 0)
+        raw = await self._redis_get(cache_key)
+        if raw is not None:
+            self.redis_hits += 1
+            value = json.loads(raw)
+        else:
+            self.misses += 1
+            value = _dump(await load(), schema)
+            raw = json.dumps(value, separators=(",", ":"))
+            if self._generations.get(namespace, 0) == generation:
+                await self._redis_set(namespace, cache_key, raw)
+        if self._generations.get(namespace, 0) == generation:
+            self.local.set(cache_key, value, len(raw))
+        return value
+
+    def invalidate_local(self, invalidations: dict[str, set]):
+        """清除本进程的本地缓存；实体ID集合为空表示清除整个命名空间"""
+        for namespace, ids in invalidations.items():
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            if ids:
+                for entity_id in ids:
+                    self.local.evict(f"{namespace}:{entity_id}")
+                self.local.evict_prefix(f"{namespace}:list:")
+            else:
+                self.local.evict_prefix(f"{namespace}:")
+
+    async def invalidate(self, invalidations: dict[str, set]):
+        """删除Redis中的缓存并通知其他工作进程（本地缓存已在事务提交时清除）"""
+        self.invalidations += 1
+        if not settings.cache_enabled or time.monotonic() < self._redis_down_until:
+            return
+        client = redis_core.get_async_redis_client()
+        try:
+            keys = []
+            for namespace, ids in invalidations.items():
+                if not ids:
+                    keys.extend([key async for key in client.scan_iter(match=f"{_REDIS_PREFIX}:{namespace}:*")])
+                    continue
+                index = f"{_REDIS_PREFIX}:{namespace}:lists"
+                keys.extend(await client.smembers(index))
+                keys.append(index)
+                keys.extend(f"{_REDIS_PREFIX}:{namespace}:{entity_id}" for entity_id in ids)
+            message = {
+                "origin": self._origin,
+                "invalidations": {namespace: sorted(ids) for namespace, ids in invalidations.items()},
+            }
+            async with client.pipeline(transaction=False) as pipe:
+                if keys:
+                    pipe.delete(*keys)
+                pipe.publish(settings.cache_invalidation_channel, json.dumps(message, separators=(",", ":")))
+                await pipe.execute()
+        except Exception as e:
+            # 未删除的Redis缓存最长在 cache_redis_ttl 秒后过期
+            self._redis_unavailable(e)
+
+    async def _redis_get(self, cache_key: str) -> str | None:
+        if time.monotonic() < self._redis_down_until:
+            return None
+        try:
+            raw = await redis_core.get_async_redis_client().get(f"{_REDIS_PREFIX}:{cache_key}")
+        except Exception as e:
+            self._redis_unavailable(e)
+            return None
+        if self._redis_failing:
+            logger.info("Redis cache recovered")
+            self._redis_failing = False
+        return raw
+
+    async def _redis_set(self, namespace: str, cache_key: str, raw: str):
+        if time.monotonic() < self._redis_down_until:
+            return
+        try:
+            async with redis_core.get_async_redis_client().pipeline(transaction=False) as pipe:
+                pipe.set(f"{_REDIS_PREFIX}:{cache_key}", raw, ex=settings.cache_redis_ttl)
+                if cache_key.startswith(f"{namespace}:list:"):
+                    # 记录列表键，实体变更时按命名空间批量删除
+                    index = f"{_REDIS_PREFIX}:{namespace}:lists"
+                    pipe.sadd(index, f"{_REDIS_PREFIX}:{cache_key}")
+                    pipe.expire(index, settings.cache_redis_ttl)
+                await pipe.execute()
+        except Exception as e:
+            self._redis_unavailable(e)
+
+    def _redis_unavailable(self, e: Exception):
+        # 不可用期间跳过共享层，每隔一段时间重试；连续失败只记录一次警告
+        if not self._redis_failing:
+            logger.warning(f"Redis cache unavailable, using local cache only: {e}")
+        self._redis_failing = True
+        self._redis_down_until = time.monotonic() + _REDIS_RETRY_INTERVAL
+
+    def _ensure_listener(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        """订阅失效通知，连接断开后自动重连；重连时清空本地缓存（断开期间的通知已丢失）"""
+        connected_before = False
+        failing = False
+        while True:
+            pubsub = redis_core.get_async_redis_client().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(settings.cache_invalidation_channel)
+                if connected_before:
+                    self.local.clear()
+                connected_before = True
+                failing = False
+                async for message in pubsub.listen():
+                    try:
+                        data = json.loads(message["data"])
+                        if data["origin"] != self._origin:
+                            self.invalidate_local({
+                                namespace: set(ids) for namespace, ids in data["invalidations"].items()
+                            })
+                    except (TypeError, ValueError, KeyError):
+                        logger.warning(f"Ignoring malformed cache invalidation: {message['data']!r}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not failing:
+                    logger.warning(f"Cache invalidation subscription lost, reconnecting: {e}")
+                failing = True
+                connected_before = True
+                await asyncio.sleep(_REDIS_RETRY_INTERVAL)
+            finally:
+                await pubsub.aclose()
+
+    async def close(self):
+        """停止订阅失效通知（应用关闭时调用）"""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "local_hit_ratio": self.local_hits / lookups if lookups else 0.0,
+            "hit_ratio": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "local_entries": len(self.local),
+            "local_bytes": self.local.bytes,
+            "local_evictions": self.local.evictions,
+            "invalidations": self.invalidations,
+        }
+
+cache = TwoTierCache()
+
+def invalidate_cache(db: AsyncSession, namespace: str, ids: Iterable = ()):
+    """登记缓存失效，在该会话的事务提交时生效；不指定实体ID时清除整个命名空间"""
+    pending = db.info.setdefault(_PENDING_KEY, {})
+    ids = set(ids)
+    if len(ids) + len(pending.get(namespace, ())) > _MAX_INVALIDATION_IDS:
+        ids = set()
+    if namespace in pending and (not pending[namespace] or not ids):
+        pending[namespace] = set()
+    else:
+        pending.setdefault(namespace, set()).update(ids)
+
+async def publish_pending_invalidations(db: AsyncSession):
+    """事务提交后调用，删除Redis中的缓存并通知其他工作进程"""
+    invalidations = db.info.pop(_COMMITTED_KEY, None)
+    if invalidations:
+        await cache.invalidate(invalidations)
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_invalidations(session):
+    invalidations = session.info.pop(_PENDING_KEY, None)
+    if invalidations:
+        cache.invalidate_local(invalidations)
+        session.info.setdefault(_COMMITTED_KEY, {}).update(invalidations)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_invalidations(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,32 @@
+import time
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.change import ChangeLog
+
+# 变更日志
+# CRUD函数在会话中登记变更，提交事务前用一条批量INSERT写入，与业务修改在同一事务中提交；
+# 同一事务内对同一实体的多次修改只记录最后一次。
+
+_PENDING_KEY = "pending_changes"
+
+def record_change(db: AsyncSession, entity: str, entity_id: int, op: str = "upsert"):
+    """登记一条变更，在该会话提交事务时写入变更日志"""
+    pending = db.info.setdefault(_PENDING_KEY, {})
+    pending.pop((entity, entity_id), None)  # 保持按最后一次修改的顺序写入
+    pending[(entity, entity_id)] = op
+
+@event.listens_for(Session, "before_commit")
+def _write_pending_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    changed_at = time.time()
+    session.execute(insert(ChangeLog), [
+        {"entity": entity, "entity_id": entity_id, "op": op, "changed_at": changed_at}
+        for (entity, entity_id), op in pending.items()
+    ])
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_changes(session):
+    session.info.pop(_PENDING_KEY, None)
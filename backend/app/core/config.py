@@ -11,6 +11,92 @@ class Settings(BaseSettings):
     # 数据库配置
     database_url: Any
     
+    # 只读副本配置（未配置时读请求使用主库）
+    database_replica_url: Optional[Any] = None
+    database_replica_check_interval: int = 5  # 副本健康检查间隔（秒）
+    database_replica_check_timeout: float = 1.0  # 副本健康检查超时（秒），超时视为不可用
+    read_your_writes_window: int = 5  # 写入后读请求粘滞到主库的时间窗口（秒）
+    read_your_writes_cookie: str = "ims_recent_write"
+    
+    # SQLite部署配置（仅在使用SQLite时生效）
+    sqlite_tuning: bool = True  # 启用WAL、单写连接和读连接池
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024  # 内存映射大小（字节）
+    sqlite_cache_size: int = -64000  # 页缓存大小（负数表示KiB）
+    sqlite_busy_timeout: int = 5000  # 锁等待超时时间（毫秒）
+    sqlite_reader_pool_size: int = 8  # 读连接池大小
+    
+    # 生产部署配置
+    web_concurrency: int = 1  # 工作进程数，由启动脚本设置
+    db_connection_budget: Optional[int] = None  # 所有工作进程共用的数据库连接总数上限
+    redis_connection_budget: Optional[int] = None  # 所有工作进程共用的Redis连接总数上限
+    
+    # 启动配置
+    startup_schema_mode: str = "create_all"  # create_all: 每次启动建表；version: 结构版本一致时跳过建表；skip: 不检查
+    db_pool_warmup: int = 0  # 启动时预先建立的数据库连接数
+    redis_pool_warmup: int = 0  # 启动时预先建立的Redis连接数
+    startup_preload_caches: bool = False  # 启动时预加载热点缓存
+    
+    # 读请求合并配置
+    read_single_flight: bool = True  # 同一工作进程内合并参数相同的并发只读查询
+    
+    # 两级缓存配置（进程内LRU + Redis）
+    cache_enabled: bool = True
+    cache_local_max_bytes: int = 64 * 1024 * 1024  # 每个工作进程本地缓存的大小上限（字节）
+    cache_local_ttl: float = 30.0  # 本地缓存有效期（秒），失效通知丢失时的最长过期时间
+    cache_redis_ttl: int = 300  # Redis缓存有效期（秒）
+    cache_invalidation_channel: str = "ims:cache_invalidation"
+    
+    # 幂等键配置（写接口的 Idempotency-Key 请求头）
+    idempotency_ttl: int = 86400  # 首次成功响应的保存时间（秒）
+    idempotency_lock_ttl: int = 60  # 执行中标记的有效期（秒），执行请求的工作进程退出时标记在此之后失效
+    idempotency_wait_timeout: float = 10.0  # 相同键的并发请求等待首次请求完成的最长时间（秒），超时返回409
+    
+    # 盘点配置
+    stocktake_batch_size: int = 5000  # 盘点表每批写入临时表的行数
+    stocktake_max_lines: int = 500000  # 单次盘点表的最大行数
+    
+    # 批量删除配置
+    bulk_delete_batch_size: int = 1000  # 每批删除的记录数，批之间提交事务以缩短持有锁的时间
+    
+    # 报表配置
+    report_batch_size: int = 50000  # 生成报表时每批从数据库读取的行数
+    
+    # 后台任务配置
+    job_backend: str = "redis"  # redis: 任务由独立的工作进程（worker.py）执行；local: 进程内存，由API进程执行（单进程或测试）
+    job_concurrency: dict[str, int] = {}  # 按任务类型覆盖并发上限，如 {"valuation_report": 2}
+    job_worker_slots: int = 4  # 每个工作进程同时执行的最大任务数
+    job_poll_interval: float = 0.5  # 队列为空时的轮询间隔（秒）
+    job_heartbeat_interval: float = 2.0  # 运行中任务的心跳间隔（秒），也是取消请求的最长响应时间
+    job_heartbeat_timeout: float = 60.0  # 超过该时间没有心跳的任务标记为失败（秒）
+    job_result_ttl: int = 86400  # 任务结束后状态和结果的保留时间（秒）
+    
+    # 出入库组提交配置（默认关闭）
+    inventory_group_commit: bool = False  # 将并发的出入库合并到同一事务提交
+    inventory_group_commit_max_delay_ms: float = 5.0  # 合并等待的最长时间（毫秒）
+    inventory_group_commit_max_batch: int = 100  # 单个事务合并的最大操作数
+    inventory_shard_fold_interval: float = 5.0  # 分片库存汇总回库存表的间隔（秒）
+    
+    # 库存预留配置
+    reservation_backend: str = "redis"  # redis: 多进程共享，Lua脚本保证原子性；local: 进程内存（单进程或测试）
+    reservation_default_ttl: int = 900  # 预留默认有效期（秒）
+    reservation_max_ttl: int = 3600  # 预留最长有效期（秒）
+    reservation_flush_interval: float = 1.0  # 已确认的预留写入库存的间隔（秒）
+    reservation_flush_batch_size: int = 500  # 每次写入库存的最大确认数
+    reservation_confirmed_retention_days: int = 7  # 预留确认记录（用于跳过重复写入）的保留天数，0表示不清理
+    reservation_confirmed_prune_interval: float = 3600.0  # 清理预留确认记录的间隔（秒）
+    
+    # 库存变更事件配置
+    inventory_events_backend: str = "redis"  # redis: 通过Redis发布订阅在工作进程间广播；local: 仅进程内（单进程或测试）；off: 不发布
+    inventory_events_channel: str = "ims:inventory_events"
+    event_stream_queue_size: int = 100  # 每个流式连接最多缓冲的事件数，超出时通知客户端重新同步
+    event_stream_heartbeat: float = 15.0  # 流式连接心跳间隔（秒）
+    
+    # 变更日志配置
+    change_feed_safety_lag: float = 2.0  # 只返回提交超过该时间的变更（秒），避免游标越过尚未提交的事务
+    change_feed_retention_days: int = 0  # 变更日志保留天数，0表示不清理
+    change_feed_prune_interval: float = 3600.0  # 清理变更日志的间隔（秒）
+    
     # Redis配置
     redis_url: RedisDsn
     
@@ -26,4 +112,8 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = False
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
+
+def per_worker_connections(budget: int) -> int:
+    """按工作进程数平分连接预算，保证所有进程的连接总数不超过预算"""
+    return max(1, budget // max(1, settings.web_concurrency))
\ No newline at end of file
@@ -1,49 +1,203 @@
+import asyncio
+import time
+from fastapi import Request, Response
 from sqlmodel import SQLModel
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import AsyncAdaptedQueuePool
-from app.core.config import settings
+from app.core.config import settings, per_worker_connections
+from app.core.events import publish_pending_events, discard_pending_events
+from app.core.cache import publish_pending_invalidations
+from app.core.logger import logger
+
+def _pool_limits() -> tuple[int, int]:
+    """计算每个工作进程的连接池大小和最大溢出连接数"""
+    if not settings.db_connection_budget:
+        return 10, 20
+    # 按连接预算平分到每个工作进程，一半常驻、一半按需溢出
+    connections = per_worker_connections(settings.db_connection_budget)
+    pool_size = max(1, (connections + 1) // 2)
+    return pool_size, connections - pool_size
+
+_pool_size, _max_overflow = _pool_limits()
 
 # 配置数据库连接池参数
 pool_kwargs = {
-    "pool_size": 10,  # 连接池大小
-    "max_overflow": 20,  # 最大溢出连接数
+    "pool_size": _pool_size,  # 连接池大小
+    "max_overflow": _max_overflow,  # 最大溢出连接数
     "pool_timeout": 30,  # 连接超时时间
     "pool_recycle": 3600,  # 连接回收时间
     "echo": settings.app_debug,  # 仅在调试模式下打印SQL语句
 }
 
-# 无论使用哪种数据库，都统一使用异步引擎
-if str(settings.database_url).startswith("sqlite"):
-    # SQLite异步引擎配置
-    engine = create_async_engine(
-        str(settings.database_url.replace("sqlite://", "sqlite+aiosqlite://")),
-        connect_args={"check_same_thread": False},
-        **pool_kwargs
-    )
-else:
+# 不会修改数据的HTTP方法，其余方法视为写请求
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+def _is_sqlite(database_url) -> bool:
+    """判断是否为SQLite数据库"""
+    return str(database_url).startswith("sqlite")
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """为每个新建的SQLite连接设置性能相关的PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # 读写互不阻塞
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.execute(f"PRAGMA cache_size={int(settings.sqlite_cache_size)}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout)}")
+    cursor.close()
+
+def create_db_engine(database_url, tuned: bool = True, **overrides):
+    """
+    根据数据库类型创建异步引擎
+    :param database_url: 数据库连接地址
+    :param tuned: SQLite连接是否设置性能PRAGMA
+    :param overrides: 覆盖默认连接池参数
+    """
+    engine_kwargs = {**pool_kwargs, **overrides}
+    # 无论使用哪种数据库，都统一使用异步引擎
+    if _is_sqlite(database_url):
+        # SQLite异步引擎配置
+        sqlite_engine = create_async_engine(
+            str(database_url).replace("sqlite://", "sqlite+aiosqlite://"),
+            connect_args={"check_same_thread": False},
+            **engine_kwargs
+        )
+        if tuned:
+            event.listen(sqlite_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        return sqlite_engine
     # 其他数据库异步引擎配置
-    engine = create_async_engine(
-        str(settings.database_url),
+    return create_async_engine(
+        str(database_url),
         poolclass=AsyncAdaptedQueuePool,
-        **pool_kwargs
+        **engine_kwargs
+    )
+
+def _create_session_factory(bind):
+    """创建异步会话工厂"""
+    return sessionmaker(
+        bind,
+        class_=AsyncSession,
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,  # 提高性能，减少不必要的数据库查询
     )
 
+_sqlite_tuned = _is_sqlite(settings.database_url) and settings.sqlite_tuning
+
+if _sqlite_tuned:
+    # SQLite同一时刻只允许一个写事务：主库引擎只保留一个写连接，
+    # 写请求在连接池中排队，避免多个连接争抢写锁导致"database is locked"
+    engine = create_db_engine(settings.database_url, pool_size=1, max_overflow=0)
+else:
+    engine = create_db_engine(settings.database_url)
+
+# 只读引擎：优先使用只读副本；SQLite在WAL模式下使用独立的读连接池
+if settings.database_replica_url:
+    read_engine = create_db_engine(settings.database_replica_url)
+elif _sqlite_tuned:
+    read_engine = create_db_engine(
+        settings.database_url,
+        pool_size=settings.sqlite_reader_pool_size,
+        max_overflow=0,
+    )
+else:
+    read_engine = None
+
 # 异步会话工厂
-AsyncSessionLocal = sessionmaker(
-    engine,
-    class_=AsyncSession,
-    autocommit=False,
-    autoflush=False,
-    expire_on_commit=False,  # 提高性能，减少不必要的数据库查询
-)
+AsyncSessionLocal = _create_session_factory(engine)
+ReadSessionLocal = _create_session_factory(read_engine) if read_engine is not None else None
+
+# 记录会话是否执行过写操作，只读请求结束时无需提交事务
+@event.listens_for(Session, "after_flush")
+def _mark_flush_writes(session, flush_context):
+    session.info["has_writes"] = True
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_statement_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+def _has_writes(db: AsyncSession) -> bool:
+    """判断会话中是否有需要提交的修改"""
+    return bool(db.new or db.dirty or db.deleted or db.info.get("has_writes"))
+
+# 只读引擎健康状态，按检查间隔缓存，避免每个请求都探测副本
+_replica_healthy = True
+_replica_checked_at = 0.0
+
+async def _replica_available() -> bool:
+    """检查只读引擎是否可用"""
+    global _replica_healthy, _replica_checked_at
+    if read_engine is None:
+        return False
+
+    now = time.monotonic()
+    if now - _replica_checked_at < settings.database_replica_check_interval:
+        return _replica_healthy
+    _replica_checked_at = now
+
+    async def probe():
+        async with read_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    # 探测在请求路径上执行，副本无响应时按超时判为不可用，不等待驱动自身超时
+    try:
+        await asyncio.wait_for(probe(), timeout=settings.database_replica_check_timeout)
+    except Exception as e:
+        if _replica_healthy:
+            logger.warning(f"Read replica unavailable, falling back to primary: {e!r}")
+        _replica_healthy = False
+    else:
+        if not _replica_healthy:
+            logger.info("Read replica recovered")
+        _replica_healthy = True
+    return _replica_healthy
 
 # 依赖函数，用于获取异步数据库会话
-async def get_async_db():
+# 必须以 Depends(get_async_db, scope="function") 声明：函数级依赖在路由函数返回后、响应发送前退出，
+# 提交失败时客户端收到500而不是已发送的成功响应；请求级依赖的退出在响应发送之后才执行
+async def get_async_db(request: Request, response: Response):
+    # 写请求后的短时间内，该客户端的读请求粘滞到主库，保证读到自己的写入
+    if settings.database_replica_url and request.method not in SAFE_METHODS:
+        response.set_cookie(
+            settings.read_your_writes_cookie,
+            "1",
+            max_age=settings.read_your_writes_window,
+            httponly=True,
+        )
+
+    # 请求级工作单元：整个请求共用一个事务，CRUD函数只flush不提交
     async with AsyncSessionLocal() as db:
         try:
             yield db
-            await db.commit()  # 自动提交事务
+            if _has_writes(db):
+                await db.commit()  # 有修改时统一提交事务，只读请求不提交
+                await publish_pending_events(db)  # 提交后发布本次请求登记的变更事件
+                await publish_pending_invalidations(db)  # 提交后清除Redis缓存并通知其他工作进程
+        except Exception:
+            discard_pending_events(db)
+            await db.rollback()  # 出错时自动回滚
+            raise
+        finally:
+            await db.close()
+
+# 依赖函数，用于获取只读数据库会话
+async def get_async_read_db(request: Request):
+    """
+    获取只读数据库会话
+    优先使用只读引擎；未配置、不健康或客户端刚写入过数据时使用主库
+    """
+    if request.cookies.get(settings.read_your_writes_cookie) or not await _replica_available():
+        session_factory = AsyncSessionLocal
+    else:
+        session_factory = ReadSessionLocal
+
+    async with session_factory() as db:
+        db.info["read_only"] = True  # 只读会话中的查询可以合并（见 app/core/singleflight.py）
+        try:
+            yield db
         except Exception:
             await db.rollback()  # 出错时自动回滚
             raise
@@ -53,4 +207,10 @@ async def get_async_db():
 # 异步初始化数据库
 async def async_init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+# 关闭数据库连接池
+async def async_close_db():
+    await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
@@ -0,0 +1,100 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, TypeVar
+from fastapi import HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# 请求级批量加载器
+# 同一轮事件循环中对同一类实体的多次按键加载合并为一次批量查询，结果在会话内缓存。
+# 加载器保存在会话中，随请求结束释放；缓存不感知写入，只用于只读查询。
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_LOADERS_KEY = "dataloaders"
+_LOCK_KEY = "dataloader_lock"
+
+MAX_BATCH_IDS = 1000  # 单次批量获取的最大ID数
+
+class DataLoader(Generic[K, V]):
+    """
+    按键批量加载，batch_load接收去重后的键列表，返回 键 -> 值（不存在的键不返回）
+    batch_load执行时持有会话的查询锁，不能在其中再使用同一会话的加载器
+    """
+
+    def __init__(self, batch_load: Callable[[list[K]], Awaitable[dict[K, V]]], lock: asyncio.Lock | None = None):
+        self._batch_load = batch_load
+        self._lock = lock or asyncio.Lock()
+        self._cache: dict[K, asyncio.Future] = {}
+        self._queue: list[K] = []
+        self._tasks: set[asyncio.Task] = set()  # 保留批量查询任务的引用，避免执行中被回收
+
+    def load(self, key: K) -> Awaitable[V | None]:
+        """加载一个键，不存在时结果为None"""
+        future = self._cache.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        if not self._queue:
+            # 等当前协程和同一轮中的其他协程登记完键之后再批量查询
+            loop.call_soon(self._schedule_dispatch)
+        self._queue.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable[K]) -> list[V | None]:
+        """按给定顺序加载多个键"""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: K, value: V):
+        """写入已查询到的值，之后加载该键不再查询"""
+        if key not in self._cache:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._cache[key] = future
+
+    def _schedule_dispatch(self):
+        task = asyncio.get_running_loop().create_task(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self):
+        keys, self._queue = self._queue, []
+        try:
+            # 同一会话的加载器共用一把锁，AsyncSession不允许并发执行查询
+            async with self._lock:
+                values = await self._batch_load(keys)
+        except Exception as e:
+            for key in keys:
+                future = self._cache.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(values.get(key))
+
+def get_loader(
+    db: AsyncSession, name: str, batch_load: Callable[[AsyncSession, list], Awaitable[dict]]
+) -> DataLoader:
+    """获取会话中指定名称的加载器，不存在时创建"""
+    loaders = db.info.setdefault(_LOADERS_KEY, {})
+    loader = loaders.get(name)
+    if loader is None:
+        lock = db.info.setdefault(_LOCK_KEY, asyncio.Lock())
+        loader = DataLoader(lambda keys: batch_load(db, keys), lock)
+        loaders[name] = loader
+    return loader
+
+def batch_ids(ids: str | None = Query(None, description="逗号分隔的ID，按给定顺序批量获取，忽略分页参数")) -> list[int] | None:
+    """解析批量获取的ID列表参数"""
+    if ids is None:
+        return None
+    try:
+        values = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(values) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    return values
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import time
+from typing import Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core import redis as redis_core
+from app.core.logger import logger
+
+# 库存变更事件
+# CRUD函数在会话中登记事件，事务提交后才发布，回滚的修改不会产生事件。
+# 每个工作进程只有一个Redis订阅连接，收到的事件在进程内分发给所有流式连接。
+
+_PENDING_KEY = "pending_events"
+
+def queue_event(db: AsyncSession, event: dict):
+    """登记一个事件，在该会话的事务提交后发布"""
+    event.setdefault("ts", round(time.time(), 3))
+    db.info.setdefault(_PENDING_KEY, []).append(event)
+
+def discard_pending_events(db: AsyncSession):
+    """丢弃会话中尚未发布的事件（事务回滚时调用）"""
+    db.info.pop(_PENDING_KEY, None)
+
+async def publish_pending_events(db: AsyncSession):
+    """事务提交后调用，发布会话中登记的事件；发布失败只记录日志，不影响已提交的请求"""
+    events = db.info.pop(_PENDING_KEY, None)
+    if events:
+        await publish_events(events)
+
+async def publish_events(events: Iterable[dict]):
+    events = list(events)
+    if settings.inventory_events_backend == "local":
+        for event in events:
+            event_hub.dispatch(event)
+        return
+    if settings.inventory_events_backend != "redis":
+        return
+    try:
+        async with redis_core.get_async_redis_client().pipeline(transaction=False) as pipe:
+            for event in events:
+                pipe.publish(settings.inventory_events_channel, json.dumps(event, separators=(",", ":")))
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish {len(events)} inventory events: {e}")
+
+class Subscriber:
+    """一个流式连接的订阅，按仓库和商品过滤事件；缓冲区满时丢弃事件并标记需要重新同步"""
+
+    def __init__(self, warehouse_ids: set[int] | None, product_ids: set[int] | None):
+        self.warehouse_ids = warehouse_ids
+        self.product_ids = product_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.event_stream_queue_size)
+        self.overflowed = False
+        self.closed = False
+
+    def matches(self, event: dict) -> bool:
+        if self.warehouse_ids is not None and event.get("warehouse_id") not in self.warehouse_ids:
+            return False
+        if self.product_ids is not None and event.get("product_id") not in self.product_ids:
+            return False
+        return True
+
+    def put(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def close(self):
+        """通知流式连接结束（应用关闭时）"""
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+class EventHub:
+    """进程内的事件分发器，有订阅者时才保持一个Redis订阅连接"""
+
+    def __init__(self):
+        self._subscribers: set[Subscriber] = set()
+        self._listener: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()  # 保留订阅任务的引用（包括已取消、尚未结束的），关闭时等待其结束
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, warehouse_ids: set[int] | None = None, product_ids: set[int] | None = None) -> Subscriber:
+        subscriber = Subscriber(warehouse_ids, product_ids)
+        self._subscribers.add(subscriber)
+        if settings.inventory_events_backend == "redis" and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+            self._tasks.add(self._listener)
+            self._listener.add_done_callback(self._tasks.discard)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        if not self._subscribers and self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    def dispatch(self, event: dict):
+        for subscriber in self._subscribers:
+            if subscriber.matches(event):
+                subscriber.put(event)
+
+    async def _listen(self):
+        """订阅Redis频道并分发事件，连接断开后自动重连"""
+        while True:
+            pubsub = redis_core.get_async_redis_client().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(settings.inventory_events_channel)
+                async for message in pubsub.listen():
+                    try:
+                        self.dispatch(json.loads(message["data"]))
+                    except (TypeError, ValueError):
+                        logger.warning(f"Ignoring malformed inventory event: {message['data']!r}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Inventory event subscription lost, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def close(self):
+        """结束所有流式连接并停止订阅（应用关闭时调用）"""
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+event_hub = EventHub()
@@ -0,0 +1,213 @@
+import asyncio
+import base64
+import hashlib
+import json
+import uuid
+from typing import Callable, Awaitable, Sequence
+from fastapi import Depends, HTTPException, Request, Response, params
+from fastapi.routing import APIRoute
+from app.core.config import settings
+from app.core import redis as redis_core
+from app.core.logger import logger
+
+# 幂等键（Idempotency-Key）
+# 写请求携带 Idempotency-Key 请求头时，首次成功的响应保存在Redis中，相同键的重试直接返回保存的响应，不再访问数据库。
+# 执行期间在Redis中保留一个执行中标记，其他工作进程收到相同键的并发请求时等待首次请求完成，而不是重复执行。
+# 响应在请求级事务提交后才保存；请求失败（异常或非2xx响应）时删除标记，重试会重新执行。
+# 键按请求方法、路径和客户端身份隔离。
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+_PREFIX = "ims:idempotency"
+_MAX_KEY_LENGTH = 255
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# 只删除本请求设置的执行中标记（标记可能已过期并被其他请求重新设置）
+_RELEASE_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if value and cjson.decode(value)['token'] == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 执行中标记仍属于本请求时才保存响应
+_COMPLETE_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if value and cjson.decode(value)['token'] == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+class _Stats:
+    def __init__(self):
+        self.executed = 0  # 首次执行的请求数
+        self.replayed = 0  # 返回保存的响应的请求数
+        self.waited = 0  # 等待执行中请求的请求数
+
+    def as_dict(self) -> dict:
+        return {"executed": self.executed, "replayed": self.replayed, "waited": self.waited}
+
+stats = _Stats()
+
+def _fingerprint(request: Request, body: bytes) -> str:
+    """请求指纹：相同的键只能用于相同的请求"""
+    digest = hashlib.sha256()
+    for part in (request.method, request.url.path, request.url.query):
+        digest.update(part.encode("utf-8") + b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+def _replay(record: dict) -> Response:
+    response = Response(
+        content=base64.b64decode(record["body"]),
+        status_code=record["status_code"],
+        media_type=record.get("media_type"),
+    )
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+def _check_fingerprint(record: dict, fingerprint: str):
+    if record["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail=f"{HEADER} was already used for a different request")
+
+async def _acquire(key: str, fingerprint: str, token: str) -> Response | None:
+    """
+    设置执行中标记；已有保存的响应时返回该响应
+    相同键的请求正在执行时等待其完成，首次请求失败（标记被删除或过期）时由当前请求接手执行
+    """
+    client = redis_core.get_async_redis_client()
+    marker = json.dumps({"state": "in_flight", "token": token, "fingerprint": fingerprint})
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.idempotency_wait_timeout
+    delay = 0.02
+    waited = False
+    while True:
+        if await client.set(key, marker, nx=True, ex=settings.idempotency_lock_ttl):
+            return None
+        raw = await client.get(key)
+        if raw is None:
+            continue  # 标记刚被删除，重新尝试设置
+        record = json.loads(raw)
+        _check_fingerprint(record, fingerprint)
+        if record["state"] == "completed":
+            stats.replayed += 1
+            return _replay(record)
+        if not waited:
+            stats.waited += 1
+            waited = True
+        if loop.time() >= deadline:
+            raise HTTPException(status_code=409, detail=f"A request with this {HEADER} is still in progress")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+async def _complete(key: str, fingerprint: str, token: str, response: Response):
+    record = json.dumps({
+        "state": "completed",
+        "fingerprint": fingerprint,
+        "status_code": response.status_code,
+        "media_type": response.media_type,
+        "body": base64.b64encode(response.body).decode("ascii"),
+    })
+    client = redis_core.get_async_redis_client()
+    await client.register_script(_COMPLETE_SCRIPT)(keys=[key], args=[token, record, settings.idempotency_ttl])
+
+async def _release(key: str, token: str):
+    client = redis_core.get_async_redis_client()
+    await client.register_script(_RELEASE_SCRIPT)(keys=[key], args=[token])
+
+def _scoped_key(request: Request, idempotency_key: str) -> str:
+    """
+    Redis键包含请求方法、路径和客户端身份，不同客户端或不同接口使用相同的键互不影响
+    客户端身份为Authorization请求头（携带令牌时）或客户端地址，取摘要避免在Redis中保存令牌
+    """
+    identity = request.headers.get("Authorization") or (request.client.host if request.client else "")
+    identity_digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]
+    return f"{_PREFIX}:{request.method}:{request.url.path}:{identity_digest}:{idempotency_key}"
+
+class _Execution:
+    """一次首次执行的幂等请求：路由处理函数获得响应，退出依赖在事务提交后保存响应或删除标记"""
+
+    def __init__(self, key: str, fingerprint: str, token: str):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.token = token
+        self.response: Response | None = None
+        self.entered = False  # 退出依赖是否已开始（请求体解析失败时依赖不会执行）
+
+    async def finish(self, succeeded: bool):
+        try:
+            response = self.response
+            if succeeded and response is not None and 200 <= response.status_code < 300 and hasattr(response, "body"):
+                await _complete(self.key, self.fingerprint, self.token, response)
+            else:
+                await _release(self.key, self.token)
+        except Exception as e:
+            logger.warning(f"Failed to store idempotent response: {e}")
+
+async def _finish_after_commit(request: Request):
+    """
+    路由级 yield 依赖（请求级作用域），在函数级的数据库会话依赖提交或回滚之后才退出，
+    提交失败的异常也会传到这里，此时删除执行中标记
+    """
+    execution: _Execution | None = getattr(request.state, "idempotency", None)
+    if execution is None:
+        yield
+        return
+    execution.entered = True
+    try:
+        yield
+    except Exception:
+        await execution.finish(False)
+        raise
+    await execution.finish(True)
+
+class IdempotentRoute(APIRoute):
+    """
+    支持 Idempotency-Key 请求头的路由，用于写接口（APIRouter(route_class=IdempotentRoute)）
+    不带该请求头的请求和读请求不受影响
+    """
+
+    def __init__(self, path: str, endpoint: Callable, *, dependencies: Sequence[params.Depends] | None = None, **kwargs):
+        # 保存响应的依赖排在最前，保证在数据库会话依赖提交之后退出
+        dependencies = [Depends(_finish_after_commit), *(dependencies or [])]
+        super().__init__(path, endpoint, dependencies=dependencies, **kwargs)
+
+    def get_route_handler(self) -> Callable[[Request], Awaitable[Response]]:
+        handler = super().get_route_handler()
+
+        async def idempotent_handler(request: Request) -> Response:
+            idempotency_key = request.headers.get(HEADER)
+            if not idempotency_key or request.method in _SAFE_METHODS:
+                return await handler(request)
+            if len(idempotency_key) > _MAX_KEY_LENGTH:
+                raise HTTPException(status_code=400, detail=f"{HEADER} must be at most {_MAX_KEY_LENGTH} characters")
+
+            key = _scoped_key(request, idempotency_key)
+            fingerprint = _fingerprint(request, await request.body())
+            token = uuid.uuid4().hex
+            try:
+                replay = await _acquire(key, fingerprint, token)
+            except HTTPException:
+                raise
+            except Exception as e:
+                # Redis不可用时按普通请求执行，不保证幂等
+                logger.warning(f"Idempotency store unavailable, executing without {HEADER}: {e}")
+                return await handler(request)
+            if replay is not None:
+                return replay
+
+            stats.executed += 1
+            execution = _Execution(key, fingerprint, token)
+            request.state.idempotency = execution
+            try:
+                execution.response = await handler(request)
+            except BaseException:
+                if not execution.entered:
+                    await execution.finish(False)
+                raise
+            return execution.response
+
+        return idempotent_handler
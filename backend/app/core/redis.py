@@ -1,21 +1,48 @@
 from typing import Optional
 import redis
-from app.core.config import settings
+import redis.asyncio as redis_asyncio
+from app.core.config import settings, per_worker_connections
 
 # Redis连接池
 redis_pool: Optional[redis.ConnectionPool] = None
+# 异步Redis连接池，供事件循环内的高频操作（如库存预留）使用
+async_redis_pool: Optional[redis_asyncio.ConnectionPool] = None
+
+def _max_connections() -> int:
+    """每个工作进程的最大连接数，配置了连接预算时按工作进程数平分"""
+    if settings.redis_connection_budget:
+        return per_worker_connections(settings.redis_connection_budget)
+    return 100
 
 # 初始化Redis连接池
 async def init_redis_pool():
     """初始化Redis连接池"""
-    global redis_pool
+    global redis_pool, async_redis_pool
     redis_pool = redis.ConnectionPool.from_url(
         str(settings.redis_url),
         encoding="utf-8",
         decode_responses=True,
-        max_connections=100,  # 最大连接数
+        max_connections=_max_connections(),  # 最大连接数
         socket_timeout=5.0,  # 连接超时时间
     )
+    async_redis_pool = redis_asyncio.ConnectionPool.from_url(
+        str(settings.redis_url),
+        encoding="utf-8",
+        decode_responses=True,
+        max_connections=_max_connections(),
+        socket_timeout=5.0,
+    )
+
+# 关闭Redis连接池
+async def close_redis_pool():
+    """关闭Redis连接池"""
+    global redis_pool, async_redis_pool
+    if redis_pool is not None:
+        redis_pool.disconnect()
+        redis_pool = None
+    if async_redis_pool is not None:
+        await async_redis_pool.disconnect()
+        async_redis_pool = None
 
 # 获取Redis客户端
 def get_redis_client():
@@ -30,16 +57,15 @@ def get_redis_client():
         )
     return redis.Redis(connection_pool=redis_pool)
 
-# 简单的缓存装饰器，用于缓存函数结果
-def cache_result(key: str, ttl: int = 3600):
-    """
-    缓存装饰器，用于缓存函数结果
-    :param key: 缓存键前缀
-    :param ttl: 缓存过期时间（秒）
-    """
-    def decorator(func):
-        async def wrapper(*args, **kwargs):
-            # 简化实现，暂时不使用缓存
-            return await func(*args, **kwargs)
-        return wrapper
-    return decorator
\ No newline at end of file
+# 获取异步Redis客户端
+def get_async_redis_client() -> redis_asyncio.Redis:
+    """获取异步Redis客户端"""
+    if async_redis_pool is None:
+        # 如果连接池未初始化，创建一个临时客户端
+        return redis_asyncio.Redis.from_url(
+            str(settings.redis_url),
+            encoding="utf-8",
+            decode_responses=True,
+            socket_timeout=5.0,
+        )
+    return redis_asyncio.Redis(connection_pool=async_redis_pool)
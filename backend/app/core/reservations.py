@@ -0,0 +1,298 @@
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+from app.core.config import settings
+from app.core import redis as redis_core
+
+# 库存预留存储
+# 预留（暂扣）不写入库存表，避免热门商品的库存行被频繁锁定。
+# 可承诺量 ATP = 库存数量 - 未过期的预留 - 已确认但尚未写入库存的数量，
+# 由存储在一次原子操作中计算，过期的预留在每次访问该商品时顺带清理。
+# 库存数量在数据库中读取，确认写入库存后从已确认数量中移除时，商品的写入版本号加一；
+# 预留时带上读取库存数量之前的版本号，版本号已变化说明库存数量可能已扣减了确认数量，需要重新读取。
+
+@dataclass
+class Reservation:
+    """预留结果"""
+    id: str
+    product_id: int
+    quantity: int
+    expires_at: float  # 过期时间（Unix时间戳，秒）
+    available: int  # 预留后的可承诺量
+
+@dataclass
+class ConfirmedEntry:
+    """已确认、等待写入库存的预留"""
+    reservation_id: str
+    product_id: int
+    quantity: int
+
+class StaleOnHand(Exception):
+    """读取库存数量之后有确认写入了库存，库存数量需要重新读取"""
+
+def new_reservation_id(product_id: int) -> str:
+    """生成预留ID，ID中包含商品ID，确认和释放时无需额外查询"""
+    return f"{product_id}-{uuid.uuid4().hex}"
+
+def reservation_product_id(reservation_id: str) -> int:
+    """从预留ID中解析商品ID"""
+    try:
+        return int(reservation_id.split("-", 1)[0])
+    except ValueError:
+        raise ValueError("Reservation not found")
+
+class LocalReservationStore:
+    """进程内存实现，每个操作中间没有await，在单个事件循环内天然原子；只适用于单进程部署和测试"""
+
+    def __init__(self):
+        self._holds: dict[int, dict[str, tuple[int, float]]] = {}  # 商品ID -> {预留ID: (数量, 过期时间)}
+        self._confirmed: dict[int, int] = {}  # 商品ID -> 已确认未写入库存的数量
+        self._queue: list[ConfirmedEntry] = []
+        self._epochs: dict[int, int] = {}  # 商品ID -> 写入版本号
+        self._flush_lock = asyncio.Lock()
+
+    def _active_holds(self, product_id: int, now: float) -> dict[str, tuple[int, float]]:
+        holds = self._holds.setdefault(product_id, {})
+        for reservation_id in [rid for rid, (_, expires_at) in holds.items() if expires_at <= now]:
+            del holds[reservation_id]
+        return holds
+
+    def _available(self, product_id: int, on_hand: int, now: float) -> int:
+        held = sum(quantity for quantity, _ in self._active_holds(product_id, now).values())
+        return on_hand - held - self._confirmed.get(product_id, 0)
+
+    async def flush_epoch(self, product_id: int) -> int:
+        return self._epochs.get(product_id, 0)
+
+    async def reserve(self, product_id: int, quantity: int, on_hand: int, ttl: int, epoch: int) -> Reservation:
+        if self._epochs.get(product_id, 0) != epoch:
+            raise StaleOnHand()
+        now = time.time()
+        available = self._available(product_id, on_hand, now)
+        if quantity > available:
+            raise ValueError("Insufficient available stock")
+        reservation_id = new_reservation_id(product_id)
+        self._holds[product_id][reservation_id] = (quantity, now + ttl)
+        return Reservation(reservation_id, product_id, quantity, now + ttl, available - quantity)
+
+    async def confirm(self, reservation_id: str) -> ConfirmedEntry:
+        product_id = reservation_product_id(reservation_id)
+        hold = self._active_holds(product_id, time.time()).pop(reservation_id, None)
+        if hold is None:
+            raise ValueError("Reservation not found")
+        entry = ConfirmedEntry(reservation_id, product_id, hold[0])
+        self._confirmed[product_id] = self._confirmed.get(product_id, 0) + entry.quantity
+        self._queue.append(entry)
+        return entry
+
+    async def release(self, reservation_id: str) -> int:
+        product_id = reservation_product_id(reservation_id)
+        hold = self._active_holds(product_id, time.time()).pop(reservation_id, None)
+        if hold is None:
+            raise ValueError("Reservation not found")
+        return hold[0]
+
+    async def available(self, product_id: int, on_hand: int) -> int:
+        return self._available(product_id, on_hand, time.time())
+
+    @asynccontextmanager
+    async def flush_lock(self) -> AsyncIterator[bool]:
+        async with self._flush_lock:
+            yield True
+
+    async def pending_confirmations(self, limit: int) -> list[ConfirmedEntry]:
+        return self._queue[:limit]
+
+    async def ack_confirmations(self, entries: list[ConfirmedEntry]):
+        del self._queue[:len(entries)]
+        for entry in entries:
+            self._confirmed[entry.product_id] -= entry.quantity
+            self._epochs[entry.product_id] = self._epochs.get(entry.product_id, 0) + 1
+
+# 每个商品使用四个键：预留过期时间（有序集合）、预留数量（哈希）、预留总量、已确认未写入库存的总量。
+# 所有脚本先清理该商品已过期的预留，再执行各自的操作。
+_PURGE_EXPIRED = """
+local function purge(expiry_key, quantity_key, held_key, now)
+    local expired = redis.call('ZRANGEBYSCORE', expiry_key, '-inf', now)
+    for _, reservation_id in ipairs(expired) do
+        local quantity = tonumber(redis.call('HGET', quantity_key, reservation_id) or '0')
+        redis.call('DECRBY', held_key, quantity)
+        redis.call('HDEL', quantity_key, reservation_id)
+    end
+    if #expired > 0 then
+        redis.call('ZREMRANGEBYSCORE', expiry_key, '-inf', now)
+    end
+end
+local function available(on_hand)
+    return on_hand - tonumber(redis.call('GET', KEYS[3]) or '0') - tonumber(redis.call('GET', KEYS[4]) or '0')
+end
+"""
+
+# KEYS: 过期时间, 数量, 预留总量, 已确认总量, 写入版本号；
+# ARGV: 库存数量, 预留数量, 预留ID, 当前时间, 过期时间（毫秒）, 读取库存数量前的写入版本号
+_RESERVE_SCRIPT = _PURGE_EXPIRED + """
+if tonumber(redis.call('GET', KEYS[5]) or '0') ~= tonumber(ARGV[6]) then
+    return {-1, 0}
+end
+purge(KEYS[1], KEYS[2], KEYS[3], ARGV[4])
+local remaining = available(tonumber(ARGV[1]))
+local quantity = tonumber(ARGV[2])
+if quantity > remaining then
+    return {0, remaining}
+end
+redis.call('ZADD', KEYS[1], ARGV[5], ARGV[3])
+redis.call('HSET', KEYS[2], ARGV[3], quantity)
+redis.call('INCRBY', KEYS[3], quantity)
+-- 所有预留都过期后，预留相关的键随之过期
+local latest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')[2]
+for i = 1, 3 do
+    redis.call('PEXPIREAT', KEYS[i], latest)
+end
+return {1, remaining - quantity}
+"""
+
+# KEYS: 过期时间, 数量, 预留总量, 已确认总量, 确认队列；ARGV: 预留ID, 当前时间（毫秒）
+_CONFIRM_SCRIPT = _PURGE_EXPIRED + """
+purge(KEYS[1], KEYS[2], KEYS[3], ARGV[2])
+local quantity = redis.call('HGET', KEYS[2], ARGV[1])
+if not quantity then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('DECRBY', KEYS[3], quantity)
+redis.call('INCRBY', KEYS[4], quantity)
+redis.call('RPUSH', KEYS[5], ARGV[1] .. ':' .. quantity)
+return tonumber(quantity)
+"""
+
+# KEYS: 过期时间, 数量, 预留总量；ARGV: 预留ID, 当前时间（毫秒）
+_RELEASE_SCRIPT = _PURGE_EXPIRED + """
+purge(KEYS[1], KEYS[2], KEYS[3], ARGV[2])
+local quantity = redis.call('HGET', KEYS[2], ARGV[1])
+if not quantity then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('DECRBY', KEYS[3], quantity)
+return tonumber(quantity)
+"""
+
+# KEYS: 过期时间, 数量, 预留总量, 已确认总量；ARGV: 库存数量, 当前时间（毫秒）
+_AVAILABLE_SCRIPT = _PURGE_EXPIRED + """
+purge(KEYS[1], KEYS[2], KEYS[3], ARGV[2])
+return available(tonumber(ARGV[1]))
+"""
+
+# KEYS: 确认队列, 各条目对应商品的已确认总量和写入版本号（成对）；ARGV: 条目数, 各条目数量
+_ACK_SCRIPT = """
+redis.call('LTRIM', KEYS[1], tonumber(ARGV[1]), -1)
+for i = 1, tonumber(ARGV[1]) do
+    redis.call('DECRBY', KEYS[2 * i], ARGV[i + 1])
+    redis.call('INCR', KEYS[2 * i + 1])
+end
+return 1
+"""
+
+class RedisReservationStore:
+    """Redis实现，所有工作进程共享，每个操作由一个Lua脚本原子完成"""
+
+    prefix = "ims:reservation"
+
+    def _script(self, source: str):
+        # 脚本以EVALSHA执行，服务端尚未加载时自动回退为EVAL
+        return redis_core.get_async_redis_client().register_script(source)
+
+    def _product_keys(self, product_id: int) -> list[str]:
+        base = f"{self.prefix}:{product_id}"
+        return [f"{base}:expiry", f"{base}:quantity", f"{base}:held", f"{base}:confirmed"]
+
+    def _epoch_key(self, product_id: int) -> str:
+        return f"{self.prefix}:{product_id}:epoch"
+
+    @property
+    def _queue_key(self) -> str:
+        return f"{self.prefix}:confirmed_queue"
+
+    async def flush_epoch(self, product_id: int) -> int:
+        return int(await redis_core.get_async_redis_client().get(self._epoch_key(product_id)) or 0)
+
+    async def reserve(self, product_id: int, quantity: int, on_hand: int, ttl: int, epoch: int) -> Reservation:
+        now = time.time()
+        reservation_id = new_reservation_id(product_id)
+        expires_at = now + ttl
+        ok, available = await self._script(_RESERVE_SCRIPT)(
+            keys=self._product_keys(product_id) + [self._epoch_key(product_id)],
+            args=[on_hand, quantity, reservation_id, int(now * 1000), int(expires_at * 1000), epoch],
+        )
+        if ok < 0:
+            raise StaleOnHand()
+        if not ok:
+            raise ValueError("Insufficient available stock")
+        return Reservation(reservation_id, product_id, quantity, expires_at, int(available))
+
+    async def confirm(self, reservation_id: str) -> ConfirmedEntry:
+        product_id = reservation_product_id(reservation_id)
+        quantity = await self._script(_CONFIRM_SCRIPT)(
+            keys=self._product_keys(product_id) + [self._queue_key],
+            args=[reservation_id, int(time.time() * 1000)],
+        )
+        if not quantity:
+            raise ValueError("Reservation not found")
+        return ConfirmedEntry(reservation_id, product_id, int(quantity))
+
+    async def release(self, reservation_id: str) -> int:
+        product_id = reservation_product_id(reservation_id)
+        quantity = await self._script(_RELEASE_SCRIPT)(
+            keys=self._product_keys(product_id)[:3],
+            args=[reservation_id, int(time.time() * 1000)],
+        )
+        if not quantity:
+            raise ValueError("Reservation not found")
+        return int(quantity)
+
+    async def available(self, product_id: int, on_hand: int) -> int:
+        return int(await self._script(_AVAILABLE_SCRIPT)(
+            keys=self._product_keys(product_id),
+            args=[on_hand, int(time.time() * 1000)],
+        ))
+
+    @asynccontextmanager
+    async def flush_lock(self) -> AsyncIterator[bool]:
+        """跨工作进程的写入锁，同一时间只有一个进程把确认写入库存；未获得锁时返回False"""
+        client = redis_core.get_async_redis_client()
+        lock = client.lock(f"{self.prefix}:flush_lock", timeout=60, blocking=False)
+        acquired = await lock.acquire()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await lock.release()
+
+    async def pending_confirmations(self, limit: int) -> list[ConfirmedEntry]:
+        client = redis_core.get_async_redis_client()
+        entries = []
+        for item in await client.lrange(self._queue_key, 0, limit - 1):
+            reservation_id, quantity = item.rsplit(":", 1)
+            entries.append(ConfirmedEntry(reservation_id, reservation_product_id(reservation_id), int(quantity)))
+        return entries
+
+    async def ack_confirmations(self, entries: list[ConfirmedEntry]):
+        await self._script(_ACK_SCRIPT)(
+            keys=[self._queue_key] + [
+                key for entry in entries
+                for key in (self._product_keys(entry.product_id)[3], self._epoch_key(entry.product_id))
+            ],
+            args=[len(entries)] + [entry.quantity for entry in entries],
+        )
+
+def _create_store():
+    if settings.reservation_backend == "local":
+        return LocalReservationStore()
+    return RedisReservationStore()
+
+reservation_store = _create_store()
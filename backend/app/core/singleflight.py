@@ -0,0 +1,93 @@
+import asyncio
+import functools
+import inspect
+from typing import Any, Awaitable, Callable, Hashable
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+
+# 读请求合并（single-flight）
+# 同一工作进程内参数相同的并发查询只执行一次，其余调用等待并共享同一结果。
+# 只在只读会话中合并：共享的ORM对象会被多个请求读取，不能被任何一方修改。
+
+class _LeaderCancelled(Exception):
+    """执行查询的请求被取消，等待方需要自行查询"""
+
+class SingleFlight:
+    """按键合并并发调用，并统计合并情况"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0  # 总调用次数
+        self.executions = 0  # 实际执行次数
+        self.coalesced = 0  # 被合并（共享结果）的调用次数
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        future = self._inflight.get(key)
+        if future is None:
+            return await self._lead(key, func)
+        self.coalesced += 1
+        try:
+            # shield：等待方被取消时不影响共享的结果
+            return await asyncio.shield(future)
+        except _LeaderCancelled:
+            self.coalesced -= 1
+            self.executions += 1
+            return await func()
+
+    async def _lead(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.exception())  # 没有等待方时不输出"异常未读取"警告
+        self._inflight[key] = future
+        self.executions += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
+
+_groups: dict[str, SingleFlight] = {}
+
+def single_flight(name: str):
+    """
+    合并只读会话中参数相同的并发调用（装饰第一个参数为数据库会话的异步函数）
+    主库和只读副本的查询分别合并，读写会话中的调用不合并
+    """
+    group = _groups.setdefault(name, SingleFlight(name))
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(db: AsyncSession, *args, **kwargs):
+            if not settings.read_single_flight or not db.info.get("read_only"):
+                return await func(db, *args, **kwargs)
+            # 按绑定后的参数生成键，位置参数和关键字参数的调用可以互相合并
+            bound = signature.bind(db, *args, **kwargs)
+            bound.apply_defaults()
+            key = (id(db.bind),) + tuple(value for param, value in bound.arguments.items() if param != "db")
+            return await group.do(key, lambda: func(db, *args, **kwargs))
+
+        return wrapper
+    return decorator
+
+def single_flight_stats() -> dict[str, dict]:
+    """各合并组的统计"""
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable
+from sqlmodel import SQLModel, select
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from app.core.config import settings
+from app.core.database import engine, read_engine, async_init_db, AsyncSessionLocal
+from app.core import redis as redis_core
+from app.core.logger import logger
+from app.models.schema_version import SchemaVersion
+
+# 启动时预加载缓存的函数，由各模块通过register_preloader注册
+_preloaders: list[tuple[str, Callable[[], Awaitable[None]]]] = []
+
+def register_preloader(name: str, func: Callable[[], Awaitable[None]]):
+    """
+    注册启动时执行的缓存预加载函数
+    :param name: 预加载项名称，用于日志
+    :param func: 无参数的异步函数
+    """
+    _preloaders.append((name, func))
+
+def schema_fingerprint() -> str:
+    """根据模型元数据计算表结构指纹"""
+    parts = []
+    for table in sorted(SQLModel.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(f"table:{table.name}")
+        for column in table.columns:
+            parts.append(
+                f"column:{column.name}:{column.type}:{column.nullable}:{column.primary_key}:"
+                f"{sorted(fk.target_fullname for fk in column.foreign_keys)}"
+            )
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            parts.append(f"index:{index.name}:{index.unique}:{[c.name for c in index.columns]}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+async def _get_stored_schema_version() -> str | None:
+    """读取最近一次记录的表结构版本，表不存在时返回None"""
+    try:
+        async with AsyncSessionLocal() as db:
+            statement = select(SchemaVersion.version).order_by(SchemaVersion.id.desc()).limit(1)
+            result = await db.execute(statement)
+            return result.scalar_one_or_none()
+    except SQLAlchemyError:
+        return None
+
+async def _create_tables():
+    """执行建表，多个工作进程同时建表冲突时重试一次（已存在的表会被跳过）"""
+    try:
+        await async_init_db()
+    except SQLAlchemyError as e:
+        logger.info(f"Concurrent schema creation detected, retrying: {e.__class__.__name__}")
+        await asyncio.sleep(0.5)
+        await async_init_db()
+    # create_all 不会给已存在的表补建索引，新增的索引在这里补建（唯一索引可能因已有重复数据失败）
+    async with engine.connect() as conn:
+        missing = await conn.run_sync(_missing_indexes)
+    for index in missing:
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(lambda sync_conn: index.create(sync_conn, checkfirst=True))
+            logger.info(f"Created missing index {index.name}")
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to create index {index.name}: {e}")
+
+def _missing_indexes(sync_conn) -> list:
+    """已存在的表上缺少的索引"""
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        names = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in names)
+    return missing
+
+def _schema_differences(sync_conn) -> list[str]:
+    """对比数据库中实际的表结构与模型元数据，返回缺少的表、列、索引以及可空性不一致的列"""
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    differences = []
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            differences.append(f"missing table {table.name}")
+            continue
+        columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            actual = columns.get(column.name)
+            if actual is None:
+                differences.append(f"missing column {table.name}.{column.name}")
+            elif not column.primary_key and actual["nullable"] != column.nullable:
+                differences.append(f"column {table.name}.{column.name} nullable={actual['nullable']}, expected {column.nullable}")
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        differences.extend(f"missing index {index.name}" for index in table.indexes if index.name not in indexes)
+    return differences
+
+async def ensure_schema():
+    """按配置检查数据库结构，只有结构版本变化时才执行建表"""
+    if settings.startup_schema_mode == "skip":
+        return
+    if settings.startup_schema_mode != "version":
+        await _create_tables()
+        return
+
+    version = schema_fingerprint()
+    if await _get_stored_schema_version() == version:
+        return
+
+    logger.info(f"Schema version changed, running create_all (version={version})")
+    await _create_tables()
+    # create_all 不会修改已存在的表；结构与模型不一致时不记录版本，以后每次启动都会重新检查并告警
+    async with engine.connect() as conn:
+        differences = await conn.run_sync(_schema_differences)
+    if differences:
+        logger.warning(
+            f"Database schema does not match the models, apply a migration (version {version} not recorded): "
+            + "; ".join(differences)
+        )
+        return
+    # 其他工作进程可能已经记录了相同版本
+    if await _get_stored_schema_version() == version:
+        return
+    async with AsyncSessionLocal() as db:
+        db.add(SchemaVersion(version=version))
+        await db.commit()
+
+async def warm_db_pools(size: int):
+    """预先建立数据库连接，连接释放后保留在连接池中"""
+    for pool_engine in {engine, read_engine} - {None}:
+        count = min(size, pool_engine.pool.size())
+        connections = await asyncio.gather(*(pool_engine.connect() for _ in range(count)))
+        try:
+            for conn in connections:
+                await conn.execute(text("SELECT 1"))
+        finally:
+            for conn in connections:
+                await conn.close()
+
+async def warm_async_redis_pool(size: int):
+    """预先建立异步Redis连接（请求路径上使用的连接池），连接释放后保留在连接池中"""
+    pool = redis_core.async_redis_pool
+    if pool is None:
+        return
+    connections = []
+    try:
+        for _ in range(size):
+            conn = await pool.get_connection()
+            connections.append(conn)
+            await conn.connect()
+    except Exception as e:
+        logger.warning(f"Async Redis pool warmup failed: {e}")
+    finally:
+        for conn in connections:
+            await pool.release(conn)
+
+def warm_redis_pool(size: int):
+    """预先建立Redis连接，连接释放后保留在连接池中"""
+    if redis_core.redis_pool is None:
+        return
+    connections = []
+    try:
+        for _ in range(size):
+            conn = redis_core.redis_pool.get_connection("PING")
+            connections.append(conn)
+            conn.connect()
+    except Exception as e:
+        logger.warning(f"Redis pool warmup failed: {e}")
+    finally:
+        for conn in connections:
+            redis_core.redis_pool.release(conn)
+
+async def preload_caches():
+    """执行已注册的缓存预加载函数，单项失败不影响启动"""
+    for name, func in _preloaders:
+        try:
+            await func()
+        except Exception as e:
+            logger.warning(f"Cache preload '{name}' failed: {e}")
+
+async def run_startup(import_time: float | None = None):
+    """
+    执行应用启动流程，并记录各阶段耗时
+    :param import_time: 应用模块（含路由）导入耗时（秒）
+    """
+    timings: dict[str, float] = {}
+    if import_time is not None:
+        timings["import"] = import_time
+
+    async def step(name: str, func: Callable[[], Awaitable[None]]):
+        started = time.perf_counter()
+        await func()
+        timings[name] = time.perf_counter() - started
+
+    # 初始化Redis连接池
+    await step("redis_pool", redis_core.init_redis_pool)
+    # 检查数据库结构
+    await step("schema", ensure_schema)
+    # 预热连接池
+    if settings.db_pool_warmup > 0:
+        await step("db_warmup", lambda: warm_db_pools(settings.db_pool_warmup))
+    if settings.redis_pool_warmup > 0:
+        await step("redis_warmup", lambda: asyncio.to_thread(warm_redis_pool, settings.redis_pool_warmup))
+        await step("async_redis_warmup", lambda: warm_async_redis_pool(settings.redis_pool_warmup))
+    # 预加载热点缓存
+    if settings.startup_preload_caches and _preloaders:
+        await step("preload", preload_caches)
+
+    breakdown = ", ".join(f"{name}={seconds:.3f}s" for name, seconds in timings.items())
+    logger.info(f"Startup completed in {sum(timings.values()):.3f}s ({breakdown})")
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Awaitable, Callable
+from app.core import redis as redis_core
+from app.core.logger import logger
+
+class PeriodicTask:
+    """在事件循环中按固定间隔执行的后台任务，单次执行失败只记录日志"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable[object]], interval: float, exclusive: bool = False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.exclusive = exclusive
+        self._task: asyncio.Task | None = None
+        self._failing = False
+
+    async def _acquire_turn(self) -> bool:
+        """
+        独占任务在每个执行间隔内只由一个工作进程执行：先取得Redis中的租约（有效期为一个间隔）的进程执行，
+        其他进程跳过本轮；Redis不可用时在本进程执行
+        """
+        try:
+            client = redis_core.get_async_redis_client()
+            return bool(await client.set(f"ims:task_lease:{self.name}", "1", nx=True, px=int(self.interval * 1000)))
+        except Exception as e:
+            logger.debug(f"Periodic task '{self.name}' lease unavailable, running locally: {e}")
+            return True
+
+    async def run_once(self):
+        if self.exclusive and not await self._acquire_turn():
+            return
+        try:
+            await self.func()
+        except Exception as e:
+            # 连续失败（如Redis不可用）时只在第一次记录完整堆栈
+            if self._failing:
+                logger.debug(f"Periodic task '{self.name}' still failing: {e}")
+            else:
+                logger.exception(f"Periodic task '{self.name}' failed")
+            self._failing = True
+        else:
+            if self._failing:
+                logger.info(f"Periodic task '{self.name}' recovered")
+            self._failing = False
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """停止任务，并最后执行一次，处理完剩余的工作"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.run_once()
+
+# 已注册的后台任务，由各模块通过register_periodic_task注册
+_periodic_tasks: list[PeriodicTask] = []
+
+def register_periodic_task(name: str, func: Callable[[], Awaitable[object]], interval: float, exclusive: bool = False):
+    """
+    注册应用运行期间定期执行的后台任务
+    :param name: 任务名称，用于日志
+    :param func: 无参数的异步函数
+    :param interval: 执行间隔（秒）
+    :param exclusive: 多个工作进程中每个间隔只执行一次（处理共享数据的任务，避免各进程并发处理同一批记录）
+    """
+    _periodic_tasks.append(PeriodicTask(name, func, interval, exclusive))
+
+def start_periodic_tasks():
+    """应用启动后调用，启动所有后台任务"""
+    for task in _periodic_tasks:
+        task.start()
+
+async def stop_periodic_tasks():
+    """应用关闭时调用，停止所有后台任务"""
+    for task in _periodic_tasks:
+        await task.stop()
@@ -0,0 +1,118 @@
+import time
+from sqlalchemy import delete, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.tasks import register_periodic_task
+from app.crud.product import _inventory_load_options, load_shard_totals_async
+from app.models.change import ChangeLog
+from app.models.product import Product, Warehouse, Inventory
+from app.schemas.product import ProductResponse, WarehouseResponse, InventoryResponse
+
+# 变更日志相关操作
+
+# 实体类型 -> (模型, 响应结构)
+_ENTITIES = {
+    "product": (Product, ProductResponse),
+    "warehouse": (Warehouse, WarehouseResponse),
+    "inventory": (Inventory, InventoryResponse),
+}
+
+# 清理变更日志后写入的水位标记，entity_id为已清理的最大序号
+_FEED_ENTITY = "feed"
+
+async def get_pruned_seq_async(db: AsyncSession) -> int:
+    """已清理的最大变更序号，游标小于该值的同步方会漏掉变更，需要全量同步"""
+    # 水位单调递增，最新的标记即最大值；按 (entity, seq) 索引倒序取一行
+    statement = (
+        select(ChangeLog.entity_id)
+        .where(ChangeLog.entity == _FEED_ENTITY)
+        .order_by(ChangeLog.seq.desc())
+        .limit(1)
+    )
+    return (await db.execute(statement)).scalar_one_or_none() or 0
+
+async def _load_entities_async(db: AsyncSession, entity: str, ids: list[int]) -> dict:
+    """批量加载实体的当前数据，返回 ID -> 响应结构"""
+    model, response = _ENTITIES[entity]
+    statement = select(model).where(model.id.in_(ids))
+    if model is Inventory:
+        statement = statement.options(*_inventory_load_options)
+    rows = (await db.execute(statement)).scalars().all()
+    if model is Inventory:
+        await load_shard_totals_async(db, rows)
+    return {row.id: response.model_validate(row) for row in rows}
+
+async def get_changes_async(db: AsyncSession, since: int = 0, limit: int = 100, entity: str | None = None) -> dict:
+    """
+    获取序号大于since的变更，每个实体只返回当前数据，删除的实体返回墓碑（data为空）
+    :param since: 上次同步返回的next_since，首次同步为0
+    """
+    if entity is not None and entity not in _ENTITIES:
+        raise ValueError("Unknown entity")
+    if since < await get_pruned_seq_async(db):
+        raise ValueError("Change feed cursor expired")
+    
+    # 只返回提交已超过安全延迟的变更：序号在插入时分配，序号较小的事务可能晚于较大的提交，
+    # 延迟之内的变更留到下一页，避免同步方的游标越过尚未可见的变更
+    cutoff = time.time() - settings.change_feed_safety_lag
+    statement = (
+        select(ChangeLog)
+        .where(ChangeLog.seq > since, ChangeLog.changed_at <= cutoff, ChangeLog.entity != _FEED_ENTITY)
+        .order_by(ChangeLog.seq)
+        .limit(limit + 1)
+    )
+    if entity is not None:
+        statement = statement.where(ChangeLog.entity == entity)
+    entries = (await db.execute(statement)).scalars().all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    
+    # 同一实体在本页内多次修改时只返回最后一次
+    latest: dict[tuple[str, int], ChangeLog] = {}
+    for entry in entries:
+        latest.pop((entry.entity, entry.entity_id), None)
+        latest[(entry.entity, entry.entity_id)] = entry
+    
+    # 每种实体一次查询加载当前数据
+    upserts: dict[str, list[int]] = {}
+    for entry in latest.values():
+        if entry.op != "delete":
+            upserts.setdefault(entry.entity, []).append(entry.entity_id)
+    current = {name: await _load_entities_async(db, name, ids) for name, ids in upserts.items()}
+    
+    changes = []
+    for entry in latest.values():
+        if entry.op == "delete":
+            changes.append({"seq": entry.seq, "entity": entry.entity, "id": entry.entity_id, "op": "delete", "data": None})
+            continue
+        data = current[entry.entity].get(entry.entity_id)
+        if data is None:
+            # 已被之后的变更删除，墓碑会在后续页中返回
+            continue
+        changes.append({"seq": entry.seq, "entity": entry.entity, "id": entry.entity_id, "op": "upsert", "data": data})
+    
+    return {
+        "changes": changes,
+        "next_since": entries[-1].seq if entries else since,
+        "has_more": has_more,
+    }
+
+async def prune_changes() -> int:
+    """清理超过保留期的变更日志，返回清理的记录数"""
+    cutoff = time.time() - settings.change_feed_retention_days * 86400
+    async with AsyncSessionLocal() as db:
+        statement = select(func.max(ChangeLog.seq)).where(ChangeLog.changed_at < cutoff, ChangeLog.entity != _FEED_ENTITY)
+        max_seq = (await db.execute(statement)).scalar_one()
+        if max_seq is None:
+            return 0
+        result = await db.execute(delete(ChangeLog).where(ChangeLog.seq <= max_seq))
+        await db.execute(insert(ChangeLog).values(
+            entity=_FEED_ENTITY, entity_id=max_seq, op="pruned", changed_at=time.time()
+        ))
+        await db.commit()
+    return result.rowcount
+
+if settings.change_feed_retention_days > 0:
+    register_periodic_task("change_feed_prune", prune_changes, settings.change_feed_prune_interval, exclusive=True)
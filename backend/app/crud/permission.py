@@ -1,7 +1,9 @@
 from sqlmodel import select
+from sqlalchemy import func, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import cache, invalidate_cache
 from app.models.permission import Permission
-from app.schemas.permission import PermissionCreate, PermissionUpdate
+from app.schemas.permission import PermissionCreate, PermissionUpdate, PermissionResponse
 
 # 异步操作
 async def get_permission_async(db: AsyncSession, permission_id: int) -> Permission | None:
@@ -17,7 +19,7 @@ async def get_permission_by_name_async(db: AsyncSession, name: str) -> Permissio
 async def get_permissions_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> dict:
     """获取权限列表，支持分页"""
     # 查询权限总数
-    count_statement = select(Permission).count()
+    count_statement = select(func.count()).select_from(Permission)
     count_result = await db.execute(count_statement)
     total = count_result.scalar_one()
     
@@ -34,6 +36,16 @@ async def get_permissions_async(db: AsyncSession, skip: int = 0, limit: int = 10
         "limit": limit
     }
 
+async def get_permission_cached_async(db: AsyncSession, permission_id: int) -> dict | None:
+    """根据权限ID获取权限（两级缓存，返回响应数据）"""
+    return await cache.get_or_load("permission", permission_id, lambda: get_permission_async(db, permission_id), PermissionResponse)
+
+async def get_permissions_cached_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> list[dict]:
+    """获取一页权限（两级缓存，返回响应数据）"""
+    async def load():
+        return (await get_permissions_async(db, skip=skip, limit=limit))["items"]
+    return await cache.get_or_load("permission", f"list:{skip}:{limit}", load, PermissionResponse)
+
 async def create_permission_async(db: AsyncSession, permission: PermissionCreate) -> Permission:
     """创建新权限"""
     # 检查权限名称是否已存在
@@ -47,19 +59,14 @@ async def create_permission_async(db: AsyncSession, permission: PermissionCreate
         description=permission.description
     )
     
-    # 保存到数据库
+    # 保存到数据库（INSERT ... RETURNING 回填主键，由请求级事务统一提交）
     db.add(db_permission)
-    await db.commit()
-    await db.refresh(db_permission)
+    await db.flush()
+    invalidate_cache(db, "permission", [db_permission.id])
     return db_permission
 
 async def update_permission_async(db: AsyncSession, permission_id: int, permission: PermissionUpdate) -> Permission:
     """更新权限信息"""
-    # 获取权限
-    db_permission = await get_permission_async(db, permission_id)
-    if not db_permission:
-        raise ValueError("Permission not found")
-    
     # 更新权限信息
     update_data = permission.model_dump(exclude_unset=True)
     
@@ -69,13 +76,23 @@ async def update_permission_async(db: AsyncSession, permission_id: int, permissi
         if existing_permission and existing_permission.id != permission_id:
             raise ValueError("Permission name already exists")
     
-    # 更新权限对象
-    for key, value in update_data.items():
-        setattr(db_permission, key, value)
+    if not update_data:
+        db_permission = await get_permission_async(db, permission_id)
+    else:
+        # UPDATE ... RETURNING 一次完成更新并返回最新数据
+        statement = (
+            update(Permission)
+            .where(Permission.id == permission_id)
+            .values(**update_data)
+            .returning(Permission)
+        )
+        result = await db.execute(statement)
+        db_permission = result.scalar_one_or_none()
     
-    # 保存到数据库
-    await db.commit()
-    await db.refresh(db_permission)
+    if not db_permission:
+        raise ValueError("Permission not found")
+    if update_data:
+        invalidate_cache(db, "permission", [permission_id])
     return db_permission
 
 async def delete_permission_async(db: AsyncSession, permission_id: int) -> dict:
@@ -87,6 +104,7 @@ async def delete_permission_async(db: AsyncSession, permission_id: int) -> dict:
     
     # 删除权限
     await db.delete(db_permission)
-    await db.commit()
+    await db.flush()
+    invalidate_cache(db, "permission", [permission_id])
     
     return {"message": "Permission deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,145 @@
+from sqlalchemy import Column, Float, Integer, MetaData, Numeric, String, Table, case, cast, delete, exists, func, insert, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateTable
+from sqlmodel import select
+from app.core.cache import invalidate_cache
+from app.core.changes import record_change
+from app.crud.product import product_filter_conditions
+from app.models.product import Product
+from app.schemas.product import BulkPriceUpdate, PriceAdjustment, PriceListItem
+
+# 批量调价相关操作
+# 按筛选条件调价是一条 UPDATE；价目表和商品ID列表先写入会话连接上的临时表，再用一条 UPDATE ... FROM 更新，
+# 不逐个商品查询和提交。
+
+# 临时表只存在于当前数据库连接，不属于模型元数据，不会被建表流程创建
+_staged = Table(
+    "staged_prices",
+    MetaData(),
+    Column("line", Integer, nullable=False),  # 在请求中的序号
+    Column("product_id", Integer),
+    Column("product_code", String),
+    Column("price", Float),
+    Column("cost", Float),
+    prefixes=["TEMPORARY"],
+)
+
+async def _stage(db: AsyncSession, rows: list[dict]):
+    """写入临时表，按商品编码补全商品ID"""
+    await db.execute(CreateTable(_staged, if_not_exists=True))
+    await db.execute(delete(_staged))  # 连接可能被之前的请求用过
+    if not rows:
+        return  # 空的多行插入会变成 INSERT ... DEFAULT VALUES
+    await db.execute(insert(_staged), rows)
+    await db.execute(
+        update(_staged)
+        .where(_staged.c.product_id.is_(None))
+        .values(product_id=select(Product.id).where(Product.code == _staged.c.product_code).scalar_subquery())
+    )
+
+def _adjusted(column, adjustment: PriceAdjustment):
+    """调整后的金额表达式，保留两位小数，不小于0"""
+    if adjustment.mode == "percent":
+        value = column * (1 + adjustment.value / 100)
+    elif adjustment.mode == "absolute":
+        value = column + adjustment.value
+    else:
+        value = adjustment.value
+    value = func.round(cast(value, Numeric), 2)
+    return case((value < 0, 0.0), else_=value)
+
+def _validate_adjustment(name: str, adjustment: PriceAdjustment | None):
+    if adjustment is None:
+        return
+    if adjustment.mode == "percent" and adjustment.value <= -100:
+        raise ValueError(f"{name} percentage must be greater than -100")
+    if adjustment.mode == "set" and adjustment.value < 0:
+        raise ValueError(f"{name} must not be negative")
+
+def _record_updated(db: AsyncSession, product_ids: list[int]):
+    if not product_ids:
+        return  # 空ID列表会清除整个命名空间
+    for product_id in product_ids:
+        record_change(db, "product", product_id)
+    invalidate_cache(db, "product", product_ids)
+
+async def bulk_update_prices_async(db: AsyncSession, request: BulkPriceUpdate) -> dict:
+    """按筛选条件（类别、编码前缀、商品ID列表）批量调整售价和成本"""
+    if request.price is None and request.cost is None:
+        raise ValueError("Nothing to update: price or cost adjustment is required")
+    _validate_adjustment("Price", request.price)
+    _validate_adjustment("Cost", request.cost)
+    product_filter = request.filter
+    if product_filter.category is None and not product_filter.code_prefix and product_filter.ids is None:
+        raise ValueError("At least one filter is required")
+
+    conditions = product_filter_conditions(product_filter)
+    if product_filter.ids is not None:
+        # ID列表写入临时表，不受绑定参数个数的限制
+        await _stage(db, [{"line": line, "product_id": product_id} for line, product_id in enumerate(product_filter.ids)])
+        conditions.append(Product.id.in_(select(_staged.c.product_id)))
+
+    values = {}
+    changed = []
+    if request.price is not None:
+        values["price"] = _adjusted(Product.price, request.price)
+        changed.append(Product.price != values["price"])
+    if request.cost is not None:
+        values["cost"] = _adjusted(Product.cost, request.cost)
+        changed.append(Product.cost != values["cost"])
+
+    matched = (await db.execute(select(func.count()).select_from(Product).where(*conditions))).scalar_one()
+    statement = (
+        update(Product)
+        .where(*conditions, or_(*changed))
+        .values(**values)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = (await db.execute(statement)).scalars().all()
+    if product_filter.ids is not None:
+        await db.execute(delete(_staged))
+    _record_updated(db, updated)
+    return {"matched": matched, "updated": len(updated), "unknown": []}
+
+async def apply_price_list_async(db: AsyncSession, items: list[PriceListItem]) -> dict:
+    """按价目表设置售价和成本（UPDATE ... FROM 临时表），只更新每项给出的字段"""
+    rows = []
+    for line, item in enumerate(items):
+        if item.product_id is None and not item.product_code:
+            raise ValueError(f"Price list item {line} has no product_id or product_code")
+        if item.price is None and item.cost is None:
+            raise ValueError(f"Price list item {line} has neither price nor cost")
+        rows.append({"line": line, **item.model_dump()})
+    await _stage(db, rows)
+
+    # 不存在的商品在结果中列出，同一商品出现多次时报错
+    unknown_condition = or_(_staged.c.product_id.is_(None), ~exists().where(Product.id == _staged.c.product_id))
+    unknown = (await db.execute(select(_staged.c.line).where(unknown_condition).order_by(_staged.c.line))).scalars().all()
+    duplicate = (await db.execute(
+        select(_staged.c.product_id)
+        .where(~unknown_condition)
+        .group_by(_staged.c.product_id)
+        .having(func.count() > 1)
+        .limit(1)
+    )).scalar_one_or_none()
+    if duplicate is not None:
+        raise ValueError(f"Product {duplicate} appears more than once in the price list")
+
+    new_price = func.coalesce(_staged.c.price, Product.price)
+    new_cost = func.coalesce(_staged.c.cost, Product.cost)
+    statement = (
+        update(Product)
+        .where(Product.id == _staged.c.product_id, or_(Product.price != new_price, Product.cost != new_cost))
+        .values(price=new_price, cost=new_cost)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = (await db.execute(statement)).scalars().all()
+    await db.execute(delete(_staged))
+    _record_updated(db, updated)
+    return {
+        "matched": len(items) - len(unknown),
+        "updated": len(updated),
+        "unknown": [items[line] for line in unknown],
+    }
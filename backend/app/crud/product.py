@@ -1,14 +1,33 @@
+import asyncio
+import random
+from sqlalchemy import Select, case, delete, exists, func, insert, or_, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import aliased, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlmodel import select
-from app.models.product import Product, Warehouse, Inventory
+from app.core.batching import GroupCommitBatcher
+from app.core.cache import cache, invalidate_cache, publish_pending_invalidations
+from app.core.changes import record_change
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.dataloader import DataLoader, get_loader
+from app.core.events import queue_event, publish_pending_events, discard_pending_events
+from app.core.logger import logger
+from app.core.singleflight import single_flight
+from app.core.startup import register_preloader
+from app.core.tasks import register_periodic_task
+from app.models.product import Product, Warehouse, Inventory, InventoryShard, LowStockItem
+from app.models.reservation import ConfirmedReservation
 from app.schemas.product import (
-    ProductCreate, ProductUpdate,
-    WarehouseCreate, WarehouseUpdate,
-    InventoryCreate, InventoryUpdate
+    ProductCreate, ProductUpdate, ProductResponse, ProductFilter,
+    WarehouseCreate, WarehouseUpdate, WarehouseResponse,
+    InventoryCreate, InventoryUpdate, TransferCreate
 )
 
 # 商品相关CRUD操作
 
+@single_flight("product.get")
 async def get_product_async(db: AsyncSession, product_id: int) -> Product | None:
     """根据商品ID获取商品"""
     return await db.get(Product, product_id)
@@ -19,10 +38,20 @@ async def get_product_by_code_async(db: AsyncSession, code: str) -> Product | No
     result = await db.execute(statement)
     return result.scalar_one_or_none()
 
+def product_filter_conditions(product_filter: ProductFilter) -> list:
+    """商品筛选条件中类别和编码前缀对应的查询条件（ID列表由调用方处理）"""
+    conditions = []
+    if product_filter.category is not None:
+        conditions.append(Product.category == product_filter.category)
+    if product_filter.code_prefix:
+        conditions.append(Product.code.startswith(product_filter.code_prefix, autoescape=True))
+    return conditions
+
+@single_flight("product.list")
 async def get_products_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> dict:
     """获取商品列表，支持分页"""
     # 查询商品总数
-    count_statement = select(Product).count()
+    count_statement = select(func.count()).select_from(Product)
     count_result = await db.execute(count_statement)
     total = count_result.scalar_one()
     
@@ -39,6 +68,16 @@ async def get_products_async(db: AsyncSession, skip: int = 0, limit: int = 100)
         "limit": limit
     }
 
+async def get_product_cached_async(db: AsyncSession, product_id: int) -> dict | None:
+    """根据商品ID获取商品（两级缓存，返回响应数据）"""
+    return await cache.get_or_load("product", product_id, lambda: get_product_async(db, product_id), ProductResponse)
+
+async def get_products_cached_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> list[dict]:
+    """获取一页商品（两级缓存，返回响应数据）"""
+    async def load():
+        return (await get_products_async(db, skip=skip, limit=limit))["items"]
+    return await cache.get_or_load("product", f"list:{skip}:{limit}", load, ProductResponse)
+
 async def create_product_async(db: AsyncSession, product: ProductCreate) -> Product:
     """创建新商品"""
     # 检查商品编码是否已存在
@@ -54,22 +93,19 @@ async def create_product_async(db: AsyncSession, product: ProductCreate) -> Prod
         category=product.category,
         unit=product.unit,
         price=product.price,
-        cost=product.cost
+        cost=product.cost,
+        reorder_point=product.reorder_point
     )
     
-    # 保存到数据库
+    # 保存到数据库（INSERT ... RETURNING 回填主键，由请求级事务统一提交）
     db.add(db_product)
-    await db.commit()
-    await db.refresh(db_product)
+    await db.flush()
+    record_change(db, "product", db_product.id)
+    invalidate_cache(db, "product", [db_product.id])
     return db_product
 
 async def update_product_async(db: AsyncSession, product_id: int, product: ProductUpdate) -> Product:
     """更新商品信息"""
-    # 获取商品
-    db_product = await get_product_async(db, product_id)
-    if not db_product:
-        raise ValueError("Product not found")
-    
     # 更新商品信息
     update_data = product.model_dump(exclude_unset=True)
     
@@ -79,26 +115,35 @@ async def update_product_async(db: AsyncSession, product_id: int, product: Produ
         if existing_product and existing_product.id != product_id:
             raise ValueError("Product code already exists")
     
-    # 更新商品对象
-    for key, value in update_data.items():
-        setattr(db_product, key, value)
+    if not update_data:
+        db_product = await get_product_async(db, product_id)
+    else:
+        # UPDATE ... RETURNING 一次完成更新并返回最新数据
+        statement = (
+            update(Product)
+            .where(Product.id == product_id)
+            .values(**update_data)
+            .returning(Product)
+        )
+        result = await db.execute(statement)
+        db_product = result.scalar_one_or_none()
     
-    # 保存到数据库
-    await db.commit()
-    await db.refresh(db_product)
-    return db_product
-
-async def delete_product_async(db: AsyncSession, product_id: int) -> dict:
-    """删除商品"""
-    # 获取商品
-    db_product = await get_product_async(db, product_id)
     if not db_product:
         raise ValueError("Product not found")
+    if update_data:
+        record_change(db, "product", product_id)
+        invalidate_cache(db, "product", [product_id])
     
-    # 删除商品
-    await db.delete(db_product)
-    await db.commit()
-    
+    # 商品补货点变化会影响该商品所有未单独设置补货点的库存
+    if "reorder_point" in update_data:
+        await refresh_low_stock_async(db, product_ids=[product_id])
+    return db_product
+
+async def delete_product_async(db: AsyncSession, product_id: int, on_inventory: str = "block") -> dict:
+    """删除商品（与批量删除相同的集合删除）"""
+    result = await delete_products_by_ids_async(db, [product_id], on_inventory=on_inventory)
+    if not result["deleted"]:
+        raise ValueError("Product not found")
     return {"message": "Product deleted successfully"}
 
 # 仓库相关CRUD操作
@@ -116,7 +161,7 @@ async def get_warehouse_by_name_async(db: AsyncSession, name: str) -> Warehouse
 async def get_warehouses_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> dict:
     """获取仓库列表，支持分页"""
     # 查询仓库总数
-    count_statement = select(Warehouse).count()
+    count_statement = select(func.count()).select_from(Warehouse)
     count_result = await db.execute(count_statement)
     total = count_result.scalar_one()
     
@@ -133,6 +178,24 @@ async def get_warehouses_async(db: AsyncSession, skip: int = 0, limit: int = 100
         "limit": limit
     }
 
+async def get_warehouse_cached_async(db: AsyncSession, warehouse_id: int) -> dict | None:
+    """根据仓库ID获取仓库（两级缓存，返回响应数据）"""
+    return await cache.get_or_load("warehouse", warehouse_id, lambda: get_warehouse_async(db, warehouse_id), WarehouseResponse)
+
+async def get_warehouses_cached_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> list[dict]:
+    """获取一页仓库（两级缓存，返回响应数据）"""
+    async def load():
+        return (await get_warehouses_async(db, skip=skip, limit=limit))["items"]
+    return await cache.get_or_load("warehouse", f"list:{skip}:{limit}", load, WarehouseResponse)
+
+async def preload_catalog_cache():
+    """启动时预加载商品和仓库列表的第一页"""
+    async with AsyncSessionLocal() as db:
+        await get_products_cached_async(db)
+        await get_warehouses_cached_async(db)
+
+register_preloader("catalog_cache", preload_catalog_cache)
+
 async def create_warehouse_async(db: AsyncSession, warehouse: WarehouseCreate) -> Warehouse:
     """创建新仓库"""
     # 检查仓库名称是否已存在
@@ -147,19 +210,15 @@ async def create_warehouse_async(db: AsyncSession, warehouse: WarehouseCreate) -
         description=warehouse.description
     )
     
-    # 保存到数据库
+    # 保存到数据库（INSERT ... RETURNING 回填主键，由请求级事务统一提交）
     db.add(db_warehouse)
-    await db.commit()
-    await db.refresh(db_warehouse)
+    await db.flush()
+    record_change(db, "warehouse", db_warehouse.id)
+    invalidate_cache(db, "warehouse", [db_warehouse.id])
     return db_warehouse
 
 async def update_warehouse_async(db: AsyncSession, warehouse_id: int, warehouse: WarehouseUpdate) -> Warehouse:
     """更新仓库信息"""
-    # 获取仓库
-    db_warehouse = await get_warehouse_async(db, warehouse_id)
-    if not db_warehouse:
-        raise ValueError("Warehouse not found")
-    
     # 更新仓库信息
     update_data = warehouse.model_dump(exclude_unset=True)
     
@@ -169,51 +228,87 @@ async def update_warehouse_async(db: AsyncSession, warehouse_id: int, warehouse:
         if existing_warehouse and existing_warehouse.id != warehouse_id:
             raise ValueError("Warehouse name already exists")
     
-    # 更新仓库对象
-    for key, value in update_data.items():
-        setattr(db_warehouse, key, value)
+    if not update_data:
+        db_warehouse = await get_warehouse_async(db, warehouse_id)
+    else:
+        # UPDATE ... RETURNING 一次完成更新并返回最新数据
+        statement = (
+            update(Warehouse)
+            .where(Warehouse.id == warehouse_id)
+            .values(**update_data)
+            .returning(Warehouse)
+        )
+        result = await db.execute(statement)
+        db_warehouse = result.scalar_one_or_none()
     
-    # 保存到数据库
-    await db.commit()
-    await db.refresh(db_warehouse)
+    if not db_warehouse:
+        raise ValueError("Warehouse not found")
+    if update_data:
+        record_change(db, "warehouse", warehouse_id)
+        invalidate_cache(db, "warehouse", [warehouse_id])
     return db_warehouse
 
-async def delete_warehouse_async(db: AsyncSession, warehouse_id: int) -> dict:
-    """删除仓库"""
-    # 获取仓库
-    db_warehouse = await get_warehouse_async(db, warehouse_id)
-    if not db_warehouse:
+async def delete_warehouse_async(db: AsyncSession, warehouse_id: int, on_inventory: str = "nullify") -> dict:
+    """删除仓库（与批量删除相同的集合删除），默认该仓库的库存解除关联"""
+    result = await delete_warehouses_async(db, [warehouse_id], on_inventory=on_inventory)
+    if not result["deleted"]:
         raise ValueError("Warehouse not found")
-    
-    # 删除仓库
-    await db.delete(db_warehouse)
-    await db.commit()
-    
     return {"message": "Warehouse deleted successfully"}
 
 # 库存相关CRUD操作
 
+# 库存响应需要商品和仓库信息，查询库存时一并加载
+_inventory_load_options = (selectinload(Inventory.product), selectinload(Inventory.warehouse))
+
+@single_flight("inventory.get")
 async def get_inventory_async(db: AsyncSession, inventory_id: int) -> Inventory | None:
     """根据库存ID获取库存"""
-    return await db.get(Inventory, inventory_id)
+    inventory = await db.get(Inventory, inventory_id, options=_inventory_load_options)
+    await load_shard_totals_async(db, [inventory])
+    return inventory
+
+_AMBIGUOUS_WAREHOUSE = "Product has inventory in several warehouses; specify warehouse_id"
+
+def _warehouse_condition(warehouse_id: int | None):
+    """库存所在仓库的匹配条件，None匹配未分配仓库的库存"""
+    return Inventory.warehouse_id.is_(None) if warehouse_id is None else Inventory.warehouse_id == warehouse_id
 
-async def get_inventory_by_product_async(db: AsyncSession, product_id: int) -> Inventory | None:
-    """根据商品ID获取库存"""
+async def _find_product_inventory(db: AsyncSession, product_id: int, warehouse_id: int | None = None) -> Inventory | None:
+    """
+    商品在指定仓库的库存；未指定仓库时为该商品唯一的库存记录
+    商品在多个仓库有库存而未指定仓库时报错
+    """
     statement = select(Inventory).where(Inventory.product_id == product_id)
-    result = await db.execute(statement)
-    return result.scalar_one_or_none()
+    if warehouse_id is not None:
+        statement = statement.where(Inventory.warehouse_id == warehouse_id)
+    inventories = (await db.execute(statement.order_by(Inventory.id).limit(2))).scalars().all()
+    if len(inventories) > 1:
+        raise ValueError(_AMBIGUOUS_WAREHOUSE)
+    return inventories[0] if inventories else None
+
+async def get_inventory_by_product_async(db: AsyncSession, product_id: int, warehouse_id: int | None = None) -> Inventory | None:
+    """根据商品ID（和仓库ID）获取库存"""
+    inventory = await _find_product_inventory(db, product_id, warehouse_id)
+    await load_shard_totals_async(db, [inventory])
+    return inventory
+
+async def get_inventory_quantity_async(db: AsyncSession, product_id: int) -> int | None:
+    """获取商品在所有仓库的实时库存总数，没有库存记录时返回None"""
+    statement = select(func.sum(inventory_quantity_expression())).where(Inventory.product_id == product_id)
+    return (await db.execute(statement)).scalar_one()
 
 async def get_inventories_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> dict:
     """获取库存列表，支持分页"""
     # 查询库存总数
-    count_statement = select(Inventory).count()
+    count_statement = select(func.count()).select_from(Inventory)
     count_result = await db.execute(count_statement)
     total = count_result.scalar_one()
     
     # 查询库存列表，包含商品和仓库信息
-    statement = select(Inventory).offset(skip).limit(limit)
+    statement = select(Inventory).options(*_inventory_load_options).offset(skip).limit(limit)
     result = await db.execute(statement)
     inventories = result.scalars().all()
+    await load_shard_totals_async(db, inventories)
     
     # 返回包含总数和库存列表的字典
     return {
@@ -231,31 +326,46 @@ async def create_inventory_async(db: AsyncSession, inventory: InventoryCreate) -
         raise ValueError("Product not found")
     
     # 检查仓库是否存在（如果指定了仓库）
+    warehouse = None
     if inventory.warehouse_id:
         warehouse = await get_warehouse_async(db, inventory.warehouse_id)
         if not warehouse:
             raise ValueError("Warehouse not found")
     
+    # 每个商品在每个仓库只有一条库存记录
+    await _check_inventory_unique(db, inventory.product_id, inventory.warehouse_id)
+    
     # 创建库存对象
     db_inventory = Inventory(
         product_id=inventory.product_id,
         quantity=inventory.quantity,
-        warehouse_id=inventory.warehouse_id
+        warehouse_id=inventory.warehouse_id,
+        reorder_point=inventory.reorder_point
     )
     
-    # 保存到数据库
+    # 保存到数据库（INSERT ... RETURNING 回填主键，由请求级事务统一提交）
     db.add(db_inventory)
-    await db.commit()
-    await db.refresh(db_inventory)
+    await db.flush()
+    
+    # 复用已查询的商品和仓库，避免重新加载关联数据
+    set_committed_value(db_inventory, "product", product)
+    set_committed_value(db_inventory, "warehouse", warehouse)
+    await _update_low_stock(db, db_inventory, was_low=False)
+    queue_inventory_event(db, "create", db_inventory)
     return db_inventory
 
+async def _check_inventory_unique(
+    db: AsyncSession, product_id, warehouse_id: int | None, exclude_inventory_id: int | None = None
+):
+    """商品在该仓库已有库存记录时报错；product_id可以是按库存ID查询商品ID的子查询"""
+    statement = select(Inventory.id).where(Inventory.product_id == product_id, _warehouse_condition(warehouse_id))
+    if exclude_inventory_id is not None:
+        statement = statement.where(Inventory.id != exclude_inventory_id)
+    if (await db.execute(statement.limit(1))).scalar_one_or_none() is not None:
+        raise ValueError("Inventory for this product and warehouse already exists")
+
 async def update_inventory_async(db: AsyncSession, inventory_id: int, inventory: InventoryUpdate) -> Inventory:
     """更新库存信息"""
-    # 获取库存
-    db_inventory = await get_inventory_async(db, inventory_id)
-    if not db_inventory:
-        raise ValueError("Inventory not found")
-    
     # 更新库存信息
     update_data = inventory.model_dump(exclude_unset=True)
     
@@ -265,46 +375,836 @@ async def update_inventory_async(db: AsyncSession, inventory_id: int, inventory:
         if not warehouse:
             raise ValueError("Warehouse not found")
     
-    # 更新库存对象
-    for key, value in update_data.items():
-        setattr(db_inventory, key, value)
+    # 移到其他仓库时，目标仓库不能已有该商品的库存
+    if "warehouse_id" in update_data:
+        product_id = select(Inventory.product_id).where(Inventory.id == inventory_id).scalar_subquery()
+        await _check_inventory_unique(db, product_id, update_data["warehouse_id"], exclude_inventory_id=inventory_id)
+    
+    if not update_data:
+        db_inventory = await get_inventory_async(db, inventory_id)
+    else:
+        # UPDATE ... RETURNING 一次完成更新并返回最新数据
+        statement = (
+            update(Inventory)
+            .where(Inventory.id == inventory_id)
+            .values(**update_data)
+            .returning(Inventory)
+            .options(*_inventory_load_options)
+        )
+        result = await db.execute(statement)
+        db_inventory = result.scalar_one_or_none()
     
-    # 保存到数据库
-    await db.commit()
-    await db.refresh(db_inventory)
-    return db_inventory
-
-async def delete_inventory_async(db: AsyncSession, inventory_id: int) -> dict:
-    """删除库存"""
-    # 获取库存
-    db_inventory = await get_inventory_async(db, inventory_id)
     if not db_inventory:
         raise ValueError("Inventory not found")
     
-    # 删除库存
-    await db.delete(db_inventory)
-    await db.commit()
+    # 分片库存直接设置数量时，把新数量重新分配到各分片
+    if db_inventory.shard_count > 1 and "quantity" in update_data:
+        await _reset_shards_async(db, db_inventory.id, db_inventory.shard_count, update_data["quantity"])
+    else:
+        await load_shard_totals_async(db, [db_inventory])
     
+    # 数量、补货点或仓库都可能变化，重新计算该库存在低库存集合中的记录
+    if update_data:
+        await _sync_low_stock(db, [db_inventory])
+        queue_inventory_event(db, "update", db_inventory)
+    return db_inventory
+
+async def delete_inventory_async(db: AsyncSession, inventory_id: int) -> dict:
+    """删除库存（与批量删除相同的集合删除）"""
+    result = await delete_inventories_async(db, [inventory_id])
+    if not result["deleted"]:
+        raise ValueError("Inventory not found")
     return {"message": "Inventory deleted successfully"}
 
-async def update_inventory_quantity_async(db: AsyncSession, product_id: int, quantity_change: int) -> Inventory:
-    """更新商品库存数量（用于入库/出库）"""
-    # 查找库存记录
-    inventory = await get_inventory_by_product_async(db, product_id)
+async def update_inventory_quantity_async(
+    db: AsyncSession, product_id: int, quantity_change: int, warehouse_id: int | None = None
+) -> Inventory:
+    """
+    更新商品库存数量（用于入库/出库）
+    :param warehouse_id: 出入库的仓库；未指定时商品只能有一条库存记录，没有库存记录时入库到未分配仓库的新库存
+    """
+    # 组提交模式下，由批处理器在独立事务中与其他并发出入库一起提交
+    if settings.inventory_group_commit:
+        return await inventory_batcher.submit((product_id, warehouse_id, quantity_change))
     
+    # 条件更新：库存充足时原子地增减数量，并发出入库不会相互覆盖（分片库存不更新库存行）
+    conditions = [
+        Inventory.product_id == product_id,
+        Inventory.shard_count == 1,
+        Inventory.quantity + quantity_change >= 0
+    ]
+    if warehouse_id is not None:
+        conditions.append(Inventory.warehouse_id == warehouse_id)
+    else:
+        # 未指定仓库时只更新商品唯一的库存记录，有多条时由下面的查询报错
+        other = aliased(Inventory)
+        conditions.append(~exists().where(other.product_id == product_id, other.id != Inventory.id))
+    statement = (
+        update(Inventory)
+        .where(*conditions)
+        .values(quantity=Inventory.quantity + quantity_change)
+        .returning(Inventory)
+        .options(*_inventory_load_options)
+    )
+    result = await db.execute(statement)
+    inventory = result.scalar_one_or_none()
     if inventory:
-        # 更新现有库存
-        inventory.quantity += quantity_change
-        if inventory.quantity < 0:
-            raise ValueError("Insufficient inventory")
+        # 补货点未变，变化前是否低于补货点可由变化前的数量得出
+        was_low = inventory.quantity - quantity_change < _effective_reorder_point(inventory)
+        await _update_low_stock(db, inventory, was_low=was_low)
+        queue_inventory_event(db, "move", inventory, change=quantity_change)
+        return inventory
+    
+    # 没有更新任何记录：分片库存、库存不足、未指定仓库而商品有多条库存，或还没有库存记录
+    inventory = await _find_product_inventory(db, product_id, warehouse_id)
+    if inventory is not None and inventory.shard_count > 1:
+        await db.refresh(inventory, attribute_names=["product", "warehouse"])
+        total = await move_sharded_inventory_async(db, inventory, quantity_change)
+        set_committed_value(inventory, "quantity", total)
+        was_low = total - quantity_change < _effective_reorder_point(inventory)
+        await _update_low_stock(db, inventory, was_low=was_low)
+        queue_inventory_event(db, "move", inventory, change=quantity_change)
+        return inventory
+    if quantity_change < 0 or inventory is not None:
+        raise ValueError("Insufficient inventory")
+    
+    product = await get_product_async(db, product_id)
+    if not product:
+        raise ValueError("Product not found")
+    warehouse = None
+    if warehouse_id is not None:
+        warehouse = await get_warehouse_async(db, warehouse_id)
+        if not warehouse:
+            raise ValueError("Warehouse not found")
+    
+    # 创建新库存记录
+    inventory = Inventory(
+        product_id=product_id,
+        quantity=quantity_change,
+        warehouse_id=warehouse_id
+    )
+    db.add(inventory)
+    await db.flush()
+    set_committed_value(inventory, "product", product)
+    set_committed_value(inventory, "warehouse", warehouse)
+    await _update_low_stock(db, inventory, was_low=False)
+    queue_inventory_event(db, "move", inventory, change=quantity_change)
+    return inventory
+
+def queue_inventory_event(db: AsyncSession, op: str, inventory: Inventory, change: int | None = None):
+    """登记库存变更：事务提交时写入变更日志，提交后发布事件给实时订阅者"""
+    queue_inventory_event_values(
+        db, op, inventory.id, inventory.product_id, inventory.warehouse_id, inventory.quantity, change
+    )
+
+def queue_inventory_event_values(
+    db: AsyncSession, op: str, inventory_id: int, product_id: int, warehouse_id: int | None, quantity: int,
+    change: int | None = None
+):
+    """同queue_inventory_event，用于批量操作中没有加载ORM对象的库存"""
+    record_change(db, "inventory", inventory_id, "delete" if op == "delete" else "upsert")
+    queue_event(db, {
+        "op": op,
+        "inventory_id": inventory_id,
+        "product_id": product_id,
+        "warehouse_id": warehouse_id,
+        "quantity": quantity,
+        "change": change,
+    })
+
+# 库存调拨
+
+async def _check_transfer_targets(db: AsyncSession, product_ids: set[int], warehouse_ids: set[int]):
+    """检查调拨涉及的商品和仓库是否存在"""
+    found = set((await db.execute(select(Product.id).where(Product.id.in_(product_ids)))).scalars().all())
+    if found != product_ids:
+        raise ValueError(f"Product not found: {min(product_ids - found)}")
+    if warehouse_ids:
+        found = set((await db.execute(select(Warehouse.id).where(Warehouse.id.in_(warehouse_ids)))).scalars().all())
+        if found != warehouse_ids:
+            raise ValueError(f"Warehouse not found: {min(warehouse_ids - found)}")
+
+async def transfer_inventory_async(db: AsyncSession, transfers: list[TransferCreate]) -> dict:
+    """
+    在一个事务中执行调拨（单笔或整张调拨单）：源库存减少、目标库存增加，任一行失败则整单不生效
+    同一库存出现在多行时按净变化处理；目标仓库还没有该商品的库存时新建库存
+    """
+    deltas: dict[tuple[int, int | None], int] = {}
+    for transfer in transfers:
+        if transfer.from_warehouse_id == transfer.to_warehouse_id:
+            raise ValueError("Source and destination warehouse must differ")
+        source = (transfer.product_id, transfer.from_warehouse_id)
+        destination = (transfer.product_id, transfer.to_warehouse_id)
+        deltas[source] = deltas.get(source, 0) - transfer.quantity
+        deltas[destination] = deltas.get(destination, 0) + transfer.quantity
+    product_ids = {product_id for product_id, _ in deltas}
+    await _check_transfer_targets(db, product_ids, {warehouse_id for _, warehouse_id in deltas if warehouse_id is not None})
+
+    # 一条语句按库存ID顺序锁定全部涉及的库存，所有调拨按相同顺序加锁，并发调拨不会相互死锁
+    statement = (
+        select(Inventory)
+        .where(
+            Inventory.product_id.in_(product_ids),
+            tuple_(Inventory.product_id, func.coalesce(Inventory.warehouse_id, 0)).in_(
+                [(product_id, warehouse_id or 0) for product_id, warehouse_id in deltas]
+            ),
+        )
+        .order_by(Inventory.id)
+        .with_for_update()
+    )
+    inventories = {
+        (inventory.product_id, inventory.warehouse_id): inventory
+        for inventory in (await db.execute(statement)).scalars().all()
+    }
+    for (product_id, warehouse_id), change in deltas.items():
+        if change < 0 and (product_id, warehouse_id) not in inventories:
+            raise ValueError(f"Insufficient inventory for product {product_id} in warehouse {warehouse_id}")
+
+    results = []
+    for (product_id, warehouse_id), inventory in inventories.items():
+        change = deltas[(product_id, warehouse_id)]
+        if change == 0:
+            continue
+        if inventory.shard_count > 1:
+            try:
+                quantity = await move_sharded_inventory_async(db, inventory, change)
+            except ValueError:
+                quantity = None
+        else:
+            # 条件更新：没有行锁的数据库（SQLite）上也不会把库存减为负数
+            statement = (
+                update(Inventory)
+                .where(Inventory.id == inventory.id, Inventory.quantity + change >= 0)
+                .values(quantity=Inventory.quantity + change)
+                .returning(Inventory.quantity)
+                .execution_options(synchronize_session=False)
+            )
+            quantity = (await db.execute(statement)).scalar_one_or_none()
+        if quantity is None:
+            raise ValueError(f"Insufficient inventory for product {product_id} in warehouse {warehouse_id}")
+        set_committed_value(inventory, "quantity", quantity)
+        results.append((inventory.id, product_id, warehouse_id, quantity, change))
+
+    created = [
+        {"product_id": product_id, "warehouse_id": warehouse_id, "quantity": change}
+        for (product_id, warehouse_id), change in deltas.items()
+        if (product_id, warehouse_id) not in inventories and change > 0
+    ]
+    if created:
+        statement = insert(Inventory).returning(
+            Inventory.id, Inventory.product_id, Inventory.warehouse_id, Inventory.quantity
+        )
+        for inventory_id, product_id, warehouse_id, quantity in (await db.execute(statement, created)).all():
+            results.append((inventory_id, product_id, warehouse_id, quantity, quantity))
+
+    await refresh_low_stock_async(db, sorted(product_ids))
+    results.sort()
+    for inventory_id, product_id, warehouse_id, quantity, change in results:
+        queue_inventory_event_values(db, "transfer", inventory_id, product_id, warehouse_id, quantity, change=change)
+    return {
+        "lines": len(transfers),
+        "quantity": sum(transfer.quantity for transfer in transfers),
+        "inventories": [
+            {"inventory_id": inventory_id, "product_id": product_id, "warehouse_id": warehouse_id, "quantity": quantity, "change": change}
+            for inventory_id, product_id, warehouse_id, quantity, change in results
+        ],
+    }
+
+# 批量删除
+# 按ID顺序分批执行集合删除，先删除依赖的分片、低库存记录和库存，再删除商品或仓库，不加载ORM对象；
+# 批与批之间提交事务，每个事务只持有一批记录的锁，最后一批由请求级事务提交。
+# 中途失败时已提交的批不会回滚。
+
+def _delete_batches(ids: list[int]):
+    size = settings.bulk_delete_batch_size
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+async def _commit_delete_batch(db: AsyncSession):
+    """提交已完成的一批删除，并发布这一批的变更事件和缓存失效"""
+    await db.commit()
+    await publish_pending_events(db)
+    await publish_pending_invalidations(db)
+
+async def _check_no_inventories(db: AsyncSession, column, ids: list[int], entity: str, lock: bool = False):
+    """ids中仍有库存时报错（block模式）"""
+    statement = select(column).where(column.in_(ids)).limit(1)
+    if lock:
+        statement = statement.with_for_update()
+    blocked = (await db.execute(statement)).scalar_one_or_none()
+    if blocked is not None:
+        raise ValueError(f"{entity} {blocked} still has inventory; use on_inventory=cascade to delete it")
+
+async def _check_nullify_conflicts(db: AsyncSession, warehouse_ids: list[int]):
+    """解除关联后商品会有两条未分配仓库的库存时报错（nullify模式），需要先调拨或使用cascade"""
+    in_batch = Inventory.warehouse_id.in_(warehouse_ids)
+    statement = (
+        select(Inventory.product_id)
+        .where(
+            Inventory.product_id.in_(select(Inventory.product_id).where(in_batch)),
+            or_(in_batch, Inventory.warehouse_id.is_(None)),
+        )
+        .group_by(Inventory.product_id)
+        .having(func.count() > 1)
+        .limit(1)
+    )
+    conflict = (await db.execute(statement)).scalar_one_or_none()
+    if conflict is not None:
+        raise ValueError(
+            f"Product {conflict} would have more than one unassigned inventory; "
+            "transfer it first or use on_inventory=cascade"
+        )
+
+async def _lock_inventories(db: AsyncSession, condition):
+    """按库存ID顺序锁定将要删除或修改的库存，与出入库、调拨的加锁顺序一致"""
+    await db.execute(select(Inventory.id).where(condition).order_by(Inventory.id).with_for_update())
+
+async def _delete_inventory_rows(db: AsyncSession, condition) -> int:
+    """删除满足条件的库存及其分片和低库存记录，返回删除的库存数"""
+    inventory_ids = select(Inventory.id).where(condition)
+    await db.execute(delete(InventoryShard).where(InventoryShard.inventory_id.in_(inventory_ids)))
+    await db.execute(delete(LowStockItem).where(LowStockItem.inventory_id.in_(inventory_ids)))
+    result = await db.execute(
+        delete(Inventory)
+        .where(condition)
+        .returning(Inventory.id, Inventory.product_id, Inventory.warehouse_id, Inventory.quantity)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+    for inventory_id, product_id, warehouse_id, quantity in rows:
+        queue_inventory_event_values(db, "delete", inventory_id, product_id, warehouse_id, quantity)
+    return len(rows)
+
+async def _existing_ids(db: AsyncSession, id_column, ids: list[int], *conditions) -> list[int]:
+    """按批查询ids中存在（且满足条件）的记录，按ID排序返回"""
+    existing = []
+    for batch in _delete_batches(sorted(set(ids))):
+        result = await db.execute(select(id_column).where(id_column.in_(batch), *conditions))
+        existing.extend(result.scalars().all())
+    return sorted(existing)
+
+async def delete_products_async(db: AsyncSession, product_filter: ProductFilter, on_inventory: str = "block") -> dict:
+    """按类别、编码前缀或商品ID列表批量删除商品"""
+    conditions = product_filter_conditions(product_filter)
+    if product_filter.ids is not None:
+        product_ids = await _existing_ids(db, Product.id, product_filter.ids, *conditions)
+    elif conditions:
+        product_ids = list((await db.execute(select(Product.id).where(*conditions).order_by(Product.id))).scalars().all())
     else:
-        # 创建新库存记录
-        inventory = Inventory(
-            product_id=product_id,
-            quantity=quantity_change
+        raise ValueError("At least one filter is required")
+    return await delete_products_by_ids_async(db, product_ids, on_inventory=on_inventory)
+
+async def delete_products_by_ids_async(db: AsyncSession, product_ids: list[int], on_inventory: str = "block") -> dict:
+    """
+    按ID分批删除商品，同时删除其低库存记录和预留确认记录
+    :param on_inventory: 商品仍有库存时的处理，block 拒绝删除（整批不删除），cascade 一并删除库存
+    """
+    if on_inventory not in ("block", "cascade"):
+        raise ValueError("on_inventory must be block or cascade")
+    product_ids = sorted(set(product_ids))
+    if on_inventory == "block":
+        # 删除前检查全部商品，避免删除一部分后才发现有库存
+        for batch in _delete_batches(product_ids):
+            await _check_no_inventories(db, Inventory.product_id, batch, "Product")
+
+    deleted = inventories_deleted = 0
+    for index, batch in enumerate(_delete_batches(product_ids)):
+        if index:
+            await _commit_delete_batch(db)
+        if on_inventory == "block":
+            await _check_no_inventories(db, Inventory.product_id, batch, "Product", lock=True)
+        else:
+            await _lock_inventories(db, Inventory.product_id.in_(batch))
+            inventories_deleted += await _delete_inventory_rows(db, Inventory.product_id.in_(batch))
+        await db.execute(delete(LowStockItem).where(LowStockItem.product_id.in_(batch)))
+        await db.execute(delete(ConfirmedReservation).where(ConfirmedReservation.product_id.in_(batch)))
+        result = await db.execute(
+            delete(Product).where(Product.id.in_(batch)).returning(Product.id).execution_options(synchronize_session=False)
+        )
+        deleted_ids = result.scalars().all()
+        for product_id in deleted_ids:
+            record_change(db, "product", product_id, "delete")
+        if deleted_ids:
+            invalidate_cache(db, "product", deleted_ids)
+        deleted += len(deleted_ids)
+    return {"matched": len(product_ids), "deleted": deleted, "inventories_deleted": inventories_deleted}
+
+async def delete_warehouses_async(db: AsyncSession, warehouse_ids: list[int], on_inventory: str = "nullify") -> dict:
+    """
+    按ID分批删除仓库
+    :param on_inventory: 仓库仍有库存时的处理，block 拒绝删除，cascade 一并删除库存，nullify 库存解除与仓库的关联
+    """
+    if on_inventory not in ("block", "cascade", "nullify"):
+        raise ValueError("on_inventory must be block, cascade or nullify")
+    warehouse_ids = await _existing_ids(db, Warehouse.id, warehouse_ids)
+    if on_inventory == "block":
+        for batch in _delete_batches(warehouse_ids):
+            await _check_no_inventories(db, Inventory.warehouse_id, batch, "Warehouse")
+    elif on_inventory == "nullify":
+        # 每个商品只能有一条未分配仓库的库存；跨批的冲突在执行到该批时再检查
+        for batch in _delete_batches(warehouse_ids):
+            await _check_nullify_conflicts(db, batch)
+
+    deleted = inventories_deleted = inventories_detached = 0
+    for index, batch in enumerate(_delete_batches(warehouse_ids)):
+        if index:
+            await _commit_delete_batch(db)
+        in_batch = Inventory.warehouse_id.in_(batch)
+        if on_inventory == "block":
+            await _check_no_inventories(db, Inventory.warehouse_id, batch, "Warehouse", lock=True)
+        elif on_inventory == "cascade":
+            await _lock_inventories(db, in_batch)
+            inventories_deleted += await _delete_inventory_rows(db, in_batch)
+        else:
+            # 库存解除关联，同步方需要感知这些库存的仓库变化
+            await _lock_inventories(db, in_batch)
+            await _check_nullify_conflicts(db, batch)
+            result = await db.execute(
+                update(Inventory)
+                .where(in_batch)
+                .values(warehouse_id=None)
+                .returning(Inventory.id, Inventory.product_id, inventory_quantity_expression())
+                .execution_options(synchronize_session=False)
+            )
+            detached = result.all()
+            for inventory_id, product_id, quantity in detached:
+                queue_inventory_event_values(db, "update", inventory_id, product_id, None, quantity)
+            inventories_detached += len(detached)
+            await db.execute(
+                update(LowStockItem).where(LowStockItem.warehouse_id.in_(batch)).values(warehouse_id=None)
+            )
+        result = await db.execute(
+            delete(Warehouse).where(Warehouse.id.in_(batch)).returning(Warehouse.id).execution_options(synchronize_session=False)
         )
-        db.add(inventory)
+        deleted_ids = result.scalars().all()
+        for warehouse_id in deleted_ids:
+            record_change(db, "warehouse", warehouse_id, "delete")
+        if deleted_ids:
+            invalidate_cache(db, "warehouse", deleted_ids)
+        deleted += len(deleted_ids)
+    return {
+        "matched": len(warehouse_ids),
+        "deleted": deleted,
+        "inventories_deleted": inventories_deleted,
+        "inventories_detached": inventories_detached,
+    }
+
+async def delete_inventories_async(db: AsyncSession, inventory_ids: list[int]) -> dict:
+    """按ID分批删除库存及其分片和低库存记录"""
+    deleted = 0
+    for index, batch in enumerate(_delete_batches(sorted(set(inventory_ids)))):
+        if index:
+            await _commit_delete_batch(db)
+        await _lock_inventories(db, Inventory.id.in_(batch))
+        deleted += await _delete_inventory_rows(db, Inventory.id.in_(batch))
+    return {"matched": deleted, "deleted": deleted}
+
+# 按ID批量获取（请求级批量加载器，同一请求内每类实体每轮只查询一次）
+
+async def _load_products_async(db: AsyncSession, ids: list[int]) -> dict[int, Product]:
+    result = await db.execute(select(Product).where(Product.id.in_(ids)))
+    return {product.id: product for product in result.scalars().all()}
+
+async def _load_warehouses_async(db: AsyncSession, ids: list[int]) -> dict[int, Warehouse]:
+    result = await db.execute(select(Warehouse).where(Warehouse.id.in_(ids)))
+    return {warehouse.id: warehouse for warehouse in result.scalars().all()}
+
+async def _load_inventories_async(db: AsyncSession, ids: list[int]) -> dict[int, Inventory]:
+    # 商品和仓库由各自的加载器获取，见 attach_inventory_relations_async
+    result = await db.execute(select(Inventory).where(Inventory.id.in_(ids)))
+    return {inventory.id: inventory for inventory in result.scalars().all()}
+
+def product_loader(db: AsyncSession) -> DataLoader:
+    return get_loader(db, "product", _load_products_async)
+
+def warehouse_loader(db: AsyncSession) -> DataLoader:
+    return get_loader(db, "warehouse", _load_warehouses_async)
+
+def inventory_loader(db: AsyncSession) -> DataLoader:
+    return get_loader(db, "inventory", _load_inventories_async)
+
+async def attach_inventory_relations_async(db: AsyncSession, inventories: list[Inventory]):
+    """为库存填充商品和仓库（不标记为修改），所有库存的商品和仓库各只查询一次"""
+    products, warehouses = await asyncio.gather(
+        product_loader(db).load_many({inventory.product_id for inventory in inventories}),
+        warehouse_loader(db).load_many({inventory.warehouse_id for inventory in inventories if inventory.warehouse_id is not None}),
+    )
+    products = {product.id: product for product in products if product is not None}
+    warehouses = {warehouse.id: warehouse for warehouse in warehouses if warehouse is not None}
+    for inventory in inventories:
+        set_committed_value(inventory, "product", products.get(inventory.product_id))
+        set_committed_value(inventory, "warehouse", warehouses.get(inventory.warehouse_id))
+
+async def get_products_by_ids_async(db: AsyncSession, ids: list[int]) -> list[Product]:
+    """按给定顺序批量获取商品，不存在的ID跳过"""
+    return [product for product in await product_loader(db).load_many(ids) if product is not None]
+
+async def get_warehouses_by_ids_async(db: AsyncSession, ids: list[int]) -> list[Warehouse]:
+    """按给定顺序批量获取仓库，不存在的ID跳过"""
+    return [warehouse for warehouse in await warehouse_loader(db).load_many(ids) if warehouse is not None]
+
+async def get_inventories_by_ids_async(db: AsyncSession, ids: list[int]) -> list[Inventory]:
+    """按给定顺序批量获取库存（包含商品和仓库信息），不存在的ID跳过"""
+    inventories = [inventory for inventory in await inventory_loader(db).load_many(ids) if inventory is not None]
+    await attach_inventory_relations_async(db, inventories)
+    await load_shard_totals_async(db, inventories)
+    return inventories
+
+# 库存分片相关操作
+
+async def _shard_total(db: AsyncSession, inventory_id: int) -> int:
+    """分片库存的实时总数量"""
+    statement = select(func.coalesce(func.sum(InventoryShard.quantity), 0)).where(InventoryShard.inventory_id == inventory_id)
+    return (await db.execute(statement)).scalar_one()
+
+async def load_shard_totals_async(db: AsyncSession, inventories):
+    """把分片库存的数量替换为各分片之和（不标记为修改）；没有分片库存时不执行查询"""
+    sharded = {inventory.id: inventory for inventory in inventories if inventory is not None and inventory.shard_count > 1}
+    if not sharded:
+        return
+    statement = (
+        select(InventoryShard.inventory_id, func.sum(InventoryShard.quantity))
+        .where(InventoryShard.inventory_id.in_(sharded))
+        .group_by(InventoryShard.inventory_id)
+    )
+    for inventory_id, total in (await db.execute(statement)).all():
+        set_committed_value(sharded[inventory_id], "quantity", total)
+
+async def _reset_shards_async(db: AsyncSession, inventory_id: int, shard_count: int, total: int):
+    """删除现有分片，把总数量平均分配到新的分片（shard_count为1时只删除）"""
+    await db.execute(delete(InventoryShard).where(InventoryShard.inventory_id == inventory_id))
+    if shard_count > 1:
+        base, extra = divmod(total, shard_count)
+        await db.execute(insert(InventoryShard), [
+            {"inventory_id": inventory_id, "shard": shard, "quantity": base + (1 if shard < extra else 0)}
+            for shard in range(shard_count)
+        ])
+
+async def move_sharded_inventory_async(db: AsyncSession, inventory: Inventory, quantity_change: int) -> int:
+    """
+    分片库存的出入库，返回变化后的总数量
+    随机选择一个分片条件更新；该分片数量不足时锁定全部分片，从其他分片借用
+    """
+    shard = random.randrange(inventory.shard_count)
+    conditions = [InventoryShard.inventory_id == inventory.id, InventoryShard.shard == shard]
+    if quantity_change < 0:
+        conditions.append(InventoryShard.quantity + quantity_change >= 0)
+    statement = (
+        update(InventoryShard)
+        .where(*conditions)
+        .values(quantity=InventoryShard.quantity + quantity_change)
+        .returning(InventoryShard.shard)
+    )
+    if (await db.execute(statement)).scalar_one_or_none() is None:
+        await _borrow_across_shards_async(db, inventory.id, quantity_change)
+    return await _shard_total(db, inventory.id)
+
+async def _borrow_across_shards_async(db: AsyncSession, inventory_id: int, quantity_change: int):
+    """按分片序号锁定全部分片（固定加锁顺序避免死锁），总量充足时从数量最多的分片依次扣减"""
+    statement = (
+        select(InventoryShard)
+        .where(InventoryShard.inventory_id == inventory_id)
+        .order_by(InventoryShard.shard)
+        .with_for_update()
+    )
+    shards = (await db.execute(statement)).scalars().all()
+    if not shards or sum(shard.quantity for shard in shards) + quantity_change < 0:
+        raise ValueError("Insufficient inventory")
     
-    await db.commit()
-    await db.refresh(inventory)
+    if quantity_change >= 0:
+        shards[0].quantity += quantity_change
+    else:
+        remaining = -quantity_change
+        for shard in sorted(shards, key=lambda shard: shard.quantity, reverse=True):
+            taken = min(max(shard.quantity, 0), remaining)
+            shard.quantity -= taken
+            remaining -= taken
+            if not remaining:
+                break
+    await db.flush()
+
+async def set_inventory_shards_async(db: AsyncSession, inventory_id: int, shard_count: int) -> Inventory:
+    """
+    设置库存的数量分片数，保持总数量不变
+    :param shard_count: 分片数，1表示取消分片
+    """
+    statement = (
+        select(Inventory)
+        .where(Inventory.id == inventory_id)
+        .options(*_inventory_load_options)
+        .with_for_update()
+    )
+    inventory = (await db.execute(statement)).scalar_one_or_none()
+    if not inventory:
+        raise ValueError("Inventory not found")
+    
+    total = inventory.quantity
+    if inventory.shard_count > 1:
+        # 锁定现有分片，等待进行中的分片出入库完成后再汇总
+        shards = await db.execute(
+            select(InventoryShard.quantity)
+            .where(InventoryShard.inventory_id == inventory_id)
+            .order_by(InventoryShard.shard)
+            .with_for_update()
+        )
+        total = sum(shards.scalars().all())
+    
+    await _reset_shards_async(db, inventory_id, shard_count, total)
+    inventory.quantity = total
+    inventory.shard_count = shard_count
+    await db.flush()
+    record_change(db, "inventory", inventory_id)
     return inventory
+
+async def fold_inventory_shards() -> int:
+    """把分片库存的总数量汇总回库存表，供直接按库存表计算的查询（如报表）使用"""
+    shard_total = (
+        select(func.coalesce(func.sum(InventoryShard.quantity), 0))
+        .where(InventoryShard.inventory_id == Inventory.id)
+        .scalar_subquery()
+    )
+    statement = (
+        update(Inventory)
+        .where(Inventory.shard_count > 1)
+        .values(quantity=shard_total)
+        .returning(Inventory.product_id)
+        .execution_options(synchronize_session=False)
+    )
+    async with AsyncSessionLocal() as db:
+        product_ids = (await db.execute(statement)).scalars().all()
+        await db.commit()
+    return len(product_ids)
+
+# 各工作进程汇总的是同一批分片，每个间隔只由一个工作进程执行
+register_periodic_task("inventory_shard_fold", fold_inventory_shards, settings.inventory_shard_fold_interval, exclusive=True)
+
+# 低库存（补货）相关操作
+
+def _effective_reorder_point(inventory: Inventory) -> int:
+    """库存生效的补货点：库存单独设置的补货点优先，否则使用商品的补货点（需已加载商品）"""
+    if inventory.reorder_point is not None:
+        return inventory.reorder_point
+    return inventory.product.reorder_point
+
+def _low_stock_row(inventory: Inventory) -> dict:
+    return {
+        "inventory_id": inventory.id,
+        "product_id": inventory.product_id,
+        "warehouse_id": inventory.warehouse_id,
+        "quantity": inventory.quantity,
+        "reorder_point": _effective_reorder_point(inventory),
+    }
+
+async def _update_low_stock(db: AsyncSession, inventory: Inventory, was_low: bool):
+    """
+    单条库存数量变化后维护低库存集合，至多执行一条语句
+    :param was_low: 变化前该库存是否在低库存集合中
+    """
+    reorder_point = _effective_reorder_point(inventory)
+    is_low = inventory.quantity < reorder_point
+    if is_low and was_low:
+        statement = (
+            update(LowStockItem)
+            .where(LowStockItem.inventory_id == inventory.id)
+            .values(quantity=inventory.quantity, reorder_point=reorder_point)
+        )
+    elif is_low:
+        statement = insert(LowStockItem).values(**_low_stock_row(inventory))
+    elif was_low:
+        statement = delete(LowStockItem).where(LowStockItem.inventory_id == inventory.id)
+    else:
+        return
+    await db.execute(statement)
+
+async def _sync_low_stock(db: AsyncSession, inventories: list[Inventory]):
+    """按一批已加载商品的库存重建其低库存记录（删除后批量插入仍低于补货点的记录）"""
+    if not inventories:
+        return
+    inventory_ids = [inventory.id for inventory in inventories]
+    await db.execute(delete(LowStockItem).where(LowStockItem.inventory_id.in_(inventory_ids)))
+    rows = [
+        _low_stock_row(inventory)
+        for inventory in inventories
+        if inventory.quantity < _effective_reorder_point(inventory)
+    ]
+    if rows:
+        await db.execute(insert(LowStockItem), rows)
+
+def inventory_quantity_expression():
+    """库存实时数量的SQL表达式，分片库存按各分片之和计算"""
+    shard_total = (
+        select(func.coalesce(func.sum(InventoryShard.quantity), 0))
+        .where(InventoryShard.inventory_id == Inventory.id)
+        .scalar_subquery()
+    )
+    return case((Inventory.shard_count > 1, shard_total), else_=Inventory.quantity)
+
+def low_stock_refresh_statements(product_ids: list[int] | Select | None = None) -> tuple:
+    """
+    生成按集合重建低库存记录的语句（DELETE + INSERT ... SELECT）
+    :param product_ids: 只重建这些商品的记录（ID列表或返回商品ID的子查询），为空时重建全部
+    """
+    reorder_point = func.coalesce(Inventory.reorder_point, Product.reorder_point)
+    quantity = inventory_quantity_expression()
+    delete_statement = delete(LowStockItem)
+    source = (
+        select(Inventory.id, Inventory.product_id, Inventory.warehouse_id, quantity, reorder_point)
+        .join(Product, Product.id == Inventory.product_id)
+        .where(quantity < reorder_point)
+    )
+    if product_ids is not None:
+        delete_statement = delete_statement.where(LowStockItem.product_id.in_(product_ids))
+        source = source.where(Inventory.product_id.in_(product_ids))
+    insert_statement = insert(LowStockItem).from_select(
+        ["inventory_id", "product_id", "warehouse_id", "quantity", "reorder_point"], source
+    )
+    return delete_statement, insert_statement
+
+async def refresh_low_stock_async(db: AsyncSession, product_ids: list[int] | Select | None = None):
+    """按集合重建低库存记录，用于补货点变化或修复集合"""
+    for statement in low_stock_refresh_statements(product_ids):
+        await db.execute(statement)
+
+async def get_low_stock_items_async(
+    db: AsyncSession, skip: int = 0, limit: int = 100, warehouse_id: int | None = None
+) -> dict:
+    """获取低于补货点的库存列表（缺口最大的在前），只读取低库存集合"""
+    count_statement = select(func.count()).select_from(LowStockItem)
+    statement = (
+        select(LowStockItem)
+        .options(selectinload(LowStockItem.product))
+        .order_by(LowStockItem.quantity - LowStockItem.reorder_point, LowStockItem.inventory_id)
+        .offset(skip)
+        .limit(limit)
+    )
+    if warehouse_id is not None:
+        count_statement = count_statement.where(LowStockItem.warehouse_id == warehouse_id)
+        statement = statement.where(LowStockItem.warehouse_id == warehouse_id)
+    
+    total = (await db.execute(count_statement)).scalar_one()
+    result = await db.execute(statement)
+    return {
+        "items": result.scalars().all(),
+        "total": total,
+        "skip": skip,
+        "limit": limit
+    }
+
+# 出入库组提交
+
+def _inventory_snapshot(inventory: Inventory, quantity: int) -> Inventory:
+    """生成某个出入库操作完成时的库存快照，与会话无关"""
+    snapshot = Inventory(
+        id=inventory.id,
+        product_id=inventory.product_id,
+        quantity=quantity,
+        warehouse_id=inventory.warehouse_id,
+        reorder_point=inventory.reorder_point,
+        shard_count=inventory.shard_count
+    )
+    set_committed_value(snapshot, "product", inventory.product)
+    set_committed_value(snapshot, "warehouse", inventory.warehouse)
+    return snapshot
+
+async def _apply_inventory_movements_in_session(db: AsyncSession, movements: list[tuple[int, int | None, int]]) -> list:
+    """在同一个事务中按到达顺序应用一批出入库（商品ID、仓库ID、数量变化），库存不足的操作单独失败"""
+    # 一次查询按库存ID顺序锁定本批次涉及的全部库存记录，与调拨等批量操作的加锁顺序一致，并发批次不会相互死锁
+    product_ids = {product_id for product_id, _, _ in movements}
+    statement = (
+        select(Inventory)
+        .where(Inventory.product_id.in_(product_ids))
+        .order_by(Inventory.id)
+        .options(selectinload(Inventory.product), selectinload(Inventory.warehouse))
+        .with_for_update()
+    )
+    result = await db.execute(statement)
+    inventories: dict[int, list[Inventory]] = {}
+    for inventory in result.scalars().all():
+        inventories.setdefault(inventory.product_id, []).append(inventory)
+    
+    outcomes = []
+    changed = {}
+    moved = []
+    for product_id, warehouse_id, quantity_change in movements:
+        # 与单条出入库相同：指定仓库时使用该仓库的库存，未指定时商品只能有一条库存记录
+        candidates = inventories.get(product_id, [])
+        if warehouse_id is not None:
+            candidates = [inventory for inventory in candidates if inventory.warehouse_id == warehouse_id]
+        if len(candidates) > 1:
+            outcomes.append(ValueError(_AMBIGUOUS_WAREHOUSE))
+            continue
+        inventory = candidates[0] if candidates else None
+        if inventory is None:
+            if quantity_change < 0:
+                outcomes.append(ValueError("Insufficient inventory"))
+                continue
+            product = await db.get(Product, product_id)
+            if not product:
+                outcomes.append(ValueError("Product not found"))
+                continue
+            warehouse = None
+            if warehouse_id is not None:
+                warehouse = await db.get(Warehouse, warehouse_id)
+                if not warehouse:
+                    outcomes.append(ValueError("Warehouse not found"))
+                    continue
+            # 创建新库存记录
+            inventory = Inventory(product_id=product_id, warehouse_id=warehouse_id, quantity=0)
+            set_committed_value(inventory, "product", product)
+            set_committed_value(inventory, "warehouse", warehouse)
+            db.add(inventory)
+            inventories.setdefault(product_id, []).append(inventory)
+        
+        if inventory.shard_count > 1:
+            # 分片库存只更新分片，库存行的数量替换为实时总数但不写回
+            try:
+                total = await move_sharded_inventory_async(db, inventory, quantity_change)
+            except ValueError as e:
+                outcomes.append(e)
+                continue
+            set_committed_value(inventory, "quantity", total)
+        elif inventory.quantity + quantity_change < 0:
+            outcomes.append(ValueError("Insufficient inventory"))
+            continue
+        else:
+            inventory.quantity += quantity_change
+        changed[(product_id, inventory.warehouse_id)] = inventory
+        outcomes.append((inventory, inventory.quantity))
+        moved.append((inventory, inventory.quantity, quantity_change))
+    
+    # 整批一起维护低库存集合（新建的库存需要先写入以获得ID）
+    if changed:
+        await db.flush()
+        await _sync_low_stock(db, list(changed.values()))
+    for inventory, quantity, quantity_change in moved:
+        queue_inventory_event(db, "move", _inventory_snapshot(inventory, quantity), change=quantity_change)
+    await db.commit()
+    await publish_pending_events(db)
+    return [
+        outcome if isinstance(outcome, Exception) else _inventory_snapshot(*outcome)
+        for outcome in outcomes
+    ]
+
+async def _apply_inventory_movements(movements: list[tuple[int, int | None, int]]) -> list:
+    """组提交批处理函数：整批在一个事务中提交，失败时逐条重试"""
+    async with AsyncSessionLocal() as db:
+        try:
+            return await _apply_inventory_movements_in_session(db, movements)
+        except SQLAlchemyError as e:
+            discard_pending_events(db)
+            await db.rollback()
+            if len(movements) == 1:
+                return [e]
+            logger.warning(f"Group commit of {len(movements)} movements failed, retrying individually: {e}")
+    
+    # 整批提交失败时逐条重试，保证每个调用方得到各自的结果或错误
+    results = []
+    for movement in movements:
+        results.extend(await _apply_inventory_movements([movement]))
+    return results
+
+inventory_batcher = GroupCommitBatcher(
+    _apply_inventory_movements,
+    max_delay_ms=settings.inventory_group_commit_max_delay_ms,
+    max_batch_size=settings.inventory_group_commit_max_batch,
+)
@@ -0,0 +1,176 @@
+import asyncio
+import time
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.singleflight import single_flight
+from app.crud.product import inventory_quantity_expression
+from app.models.change import ChangeLog
+from app.models.product import Product, Inventory
+
+# 报表相关操作
+# 库存估值按列分批读取到NumPy数组中，分组汇总全部向量化计算，不逐行创建ORM对象。
+# 报表按数据版本缓存：商品、仓库和库存的任何修改都会产生新的变更序号，旧版本的缓存自然失效。
+
+async def get_data_version_async(db: AsyncSession) -> str:
+    """
+    库存相关数据的版本：最新变更序号和最大库存ID
+    批量导入（seed.py）不写变更日志，用最大库存ID区分重新导入的数据
+    """
+    statement = select(
+        select(func.max(ChangeLog.seq)).scalar_subquery(),
+        select(func.max(Inventory.id)).scalar_subquery(),
+    )
+    max_seq, max_inventory_id = (await db.execute(statement)).one()
+    return f"{max_seq or 0}-{max_inventory_id or 0}"
+
+async def _fetch_valuation_columns(db: AsyncSession) -> tuple[dict[str, np.ndarray], list[str]]:
+    """用服务端游标分批读取估值所需的列，返回列数组和类别名称（类别以编码表示）"""
+    statement = (
+        select(
+            Inventory.product_id,
+            func.coalesce(Inventory.warehouse_id, 0),
+            func.coalesce(Product.category, ""),
+            inventory_quantity_expression(),
+            Product.cost,
+            Product.price,
+        )
+        .join(Product, Product.id == Inventory.product_id)
+        .execution_options(yield_per=settings.report_batch_size)
+    )
+    columns: dict[str, list[np.ndarray]] = {
+        "product_id": [], "warehouse_id": [], "category": [], "quantity": [], "cost": [], "price": []
+    }
+    categories: dict[str, int] = {}
+    result = await db.stream(statement)
+    async for partition in result.partitions():
+        count = len(partition)
+        product_ids, warehouse_ids, category_names, quantities, costs, prices = zip(*partition)
+        columns["product_id"].append(np.fromiter(product_ids, dtype=np.int64, count=count))
+        columns["warehouse_id"].append(np.fromiter(warehouse_ids, dtype=np.int64, count=count))
+        columns["quantity"].append(np.fromiter(quantities, dtype=np.float64, count=count))
+        columns["cost"].append(np.fromiter(costs, dtype=np.float64, count=count))
+        columns["price"].append(np.fromiter(prices, dtype=np.float64, count=count))
+        # 类别编码：批内去重后只为新出现的类别分配全局编码
+        batch_names, inverse = np.unique(np.array(category_names, dtype=object), return_inverse=True)
+        mapping = np.array([categories.setdefault(name, len(categories)) for name in batch_names], dtype=np.int64)
+        columns["category"].append(mapping[inverse])
+    arrays = {
+        name: np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float64 if name in ("quantity", "cost", "price") else np.int64)
+        for name, chunks in columns.items()
+    }
+    return arrays, list(categories)
+
+def _group_rows(codes: np.ndarray, groups: int, quantity, cost_value, price_value) -> list[dict]:
+    """按分组编码汇总数量和金额"""
+    sums = [
+        np.bincount(codes, minlength=groups),
+        np.bincount(codes, weights=quantity, minlength=groups),
+        np.bincount(codes, weights=cost_value, minlength=groups),
+        np.bincount(codes, weights=price_value, minlength=groups),
+    ]
+    return [_summary(*values) for values in zip(*(s.tolist() for s in sums))]
+
+def _summary(items, quantity, cost_value, price_value) -> dict:
+    margin = price_value - cost_value
+    return {
+        "items": int(items),
+        "quantity": int(quantity),
+        "cost_value": round(cost_value, 2),
+        "price_value": round(price_value, 2),
+        "margin": round(margin, 2),
+        "margin_ratio": round(margin / price_value, 4) if price_value else None,
+    }
+
+def _abc_classes(product_ids: np.ndarray, cost_value: np.ndarray, a_share: float, b_share: float) -> list[dict]:
+    """按商品库存金额（成本）做ABC分类：金额从高到低累计，占比前a_share为A类，至b_share为B类，其余为C类"""
+    _, product_codes = np.unique(product_ids, return_inverse=True)
+    values = np.sort(np.bincount(product_codes, weights=cost_value))[::-1]
+    total = values.sum()
+    if total > 0:
+        # 按该商品之前的累计占比分类，金额最高的商品总是A类
+        share_before = (np.cumsum(values) - values) / total
+        classes = np.where(share_before < a_share, 0, np.where(share_before < b_share, 1, 2))
+        classes[values <= 0] = 2
+    else:
+        classes = np.full(len(values), 2)
+    products = np.bincount(classes, minlength=3).tolist()
+    class_values = np.bincount(classes, weights=values, minlength=3).tolist()
+    return [
+        {
+            "abc_class": name,
+            "products": products[i],
+            "cost_value": round(class_values[i], 2),
+            "share": round(class_values[i] / total, 4) if total > 0 else 0.0,
+        }
+        for i, name in enumerate("ABC")
+    ]
+
+def _aggregate(arrays: dict[str, np.ndarray], categories: list[str], a_share: float, b_share: float, detail: bool) -> dict:
+    """向量化计算估值汇总（CPU密集，在线程中执行）"""
+    quantity = arrays["quantity"]
+    cost_value = quantity * arrays["cost"]
+    price_value = quantity * arrays["price"]
+    count = len(quantity)
+    category_names = [name or None for name in categories]
+
+    warehouse_ids, warehouse_codes = np.unique(arrays["warehouse_id"], return_inverse=True)
+    by_warehouse = _group_rows(warehouse_codes, len(warehouse_ids), quantity, cost_value, price_value)
+    by_category = _group_rows(arrays["category"], len(categories), quantity, cost_value, price_value)
+
+    report = {
+        "totals": _summary(count, quantity.sum(), cost_value.sum(), price_value.sum()),
+        "by_warehouse": [
+            {"warehouse_id": int(warehouse_id) or None, **row}
+            for warehouse_id, row in zip(warehouse_ids.tolist(), by_warehouse)
+        ],
+        "by_category": [
+            {"category": category_names[code], **row}
+            for code, row in enumerate(by_category)
+        ],
+        "abc": _abc_classes(arrays["product_id"], cost_value, a_share, b_share),
+    }
+    if detail:
+        # 仓库和类别的组合只汇总实际出现的组合
+        pairs, pair_codes = np.unique(warehouse_codes * max(len(categories), 1) + arrays["category"], return_inverse=True)
+        rows = _group_rows(pair_codes, len(pairs), quantity, cost_value, price_value)
+        report["by_warehouse_category"] = [
+            {
+                "warehouse_id": int(warehouse_ids[pair // max(len(categories), 1)]) or None,
+                "category": category_names[pair % max(len(categories), 1)],
+                **row,
+            }
+            for pair, row in zip(pairs.tolist(), rows)
+        ]
+    return report
+
+@single_flight("report.valuation")
+async def _build_valuation_report_async(db: AsyncSession, version: str, a_share: float, b_share: float, detail: bool) -> dict:
+    started = time.perf_counter()
+    arrays, categories = await _fetch_valuation_columns(db)
+    report = await asyncio.to_thread(_aggregate, arrays, categories, a_share, b_share, detail)
+    report.update({
+        "version": version,
+        "generated_at": time.time(),
+        "elapsed": round(time.perf_counter() - started, 3),
+    })
+    return report
+
+async def get_valuation_report_async(
+    db: AsyncSession, a_share: float = 0.8, b_share: float = 0.95, detail: bool = False
+) -> dict:
+    """
+    库存估值报表：按成本和售价计算的库存金额、毛利，按仓库和类别汇总，以及ABC分类
+    :param detail: 是否包含仓库和类别组合的汇总
+    """
+    if not 0 < a_share < b_share <= 1:
+        raise ValueError("Thresholds must satisfy 0 < a_share < b_share <= 1")
+    version = await get_data_version_async(db)
+    return await cache.get_or_load(
+        "report",
+        f"valuation:{version}:{a_share}:{b_share}:{int(detail)}",
+        lambda: _build_valuation_report_async(db, version, a_share, b_share, detail),
+    )
@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.events import publish_pending_events
+from app.core.logger import logger
+from app.core.reservations import reservation_store, Reservation, ConfirmedEntry, StaleOnHand
+from app.core.tasks import register_periodic_task
+from app.crud.product import (
+    get_product_async, get_inventory_quantity_async, refresh_low_stock_async, move_sharded_inventory_async,
+    load_shard_totals_async, queue_inventory_event
+)
+from app.models.product import Product, Inventory
+from app.models.reservation import ConfirmedReservation
+from app.schemas.reservation import ReservationCreate
+
+# 库存预留相关操作
+
+_RESERVE_ATTEMPTS = 3  # 读取库存数量期间有确认写入库存时，预留重试的次数
+
+async def _get_on_hand_async(db: AsyncSession, product_id: int) -> int:
+    """获取商品的库存数量，商品没有库存记录时为0"""
+    quantity = await get_inventory_quantity_async(db, product_id)
+    if quantity is None:
+        if not await get_product_async(db, product_id):
+            raise ValueError("Product not found")
+        return 0
+    return quantity
+
+async def create_reservation_async(db: AsyncSession, reservation: ReservationCreate) -> Reservation:
+    """预留库存，可承诺量不足时失败"""
+    ttl = min(reservation.ttl_seconds or settings.reservation_default_ttl, settings.reservation_max_ttl)
+    for _ in range(_RESERVE_ATTEMPTS):
+        # 先取写入版本号再读库存数量：两步之间写入并移除的确认会使版本号变化，预留被拒绝后重新读取
+        epoch = await reservation_store.flush_epoch(reservation.product_id)
+        on_hand = await _get_on_hand_async(db, reservation.product_id)
+        try:
+            return await reservation_store.reserve(reservation.product_id, reservation.quantity, on_hand, ttl, epoch)
+        except StaleOnHand:
+            continue
+    raise ValueError("Inventory is being updated, please retry")
+
+async def confirm_reservation_async(reservation_id: str) -> ConfirmedEntry:
+    """确认预留，确认的数量由后台任务批量写入库存"""
+    return await reservation_store.confirm(reservation_id)
+
+async def release_reservation_async(reservation_id: str) -> int:
+    """释放预留，返回释放的数量"""
+    return await reservation_store.release(reservation_id)
+
+async def get_availability_async(db: AsyncSession, product_id: int) -> dict:
+    """获取商品的库存数量和可承诺量"""
+    on_hand = await _get_on_hand_async(db, product_id)
+    return {
+        "product_id": product_id,
+        "on_hand": on_hand,
+        "available": await reservation_store.available(product_id, on_hand)
+    }
+
+async def _deduct_inventories_async(db: AsyncSession, inventories: list[Inventory], amount: int) -> int:
+    """
+    按库存ID顺序从商品的各条库存中扣减，库存不会被减为负数，返回未能扣减的数量
+    库存记录已被锁定，条件更新保证没有行锁的数据库上也不会减为负数
+    """
+    for inventory in inventories:
+        if amount <= 0:
+            break
+        take = min(amount, inventory.quantity)
+        if take <= 0:
+            continue
+        if inventory.shard_count > 1:
+            try:
+                quantity = await move_sharded_inventory_async(db, inventory, -take)
+            except ValueError:
+                continue
+        else:
+            statement = (
+                update(Inventory)
+                .where(Inventory.id == inventory.id, Inventory.quantity >= take)
+                .values(quantity=Inventory.quantity - take)
+                .returning(Inventory.quantity)
+                .execution_options(synchronize_session=False)
+            )
+            quantity = (await db.execute(statement)).scalar_one_or_none()
+            if quantity is None:
+                continue
+        set_committed_value(inventory, "quantity", quantity)
+        queue_inventory_event(db, "move", inventory, change=-take)
+        amount -= take
+    return amount
+
+async def _apply_confirmations_async(db: AsyncSession, entries: list[ConfirmedEntry]) -> dict[int, int]:
+    """
+    在一个事务中把一批确认扣减到库存，已写入过的确认跳过；返回库存不足、未能扣减的数量（商品ID -> 数量）
+    商品已被删除的确认直接丢弃（记录日志），不再写入
+    """
+    reservation_ids = [entry.reservation_id for entry in entries]
+    statement = select(ConfirmedReservation.id).where(ConfirmedReservation.id.in_(reservation_ids))
+    applied = set((await db.execute(statement)).scalars().all())
+    entries = [entry for entry in entries if entry.reservation_id not in applied]
+    if not entries:
+        return {}
+    
+    product_ids = {entry.product_id for entry in entries}
+    existing = set((await db.execute(select(Product.id).where(Product.id.in_(product_ids)))).scalars().all())
+    dropped = [entry for entry in entries if entry.product_id not in existing]
+    if dropped:
+        logger.warning(
+            f"Dropping {len(dropped)} confirmed reservations of deleted products: "
+            + ", ".join(entry.reservation_id for entry in dropped)
+        )
+        entries = [entry for entry in entries if entry.product_id in existing]
+        if not entries:
+            return {}
+    
+    applied_at = datetime.now(timezone.utc)
+    await db.execute(insert(ConfirmedReservation), [
+        {"id": entry.reservation_id, "product_id": entry.product_id, "quantity": entry.quantity, "applied_at": applied_at}
+        for entry in entries
+    ])
+    
+    # 按商品汇总；一次查询按库存ID顺序锁定涉及的全部库存，与出入库、调拨的加锁顺序一致
+    totals: dict[int, int] = {}
+    for entry in entries:
+        totals[entry.product_id] = totals.get(entry.product_id, 0) + entry.quantity
+    statement = (
+        select(Inventory)
+        .where(Inventory.product_id.in_(totals))
+        .order_by(Inventory.id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    inventories: dict[int, list[Inventory]] = {}
+    for inventory in (await db.execute(statement)).scalars().all():
+        inventories.setdefault(inventory.product_id, []).append(inventory)
+    await load_shard_totals_async(db, [inventory for rows in inventories.values() for inventory in rows])
+    
+    shortfalls = {}
+    for product_id, amount in totals.items():
+        remaining = await _deduct_inventories_async(db, inventories.get(product_id, []), amount)
+        if remaining:
+            shortfalls[product_id] = remaining
+    await refresh_low_stock_async(db, product_ids=list(totals))
+    return shortfalls
+async def flush_confirmed_reservations() -> int:
+    """把已确认的预留批量写入库存，返回处理的确认数"""
+    async with reservation_store.flush_lock() as acquired:
+        if not acquired:  # 其他工作进程正在写入
+            return 0
+        entries = await reservation_store.pending_confirmations(settings.reservation_flush_batch_size)
+        if not entries:
+            return 0
+        async with AsyncSessionLocal() as db:
+            shortfalls = await _apply_confirmations_async(db, entries)
+            await db.commit()
+            await publish_pending_events(db)
+        for product_id, quantity in shortfalls.items():
+            # 确认的数量超过了库存（如预留期间库存被出库或盘点调减），库存扣减到0，差额需要人工处理
+            logger.warning(f"Confirmed reservations of product {product_id} exceed inventory by {quantity}")
+        # 库存提交后才从待写入队列中移除；两步之间失败时，重试会按确认记录跳过已写入的部分
+        await reservation_store.ack_confirmations(entries)
+        return len(entries)
+
+async def prune_confirmed_reservations() -> int:
+    """清理超过保留期的预留确认记录，返回清理的记录数；保留期须远大于确认从写入库存到移出待写入队列的时间"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.reservation_confirmed_retention_days)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(delete(ConfirmedReservation).where(ConfirmedReservation.applied_at < cutoff))
+        await db.commit()
+    return result.rowcount
+
+register_periodic_task("reservation_flush", flush_confirmed_reservations, settings.reservation_flush_interval)
+if settings.reservation_confirmed_retention_days > 0:
+    register_periodic_task(
+        "reservation_confirmed_prune", prune_confirmed_reservations, settings.reservation_confirmed_prune_interval,
+        exclusive=True,
+    )
@@ -1,10 +1,12 @@
 from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import delete
+from sqlalchemy import delete, func, insert, literal, update
 from typing import List
+from app.core.cache import cache, invalidate_cache
 from app.models.role import Role, RolePermission
 from app.models.permission import Permission
-from app.schemas.role import RoleCreate, RoleUpdate
+from app.models.user import User
+from app.schemas.role import RoleCreate, RoleUpdate, RoleResponse
 
 # 异步操作
 async def get_role_async(db: AsyncSession, role_id: int) -> Role | None:
@@ -20,7 +22,7 @@ async def get_role_by_name_async(db: AsyncSession, name: str) -> Role | None:
 async def get_roles_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> dict:
     """获取角色列表，支持分页"""
     # 查询角色总数
-    count_statement = select(Role).count()
+    count_statement = select(func.count()).select_from(Role)
     count_result = await db.execute(count_statement)
     total = count_result.scalar_one()
     
@@ -37,6 +39,16 @@ async def get_roles_async(db: AsyncSession, skip: int = 0, limit: int = 100) ->
         "limit": limit
     }
 
+async def get_role_cached_async(db: AsyncSession, role_id: int) -> dict | None:
+    """根据角色ID获取角色（两级缓存，返回响应数据）"""
+    return await cache.get_or_load("role", role_id, lambda: get_role_async(db, role_id), RoleResponse)
+
+async def get_roles_cached_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> list[dict]:
+    """获取一页角色（两级缓存，返回响应数据）"""
+    async def load():
+        return (await get_roles_async(db, skip=skip, limit=limit))["items"]
+    return await cache.get_or_load("role", f"list:{skip}:{limit}", load, RoleResponse)
+
 async def create_role_async(db: AsyncSession, role: RoleCreate) -> Role:
     """创建新角色"""
     # 检查角色名称是否已存在
@@ -50,71 +62,84 @@ async def create_role_async(db: AsyncSession, role: RoleCreate) -> Role:
         description=role.description
     )
     
-    # 保存到数据库
+    # 保存到数据库（INSERT ... RETURNING 回填主键，由请求级事务统一提交）
     db.add(db_role)
-    await db.commit()
-    await db.refresh(db_role)
+    await db.flush()
+    invalidate_cache(db, "role", [db_role.id])
     
-    # 关联权限
+    # 关联权限：一条 INSERT ... SELECT，不存在的权限ID被忽略
     if role.permission_ids:
-        # 获取所有权限
-        permissions = await db.execute(
-            select(Permission).where(Permission.id.in_(role.permission_ids))
+        await db.execute(
+            insert(RolePermission).from_select(
+                ["role_id", "permission_id"],
+                select(literal(db_role.id), Permission.id).where(Permission.id.in_(set(role.permission_ids))),
+            )
         )
-        permissions = permissions.scalars().all()
-        
-        # 创建关联关系
-        for permission in permissions:
-            role_permission = RolePermission(role_id=db_role.id, permission_id=permission.id)
-            db.add(role_permission)
-        
-        await db.commit()
-        await db.refresh(db_role)
     
     return db_role
 
 async def update_role_async(db: AsyncSession, role_id: int, role: RoleUpdate) -> Role:
     """更新角色信息"""
-    # 获取角色
-    db_role = await get_role_async(db, role_id)
-    if not db_role:
-        raise ValueError("Role not found")
-    
     # 更新角色信息
     update_data = role.model_dump(exclude_unset=True)
     
-    # 更新角色基本信息
+    # 检查角色名称是否已存在
     if "name" in update_data:
-        # 检查角色名称是否已存在
         existing_role = await get_role_by_name_async(db, name=update_data["name"])
         if existing_role and existing_role.id != role_id:
             raise ValueError("Role name already exists")
-        db_role.name = update_data["name"]
     
-    if "description" in update_data:
-        db_role.description = update_data["description"]
+    # 更新角色基本信息
+    role_data = {key: update_data[key] for key in ("name", "description") if key in update_data}
+    if not role_data:
+        db_role = await get_role_async(db, role_id)
+    else:
+        # UPDATE ... RETURNING 一次完成更新并返回最新数据
+        statement = (
+            update(Role)
+            .where(Role.id == role_id)
+            .values(**role_data)
+            .returning(Role)
+        )
+        result = await db.execute(statement)
+        db_role = result.scalar_one_or_none()
+    
+    if not db_role:
+        raise ValueError("Role not found")
+    invalidate_cache(db, "role", [role_id])
     
     # 更新角色权限关联
     if "permission_ids" in update_data:
-        # 删除现有关联
-        await db.execute(delete(RolePermission).where(RolePermission.role_id == role_id))
-        
-        # 创建新关联
-        if update_data["permission_ids"]:
-            permissions = await db.execute(
-                select(Permission).where(Permission.id.in_(update_data["permission_ids"]))
-            )
-            permissions = permissions.scalars().all()
-            
-            for permission in permissions:
-                role_permission = RolePermission(role_id=role_id, permission_id=permission.id)
-                db.add(role_permission)
+        await sync_role_permissions_async(db, role_id, update_data["permission_ids"] or [])
     
-    # 保存到数据库
-    await db.commit()
-    await db.refresh(db_role)
     return db_role
 
+async def sync_role_permissions_async(db: AsyncSession, role_id: int, permission_ids: List[int]) -> dict:
+    """
+    把角色的权限设置为permission_ids（不存在的权限ID被忽略）
+    差异由数据库计算：一条DELETE删除多余的关联，一条INSERT ... SELECT插入缺少的关联，未变化的关联不动
+    """
+    wanted = set(permission_ids)
+    result = await db.execute(
+        delete(RolePermission)
+        .where(RolePermission.role_id == role_id, RolePermission.permission_id.not_in(wanted))
+        .execution_options(synchronize_session=False)
+    )
+    removed = result.rowcount
+    added = 0
+    if wanted:
+        linked = select(RolePermission.permission_id).where(
+            RolePermission.role_id == role_id, RolePermission.permission_id == Permission.id
+        )
+        result = await db.execute(
+            insert(RolePermission).from_select(
+                ["role_id", "permission_id"],
+                select(literal(role_id), Permission.id).where(Permission.id.in_(wanted), ~linked.exists()),
+            )
+        )
+        added = result.rowcount
+    return {"added": added, "removed": removed}
+
 async def delete_role_async(db: AsyncSession, role_id: int) -> dict:
     """删除角色"""
     # 获取角色
@@ -127,6 +152,23 @@ async def delete_role_async(db: AsyncSession, role_id: int) -> dict:
     
     # 删除角色
     await db.delete(db_role)
-    await db.commit()
+    await db.flush()
+    invalidate_cache(db, "role", [role_id])
+    
+    return {"message": "Role deleted successfully"}
+
+async def assign_role_to_users_async(db: AsyncSession, role_id: int, user_ids: List[int]) -> dict:
+    """为一批用户设置角色（一条UPDATE），返回存在的用户数和实际变化的用户数"""
+    if await get_role_async(db, role_id) is None:
+        raise ValueError("Role not found")
     
-    return {"message": "Role deleted successfully"}
\ No newline at end of file
+    user_ids = set(user_ids)
+    matched = (await db.execute(select(func.count()).select_from(User).where(User.id.in_(user_ids)))).scalar_one()
+    statement = (
+        update(User)
+        .where(User.id.in_(user_ids), User.role_id.is_distinct_from(role_id))
+        .values(role_id=role_id)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(statement)
+    return {"matched": matched, "updated": result.rowcount}
\ No newline at end of file
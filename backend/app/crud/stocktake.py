@@ -0,0 +1,266 @@
+import codecs
+import csv
+from typing import AsyncIterator
+from sqlalchemy import Column, Integer, MetaData, String, Table, and_, delete, exists, func, insert, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateTable
+from sqlmodel import select
+from app.core.config import settings
+from app.crud.product import inventory_quantity_expression, queue_inventory_event_values, refresh_low_stock_async, _reset_shards_async
+from app.models.product import Product, Warehouse, Inventory
+
+# 盘点（库存核对）相关操作
+# 盘点表按批写入会话连接上的临时表，差异计算、库存调整和低库存集合重建都是基于集合的语句，
+# 整次盘点在一个事务中提交，不逐条更新库存。
+
+# 临时表只存在于当前数据库连接，不属于模型元数据，不会被建表流程创建
+_counts = Table(
+    "stocktake_counts",
+    MetaData(),
+    Column("line", Integer, nullable=False),  # 盘点表中的行号
+    Column("product_id", Integer),
+    Column("product_code", String),
+    Column("warehouse_id", Integer),  # 为空表示未分配仓库的库存
+    Column("counted", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+async def read_count_sheet(chunks: AsyncIterator[bytes]) -> AsyncIterator[list[dict]]:
+    """
+    逐块解析CSV盘点表，按批返回行
+    表头需要包含 quantity 和 product_id / product_code 之一，warehouse_id 可选（空值表示未分配仓库）
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    header: dict[str, int] | None = None
+    batch: list[dict] = []
+    line_number = 0
+    buffer = ""
+
+    def parse(lines: list[str]):
+        nonlocal header, line_number
+        for values in csv.reader(lines):
+            line_number += 1
+            if not values or not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = {name.strip().lower(): index for index, name in enumerate(values)}
+                if "quantity" not in header or not {"product_id", "product_code"} & header.keys():
+                    raise ValueError("Count sheet header must contain quantity and product_id or product_code")
+                continue
+            if line_number > settings.stocktake_max_lines:
+                raise ValueError(f"Count sheet exceeds {settings.stocktake_max_lines} lines")
+            batch.append(_parse_line(header, values, line_number))
+
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        parse(lines)
+        if len(batch) >= settings.stocktake_batch_size:
+            yield batch
+            batch = []
+    buffer += decoder.decode(b"", final=True)
+    parse([buffer])
+    if header is None:
+        raise ValueError("Count sheet is empty")
+    if batch:
+        yield batch
+
+def _parse_line(header: dict[str, int], values: list[str], line_number: int) -> dict:
+    def field(name: str) -> str | None:
+        index = header.get(name)
+        value = values[index].strip() if index is not None and index < len(values) else ""
+        return value or None
+
+    try:
+        product_id = field("product_id")
+        warehouse_id = field("warehouse_id")
+        quantity = field("quantity")
+        row = {
+            "line": line_number,
+            "product_id": int(product_id) if product_id else None,
+            "product_code": field("product_code"),
+            "warehouse_id": int(warehouse_id) if warehouse_id else None,
+            "counted": int(quantity) if quantity else None,
+        }
+    except ValueError:
+        raise ValueError(f"Invalid number on count sheet line {line_number}")
+    if row["product_id"] is None and row["product_code"] is None:
+        raise ValueError(f"Missing product on count sheet line {line_number}")
+    if row["counted"] is None or row["counted"] < 0:
+        raise ValueError(f"Invalid quantity on count sheet line {line_number}")
+    return row
+
+async def _stage_counts(db: AsyncSession, batches: AsyncIterator[list[dict]]) -> int:
+    """把盘点表写入临时表，按商品编码补全商品ID，返回行数"""
+    await db.execute(CreateTable(_counts, if_not_exists=True))
+    await db.execute(delete(_counts))  # 连接可能被之前的请求用过
+    lines = 0
+    async for batch in batches:
+        await db.execute(insert(_counts), batch)
+        lines += len(batch)
+    await db.execute(
+        update(_counts)
+        .where(_counts.c.product_id.is_(None))
+        .values(product_id=select(Product.id).where(Product.code == _counts.c.product_code).scalar_subquery())
+    )
+    return lines
+
+async def _check_duplicates(db: AsyncSession):
+    statement = (
+        select(_counts.c.product_id, _counts.c.warehouse_id, func.min(_counts.c.line), func.max(_counts.c.line))
+        .where(_counts.c.product_id.is_not(None))
+        .group_by(_counts.c.product_id, _counts.c.warehouse_id)
+        .having(func.count() > 1)
+        .limit(1)
+    )
+    duplicate = (await db.execute(statement)).first()
+    if duplicate is not None:
+        raise ValueError(
+            f"Product {duplicate[0]} in warehouse {duplicate[1]} is counted twice "
+            f"(lines {duplicate[2]} and {duplicate[3]})"
+        )
+
+async def _remove_unknown_lines(db: AsyncSession) -> list[dict]:
+    """找出商品或仓库不存在的行并从临时表中删除，返回这些行"""
+    product_missing = ~exists().where(Product.id == _counts.c.product_id)
+    warehouse_missing = and_(
+        _counts.c.warehouse_id.is_not(None),
+        ~exists().where(Warehouse.id == _counts.c.warehouse_id),
+    )
+    condition = or_(_counts.c.product_id.is_(None), product_missing, warehouse_missing)
+    statement = (
+        select(_counts.c.line, _counts.c.product_id, _counts.c.product_code, _counts.c.warehouse_id, warehouse_missing)
+        .where(condition)
+        .order_by(_counts.c.line)
+    )
+    skipped = [
+        {
+            "line": line,
+            "product_id": product_id,
+            "product_code": product_code,
+            "warehouse_id": warehouse_id,
+            "reason": "Warehouse not found" if missing_warehouse and product_id is not None else "Product not found",
+        }
+        for line, product_id, product_code, warehouse_id, missing_warehouse in (await db.execute(statement)).all()
+    ]
+    if skipped:
+        await db.execute(delete(_counts).where(condition))
+    return skipped
+
+def _inventory_match():
+    """
+    临时表的行与库存记录的匹配条件（仓库为空也视为相同）
+    仓库比较不使用索引，保证按选择性更高的商品ID索引连接（没有统计信息时SQLite可能选择仓库索引）
+    """
+    return and_(
+        Inventory.product_id == _counts.c.product_id,
+        func.coalesce(Inventory.warehouse_id, 0) == func.coalesce(_counts.c.warehouse_id, 0),
+    )
+
+async def _lock_counted_inventories(db: AsyncSession):
+    """按库存ID顺序一次锁定本次盘点涉及的全部库存记录（SQLite忽略行锁，写事务本身是串行的）"""
+    statement = (
+        select(Inventory.id)
+        .join(_counts, _inventory_match())
+        .order_by(Inventory.id)
+        .with_for_update(of=Inventory)
+    )
+    await db.execute(statement)
+
+async def _compute_variances(db: AsyncSession) -> list[dict]:
+    """一次查询计算每行的账面数量与盘点数量的差异"""
+    system_quantity = inventory_quantity_expression()
+    statement = (
+        select(
+            _counts.c.product_id, Product.code, _counts.c.warehouse_id, Inventory.id,
+            system_quantity, _counts.c.counted, Product.cost, Inventory.shard_count,
+        )
+        .select_from(_counts)
+        .join(Product, Product.id == _counts.c.product_id)
+        .outerjoin(Inventory, _inventory_match())
+    )
+    rows = []
+    for product_id, code, warehouse_id, inventory_id, system, counted, cost, shard_count in (await db.execute(statement)).all():
+        system = system if inventory_id is not None else 0
+        rows.append({
+            "product_id": product_id,
+            "product_code": code,
+            "warehouse_id": warehouse_id,
+            "inventory_id": inventory_id,
+            "system_quantity": system,
+            "counted_quantity": counted,
+            "variance": counted - system,
+            "variance_value": round((counted - system) * cost, 2),
+            "shard_count": shard_count or 1,
+        })
+    return rows
+
+async def _apply_adjustments(db: AsyncSession, variances: list[dict]):
+    """按盘点数量设置库存（UPDATE ... FROM 临时表），为没有库存记录的盘点行创建库存，再重建低库存集合"""
+    await db.execute(
+        update(Inventory)
+        .where(_inventory_match(), or_(Inventory.quantity != _counts.c.counted, Inventory.shard_count > 1))
+        .values(quantity=_counts.c.counted)
+        .execution_options(synchronize_session=False)
+    )
+    # 分片库存把盘点数量重新分配到各分片
+    for row in variances:
+        if row["shard_count"] > 1 and row["variance"]:
+            await _reset_shards_async(db, row["inventory_id"], row["shard_count"], row["counted_quantity"])
+
+    no_inventory = ~exists().where(_inventory_match())
+    created = await db.execute(
+        insert(Inventory)
+        .from_select(
+            ["product_id", "warehouse_id", "quantity"],
+            select(_counts.c.product_id, _counts.c.warehouse_id, _counts.c.counted)
+            .where(no_inventory, _counts.c.counted > 0),
+        )
+        .returning(Inventory.id, Inventory.product_id, Inventory.warehouse_id)
+    )
+    created_ids = {(product_id, warehouse_id): inventory_id for inventory_id, product_id, warehouse_id in created.all()}
+
+    await refresh_low_stock_async(db, select(_counts.c.product_id))
+
+    for row in variances:
+        if row["inventory_id"] is None:
+            row["inventory_id"] = created_ids.get((row["product_id"], row["warehouse_id"]))
+        if row["variance"] and row["inventory_id"] is not None:
+            queue_inventory_event_values(
+                db, "adjust", row["inventory_id"], row["product_id"], row["warehouse_id"],
+                row["counted_quantity"], change=row["variance"],
+            )
+
+async def reconcile_stocktake_async(db: AsyncSession, chunks: AsyncIterator[bytes], dry_run: bool = False) -> dict:
+    """
+    核对盘点表，返回差异报表；dry_run为假时把库存调整为盘点数量（同一事务）
+    商品或仓库不存在的行跳过并在报表中列出；同一商品和仓库出现多次时报错
+    :param chunks: CSV盘点表的字节块（如请求体流）
+    """
+    lines = await _stage_counts(db, read_count_sheet(chunks))
+    await _check_duplicates(db)
+    skipped = await _remove_unknown_lines(db)
+    if not dry_run:
+        await _lock_counted_inventories(db)
+    variances = await _compute_variances(db)
+    if not dry_run:
+        await _apply_adjustments(db, variances)
+    await db.execute(delete(_counts))
+
+    changed = [row for row in variances if row["variance"]]
+    changed.sort(key=lambda row: abs(row["variance_value"]), reverse=True)
+    for row in changed:
+        del row["shard_count"]
+    return {
+        "applied": not dry_run,
+        "lines": lines,
+        "counted": len(variances),
+        "adjusted": len(changed),
+        "unchanged": len(variances) - len(changed),
+        "quantity_gain": sum(row["variance"] for row in changed if row["variance"] > 0),
+        "quantity_loss": -sum(row["variance"] for row in changed if row["variance"] < 0),
+        "gain_value": round(sum(row["variance_value"] for row in changed if row["variance"] > 0), 2),
+        "loss_value": round(-sum(row["variance_value"] for row in changed if row["variance"] < 0), 2),
+        "variances": changed,
+        "skipped": skipped,
+    }
@@ -1,5 +1,7 @@
+from sqlalchemy import func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
+from app.core.dataloader import DataLoader, get_loader
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 from app.core.security import get_password_hash, verify_password
@@ -24,7 +26,7 @@ async def get_user_by_email_async(db: AsyncSession, email: str) -> User | None:
 async def get_users_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> dict:
     """获取用户列表，支持分页"""
     # 查询用户总数
-    count_statement = select(User).count()
+    count_statement = select(func.count()).select_from(User)
     count_result = await db.execute(count_statement)
     total = count_result.scalar_one()
     
@@ -41,6 +43,17 @@ async def get_users_async(db: AsyncSession, skip: int = 0, limit: int = 100) ->
         "limit": limit
     }
 
+async def _load_users_async(db: AsyncSession, ids: list[int]) -> dict[int, User]:
+    result = await db.execute(select(User).where(User.id.in_(ids)))
+    return {user.id: user for user in result.scalars().all()}
+
+def user_loader(db: AsyncSession) -> DataLoader:
+    return get_loader(db, "user", _load_users_async)
+
+async def get_users_by_ids_async(db: AsyncSession, ids: list[int]) -> list[User]:
+    """按给定顺序批量获取用户，不存在的ID跳过"""
+    return [user for user in await user_loader(db).load_many(ids) if user is not None]
+
 async def create_user_async(db: AsyncSession, user: UserCreate) -> User:
     """创建新用户"""
     # 检查用户名是否已存在
@@ -65,19 +78,13 @@ async def create_user_async(db: AsyncSession, user: UserCreate) -> User:
         role_id=user.role_id
     )
     
-    # 保存到数据库
+    # 保存到数据库（INSERT ... RETURNING 回填主键，由请求级事务统一提交）
     db.add(db_user)
-    await db.commit()
-    await db.refresh(db_user)
+    await db.flush()
     return db_user
 
 async def update_user_async(db: AsyncSession, user_id: int, user: UserUpdate) -> User:
     """更新用户信息"""
-    # 获取用户
-    db_user = await get_user_async(db, user_id)
-    if not db_user:
-        raise ValueError("User not found")
-    
     # 更新用户信息
     update_data = user.model_dump(exclude_unset=True)
     
@@ -85,13 +92,21 @@ async def update_user_async(db: AsyncSession, user_id: int, user: UserUpdate) ->
     if "password" in update_data:
         update_data["password"] = get_password_hash(update_data["password"])
     
-    # 更新用户对象
-    for key, value in update_data.items():
-        setattr(db_user, key, value)
+    if not update_data:
+        db_user = await get_user_async(db, user_id)
+    else:
+        # UPDATE ... RETURNING 一次完成更新并返回最新数据
+        statement = (
+            update(User)
+            .where(User.id == user_id)
+            .values(**update_data)
+            .returning(User)
+        )
+        result = await db.execute(statement)
+        db_user = result.scalar_one_or_none()
     
-    # 保存到数据库
-    await db.commit()
-    await db.refresh(db_user)
+    if not db_user:
+        raise ValueError("User not found")
     return db_user
 
 async def delete_user_async(db: AsyncSession, user_id: int) -> dict:
@@ -103,6 +118,6 @@ async def delete_user_async(db: AsyncSession, user_id: int) -> dict:
     
     # 删除用户
     await db.delete(db_user)
-    await db.commit()
+    await db.flush()
     
     return {"message": "User deleted successfully"}
\ No newline at end of file
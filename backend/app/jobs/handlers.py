@@ -0,0 +1,25 @@
+from app.crud.product import refresh_low_stock_async
+from app.crud.report import get_valuation_report_async
+from app.jobs.registry import JobContext, job, job_session
+
+# 后台任务处理函数：参数来自提交任务时的params，返回值（可JSON序列化）作为任务结果
+
+@job("valuation_report", concurrency=1)
+async def valuation_report(context: JobContext) -> dict:
+    """生成库存估值报表，结果同时写入报表缓存"""
+    params = context.params
+    async with job_session() as db:
+        return await get_valuation_report_async(
+            db,
+            a_share=params.get("a_share", 0.8),
+            b_share=params.get("b_share", 0.95),
+            detail=params.get("detail", False),
+        )
+
+@job("low_stock_refresh", concurrency=1)
+async def low_stock_refresh(context: JobContext) -> dict:
+    """按集合重建低库存记录，可指定商品ID"""
+    product_ids = context.params.get("product_ids")
+    async with job_session() as db:
+        await refresh_low_stock_async(db, product_ids)
+    return {"product_ids": product_ids}
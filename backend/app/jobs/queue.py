@@ -0,0 +1,315 @@
+import json
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import Any, Optional
+from app.core.config import settings
+from app.core import redis as redis_core
+
+# 后台任务队列
+# 每种任务类型一个队列，领取任务时检查该类型正在运行的任务数，保证所有工作进程合计不超过并发上限。
+# 运行中的任务定期发送心跳，心跳超时的任务（工作进程退出）标记为失败，不自动重试，避免重复执行非幂等操作。
+# 结束任务只对运行中的任务生效：被标记为失败的任务随后完成时不覆盖其状态，执行器通过心跳得知后中断任务。
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+CANCEL_REQUESTED = "cancel_requested"  # 心跳结果：任务运行中且已被请求取消
+
+@dataclass
+class Job:
+    """后台任务"""
+    id: str
+    type: str
+    params: dict
+    status: str = QUEUED
+    progress: Optional[dict] = None  # {"done": ..., "total": ..., "message": ...}
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_requested: bool = False
+
+def new_job(job_type: str, params: dict) -> Job:
+    return Job(id=uuid.uuid4().hex, type=job_type, params=params)
+
+class LocalJobQueue:
+    """进程内存实现，只适用于单进程部署和测试（任务由API进程自己执行）"""
+
+    def __init__(self):
+        self._jobs: dict[str, Job] = {}
+        self._queues: dict[str, deque[str]] = {}
+        self._running: dict[str, set[str]] = {}
+        self._heartbeats: dict[str, float] = {}
+
+    async def submit(self, job_type: str, params: dict) -> Job:
+        job = new_job(job_type, params)
+        self._jobs[job.id] = job
+        self._queues.setdefault(job_type, deque()).append(job.id)
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    async def claim(self, limits: dict[str, int]) -> Job | None:
+        for job_type, limit in limits.items():
+            queue = self._queues.get(job_type)
+            running = self._running.setdefault(job_type, set())
+            if queue and len(running) < limit:
+                job = self._jobs[queue.popleft()]
+                job.status = RUNNING
+                job.started_at = time.time()
+                running.add(job.id)
+                self._heartbeats[job.id] = time.time()
+                return job
+        return None
+
+    async def update_progress(self, job_id: str, progress: dict) -> bool:
+        job = self._jobs[job_id]
+        if job.status != RUNNING:
+            return False
+        job.progress = progress
+        self._heartbeats[job_id] = time.time()
+        return True
+
+    async def heartbeat(self, job_id: str) -> str:
+        job = self._jobs[job_id]
+        if job.status != RUNNING:
+            return job.status
+        self._heartbeats[job_id] = time.time()
+        return CANCEL_REQUESTED if job.cancel_requested else RUNNING
+
+    async def finish(self, job_id: str, status: str, result: Any = None, error: str | None = None) -> bool:
+        job = self._jobs[job_id]
+        if job.status != RUNNING:
+            return False
+        job.status, job.result, job.error, job.finished_at = status, result, error, time.time()
+        self._running.get(job.type, set()).discard(job_id)
+        self._heartbeats.pop(job_id, None)
+        return True
+
+    async def request_cancel(self, job_id: str) -> Job:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError("Job not found")
+        if job.status in FINISHED_STATUSES:
+            raise ValueError("Job already finished")
+        if job.status == QUEUED:
+            self._queues[job.type].remove(job_id)
+            job.status, job.finished_at = CANCELLED, time.time()
+        else:
+            job.cancel_requested = True
+        return job
+
+    async def reap(self, timeout: float) -> int:
+        deadline = time.time() - timeout
+        stale = [job_id for job_id, beat in self._heartbeats.items() if beat < deadline]
+        reaped = 0
+        for job_id in stale:
+            reaped += await self.finish(job_id, FAILED, error="Worker lost")
+        return reaped
+
+# 领取任务：该类型运行中的任务数未达上限时，从队列取出一个任务并标记为运行中
+# KEYS: 队列, 运行中集合；ARGV: 并发上限, 当前时间, 任务键前缀
+_CLAIM_SCRIPT = """
+if redis.call('SCARD', KEYS[2]) >= tonumber(ARGV[1]) then
+    return false
+end
+local job_id = redis.call('LPOP', KEYS[1])
+if not job_id then
+    return false
+end
+redis.call('SADD', KEYS[2], job_id)
+redis.call('HSET', ARGV[3] .. job_id, 'status', 'running', 'started_at', ARGV[2], 'heartbeat_at', ARGV[2])
+return job_id
+"""
+
+# 取消任务：排队中的任务直接取消，运行中的任务标记取消请求，由执行的工作进程中断
+# KEYS: 任务, 队列；ARGV: 任务ID, 当前时间, 结果保留时间
+_CANCEL_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], 'status')
+if not status then
+    return 'missing'
+end
+if status == 'queued' then
+    redis.call('LREM', KEYS[2], 1, ARGV[1])
+    redis.call('HSET', KEYS[1], 'status', 'cancelled', 'finished_at', ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+elseif status == 'running' then
+    redis.call('HSET', KEYS[1], 'cancel_requested', '1')
+end
+return status
+"""
+
+# 结束任务：只结束运行中的任务；ARGV[7]不为空时只在心跳早于该时间时结束（清理心跳超时的任务），
+# 检查和写入在同一个脚本中完成，不会覆盖期间已结束的任务。任务已不存在或已结束时从运行中集合移除
+# KEYS: 任务, 运行中集合；ARGV: 任务ID, 状态, 当前时间, 结果保留时间, 结果（JSON）, 错误, 心跳截止时间
+_FINISH_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+    redis.call('SREM', KEYS[2], ARGV[1])
+    return 0
+end
+if ARGV[7] ~= '' and tonumber(redis.call('HGET', KEYS[1], 'heartbeat_at') or '0') >= tonumber(ARGV[7]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[2], 'finished_at', ARGV[3])
+if ARGV[5] ~= '' then
+    redis.call('HSET', KEYS[1], 'result', ARGV[5])
+end
+if ARGV[6] ~= '' then
+    redis.call('HSET', KEYS[1], 'error', ARGV[6])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('SREM', KEYS[2], ARGV[1])
+return 1
+"""
+
+# 心跳：任务仍在运行时更新心跳时间（ARGV[2]不为空时同时更新进度），返回 running 或 cancel_requested；
+# 任务已结束时返回其状态，已不存在时返回 missing，不写入任何字段
+# KEYS: 任务；ARGV: 当前时间, 进度（JSON）
+_HEARTBEAT_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], 'status')
+if status ~= 'running' then
+    return status or 'missing'
+end
+redis.call('HSET', KEYS[1], 'heartbeat_at', ARGV[1])
+if ARGV[2] ~= '' then
+    redis.call('HSET', KEYS[1], 'progress', ARGV[2])
+end
+if redis.call('HGET', KEYS[1], 'cancel_requested') == '1' then
+    return 'cancel_requested'
+end
+return 'running'
+"""
+
+class RedisJobQueue:
+    """Redis实现，API进程提交任务，独立的工作进程（worker.py）执行"""
+
+    prefix = "ims:job"
+
+    def _script(self, source: str):
+        return redis_core.get_async_redis_client().register_script(source)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}"
+
+    def _queue_key(self, job_type: str) -> str:
+        return f"{self.prefix}s:queue:{job_type}"
+
+    def _running_key(self, job_type: str) -> str:
+        return f"{self.prefix}s:running:{job_type}"
+
+    async def submit(self, job_type: str, params: dict) -> Job:
+        job = new_job(job_type, params)
+        client = redis_core.get_async_redis_client()
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job.id), mapping={
+                "type": job.type,
+                "params": json.dumps(job.params),
+                "status": job.status,
+                "created_at": job.created_at,
+            })
+            pipe.rpush(self._queue_key(job_type), job.id)
+            await pipe.execute()
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        data = await redis_core.get_async_redis_client().hgetall(self._job_key(job_id))
+        if not data:
+            return None
+        return Job(
+            id=job_id,
+            type=data["type"],
+            params=json.loads(data["params"]),
+            status=data["status"],
+            progress=json.loads(data["progress"]) if "progress" in data else None,
+            result=json.loads(data["result"]) if "result" in data else None,
+            error=data.get("error"),
+            created_at=float(data["created_at"]),
+            started_at=float(data["started_at"]) if "started_at" in data else None,
+            finished_at=float(data["finished_at"]) if "finished_at" in data else None,
+            cancel_requested=data.get("cancel_requested") == "1",
+        )
+
+    async def claim(self, limits: dict[str, int]) -> Job | None:
+        claim = self._script(_CLAIM_SCRIPT)
+        for job_type, limit in limits.items():
+            job_id = await claim(
+                keys=[self._queue_key(job_type), self._running_key(job_type)],
+                args=[limit, time.time(), f"{self.prefix}:"],
+            )
+            if job_id:
+                return await self.get(job_id)
+        return None
+
+    async def update_progress(self, job_id: str, progress: dict) -> bool:
+        status = await self._script(_HEARTBEAT_SCRIPT)(
+            keys=[self._job_key(job_id)], args=[time.time(), json.dumps(progress)],
+        )
+        return status in (RUNNING, CANCEL_REQUESTED)
+
+    async def heartbeat(self, job_id: str) -> str:
+        return await self._script(_HEARTBEAT_SCRIPT)(keys=[self._job_key(job_id)], args=[time.time(), ""])
+
+    async def _finish(
+        self, job_id: str, job_type: str, status: str, result: Any = None, error: str | None = None,
+        heartbeat_before: float | None = None,
+    ) -> bool:
+        finished = await self._script(_FINISH_SCRIPT)(
+            keys=[self._job_key(job_id), self._running_key(job_type)],
+            args=[
+                job_id, status, time.time(), settings.job_result_ttl,
+                json.dumps(result) if result is not None else "",
+                error or "",
+                heartbeat_before if heartbeat_before is not None else "",
+            ],
+        )
+        return bool(finished)
+
+    async def finish(self, job_id: str, status: str, result: Any = None, error: str | None = None) -> bool:
+        """结束运行中的任务，任务已不在运行中（如心跳超时已被标记为失败）时不修改，返回False"""
+        job_type = await redis_core.get_async_redis_client().hget(self._job_key(job_id), "type")
+        if job_type is None:
+            return False
+        return await self._finish(job_id, job_type, status, result, error)
+
+    async def request_cancel(self, job_id: str) -> Job:
+        job = await self.get(job_id)
+        if job is None:
+            raise ValueError("Job not found")
+        status = await self._script(_CANCEL_SCRIPT)(
+            keys=[self._job_key(job_id), self._queue_key(job.type)],
+            args=[job_id, time.time(), settings.job_result_ttl],
+        )
+        if status == "missing":
+            raise ValueError("Job not found")
+        if status in FINISHED_STATUSES:
+            raise ValueError("Job already finished")
+        return await self.get(job_id)
+
+    async def reap(self, timeout: float) -> int:
+        """把心跳超时的运行中任务标记为失败（执行的工作进程已退出）"""
+        from app.jobs.registry import job_types  # 避免循环导入
+        client = redis_core.get_async_redis_client()
+        deadline = time.time() - timeout
+        reaped = 0
+        for job_type in job_types():
+            for job_id in await client.smembers(self._running_key(job_type)):
+                # 心跳检查和标记失败由同一个脚本完成，期间发送心跳或结束的任务不受影响
+                reaped += await self._finish(job_id, job_type, FAILED, error="Worker lost", heartbeat_before=deadline)
+        return reaped
+
+def _create_queue():
+    if settings.job_backend == "local":
+        return LocalJobQueue()
+    return RedisJobQueue()
+
+job_queue = _create_queue()
+
+def job_to_dict(job: Job) -> dict:
+    return asdict(job)
@@ -0,0 +1,76 @@
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import publish_pending_invalidations
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.events import publish_pending_events, discard_pending_events
+from app.jobs.queue import job_queue
+
+# 后台任务类型注册表，任务处理函数通过 @job 装饰器注册（见 app/jobs/handlers.py）
+
+class JobCancelled(Exception):
+    """任务已被请求取消"""
+
+class JobContext:
+    """传给任务处理函数的上下文，用于报告进度和检查取消请求"""
+
+    def __init__(self, job_id: str, params: dict):
+        self.job_id = job_id
+        self.params = params
+        self.cancel_requested = False  # 由执行器根据心跳结果设置
+        self.abandoned = False  # 任务已不在运行中（如心跳超时已被标记为失败），结果不再保存
+
+    async def progress(self, done: int, total: int | None = None, message: str | None = None):
+        """报告进度，同时检查取消请求（长时间的同步阶段之间应调用）"""
+        if not await job_queue.update_progress(self.job_id, {"done": done, "total": total, "message": message}):
+            self.abandoned = True
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self.cancel_requested or self.abandoned:
+            raise JobCancelled()
+
+@asynccontextmanager
+async def job_session() -> AsyncIterator[AsyncSession]:
+    """任务使用的数据库会话，与请求级工作单元相同：正常结束时提交事务，再发布变更事件和缓存失效，出错时回滚"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+            await publish_pending_events(db)
+            await publish_pending_invalidations(db)
+        except BaseException:
+            discard_pending_events(db)
+            await db.rollback()
+            raise
+
+@dataclass
+class JobType:
+    name: str
+    handler: Callable[[JobContext], Awaitable[Any]]
+    concurrency: int  # 所有工作进程合计同时运行的最大任务数
+
+_job_types: dict[str, JobType] = {}
+
+def job(name: str, concurrency: int = 1):
+    """
+    注册任务类型
+    :param name: 任务类型名称，提交任务时使用
+    :param concurrency: 默认并发上限，可通过 JOB_CONCURRENCY 按类型覆盖
+    """
+    def decorator(func: Callable[[JobContext], Awaitable[Any]]):
+        _job_types[name] = JobType(name, func, settings.job_concurrency.get(name, concurrency))
+        return func
+    return decorator
+
+def get_job_type(name: str) -> JobType | None:
+    return _job_types.get(name)
+
+def job_types() -> list[str]:
+    return list(_job_types)
+
+def concurrency_limits() -> dict[str, int]:
+    """各任务类型的并发上限"""
+    return {name: job_type.concurrency for name, job_type in _job_types.items()}
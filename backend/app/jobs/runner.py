@@ -0,0 +1,133 @@
+import asyncio
+import time
+from app.core.config import settings
+from app.core.logger import logger
+from app.jobs.queue import Job, job_queue, RUNNING, SUCCEEDED, FAILED, CANCELLED, CANCEL_REQUESTED
+from app.jobs.registry import JobCancelled, JobContext, get_job_type, concurrency_limits
+
+class JobRunner:
+    """
+    从队列领取并执行后台任务
+    每个执行器最多同时执行 slots 个任务；任务类型的并发上限由队列在领取时对所有执行器统一检查
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._running: dict[str, asyncio.Task] = {}
+        self._task: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()  # 后台维护任务（清理超时任务），保留引用避免执行中被回收
+        self._reaped_at = 0.0
+
+    async def run(self):
+        """领取循环：有空闲槽位时领取任务，队列为空时按轮询间隔等待"""
+        while True:
+            try:
+                self._reap_stale()
+                job = await job_queue.claim(concurrency_limits()) if len(self._running) < self.slots else None
+            except Exception as e:
+                logger.warning(f"Job queue unavailable: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(settings.job_poll_interval)
+                continue
+            self._running[job.id] = asyncio.create_task(self._execute(job))
+
+    def _reap_stale(self):
+        # 心跳超时的任务每隔半个超时时间检查一次
+        now = time.monotonic()
+        if now - self._reaped_at >= settings.job_heartbeat_timeout / 2:
+            self._reaped_at = now
+            task = asyncio.create_task(self._reap())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _reap(self):
+        try:
+            reaped = await job_queue.reap(settings.job_heartbeat_timeout)
+        except Exception as e:
+            logger.warning(f"Reaping stale jobs failed: {e}")
+            return
+        if reaped:
+            logger.warning(f"Marked {reaped} jobs as failed after heartbeat timeout")
+
+    async def _execute(self, job: Job):
+        job_type = get_job_type(job.type)
+        context = JobContext(job.id, job.params)
+        started = time.perf_counter()
+        try:
+            if job_type is None:
+                await job_queue.finish(job.id, FAILED, error=f"Unknown job type: {job.type}")
+                return
+            handler = asyncio.create_task(job_type.handler(context))
+            heartbeat = asyncio.create_task(self._heartbeat(job.id, context, handler))
+            try:
+                result = await handler
+            except (asyncio.CancelledError, JobCancelled):
+                if context.abandoned:
+                    logger.warning(f"Job {job.id} ({job.type}) is no longer running, aborted")
+                    return
+                if not context.cancel_requested:
+                    # 执行器停止时未完成的任务标记为失败，不自动重试
+                    await job_queue.finish(job.id, FAILED, error="Worker stopped")
+                    raise
+                await job_queue.finish(job.id, CANCELLED)
+                logger.info(f"Job {job.id} ({job.type}) cancelled")
+            except Exception as e:
+                logger.exception(f"Job {job.id} ({job.type}) failed")
+                await job_queue.finish(job.id, FAILED, error=str(e) or e.__class__.__name__)
+            else:
+                if await job_queue.finish(job.id, SUCCEEDED, result=result):
+                    logger.info(f"Job {job.id} ({job.type}) succeeded in {time.perf_counter() - started:.3f}s")
+                else:
+                    logger.warning(f"Job {job.id} ({job.type}) completed after it was no longer running, result discarded")
+            finally:
+                heartbeat.cancel()
+        finally:
+            self._running.pop(job.id, None)
+
+    async def _heartbeat(self, job_id: str, context: JobContext, handler: asyncio.Task):
+        """定期发送心跳并检查取消请求，请求取消或任务已不在运行中（心跳超时被标记为失败）时中断任务"""
+        while True:
+            await asyncio.sleep(settings.job_heartbeat_interval)
+            try:
+                status = await job_queue.heartbeat(job_id)
+            except Exception as e:
+                logger.warning(f"Job heartbeat failed: {e}")
+                continue
+            if status == RUNNING:
+                continue
+            if status == CANCEL_REQUESTED:
+                if not context.cancel_requested:
+                    context.cancel_requested = True
+                    handler.cancel()
+                continue
+            context.abandoned = True
+            handler.cancel()
+            return
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 30.0):
+        """停止领取新任务，等待执行中的任务完成（最长timeout秒），超时的任务被中断并标记为失败"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        running = list(self._running.values())
+        if not running:
+            return
+        logger.info(f"Waiting for {len(running)} running jobs to finish")
+        _, pending = await asyncio.wait(running, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+job_runner = JobRunner(settings.job_worker_slots)
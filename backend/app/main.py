@@ -1,11 +1,19 @@
+import time
+_module_started = time.perf_counter()  # 用于统计应用导入耗时
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-import time
 from app.core.config import settings
-from app.core.database import async_init_db
-from app.core.redis import init_redis_pool
+from app.core.startup import run_startup
+from app.core.database import async_close_db
+from app.core.redis import close_redis_pool
+from app.core.tasks import start_periodic_tasks, stop_periodic_tasks
+from app.core.events import event_hub
+from app.core.cache import cache
 from app.core.logger import logger
+from app.crud.product import inventory_batcher
+from app.jobs.runner import job_runner
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -67,10 +75,24 @@ async def log_requests(request: Request, call_next):
 # 初始化数据库和Redis
 @app.on_event("startup")
 async def startup_event():
-    # 初始化Redis连接池
-    await init_redis_pool()
-    # 初始化数据库
-    await async_init_db()
+    # 初始化Redis连接池、检查数据库结构、预热连接池并记录启动耗时
+    await run_startup(import_time=app_import_time)
+    # 启动后台任务（如预留确认的批量写入）
+    start_periodic_tasks()
+    # 本地任务队列没有独立的工作进程，由API进程执行任务
+    if settings.job_backend == "local":
+        job_runner.start()
+
+# 关闭应用：结束事件流和缓存失效订阅，停止任务执行器和后台任务并处理完剩余工作，提交尚未提交的出入库批次，再释放数据库和Redis连接
+@app.on_event("shutdown")
+async def shutdown_event():
+    await event_hub.close()
+    await cache.close()
+    await job_runner.stop()
+    await stop_periodic_tasks()
+    await inventory_batcher.drain()
+    await async_close_db()
+    await close_redis_pool()
 
 # 根路由
 @app.get("/")
@@ -82,10 +104,20 @@ async def read_root():
     }
 
 # API版本1路由注册
-from app.api.v1 import users, roles, permissions, auth, products
+from app.api.v1 import users, roles, permissions, auth, products, reservations, stream, changes, metrics, reports, jobs, stocktakes
 
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(roles.router, prefix="/api/v1/roles", tags=["roles"])
 app.include_router(permissions.router, prefix="/api/v1/permissions", tags=["permissions"])
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
-app.include_router(products.router, prefix="/api/v1/products", tags=["products"])
\ No newline at end of file
+app.include_router(products.router, prefix="/api/v1/products", tags=["products"])
+app.include_router(reservations.router, prefix="/api/v1/reservations", tags=["reservations"])
+app.include_router(stream.router, prefix="/api/v1/stream", tags=["stream"])
+app.include_router(changes.router, prefix="/api/v1/changes", tags=["changes"])
+app.include_router(metrics.router, prefix="/api/v1/metrics", tags=["metrics"])
+app.include_router(reports.router, prefix="/api/v1/reports", tags=["reports"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
+app.include_router(stocktakes.router, prefix="/api/v1/stocktakes", tags=["stocktakes"])
+
+# 应用模块（含全部路由）导入耗时，启动时一并记录
+app_import_time = time.perf_counter() - _module_started
@@ -0,0 +1,15 @@
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field
+from typing import Optional
+
+# 商品、仓库和库存的变更日志，序号单调递增，下游按序号增量同步；删除记录作为墓碑保留
+class ChangeLog(SQLModel, table=True):
+    __tablename__ = "changes"
+    # 按实体过滤并按序号查找（清理水位 max(seq) WHERE entity='feed'）走索引，不扫描整张变更表
+    __table_args__ = (Index("ix_changes_entity_seq", "entity", "seq"),)
+    
+    seq: Optional[int] = Field(default=None, primary_key=True)  # 变更序号
+    entity: str = Field(nullable=False)  # 实体类型：product / warehouse / inventory
+    entity_id: int = Field(nullable=False)  # 实体ID
+    op: str = Field(nullable=False)  # upsert / delete
+    changed_at: float = Field(nullable=False, index=True)  # 记录时间（Unix时间戳，秒）
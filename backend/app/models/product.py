@@ -1,3 +1,4 @@
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
 
@@ -12,9 +13,10 @@ class Product(SQLModel, table=True):
     unit: str = Field(default="个")  # 商品单位
     price: float = Field(default=0.0)  # 商品价格
     cost: float = Field(default=0.0)  # 商品成本
+    reorder_point: int = Field(default=0)  # 补货点，库存低于该值时需要补货（0表示不提醒）
     
     # 关联关系
-    inventory: Optional["Inventory"] = Relationship(back_populates="product")
+    inventories: List["Inventory"] = Relationship(back_populates="product")  # 商品在各仓库的库存
 
 class Inventory(SQLModel, table=True):
     __tablename__ = "inventories"
@@ -23,11 +25,23 @@ class Inventory(SQLModel, table=True):
     product_id: int = Field(foreign_key="products.id", index=True)  # 商品ID，外键添加索引
     quantity: int = Field(default=0)  # 库存数量
     warehouse_id: Optional[int] = Field(default=None, foreign_key="warehouses.id", index=True)  # 仓库ID，外键添加索引
+    reorder_point: Optional[int] = Field(default=None)  # 该仓库的补货点，为空时使用商品的补货点
+    shard_count: int = Field(default=1)  # 数量分片数，大于1时数量分散在inventory_shards中，本字段的数量为定期汇总值
     
     # 关联关系
-    product: Optional[Product] = Relationship(back_populates="inventory")
+    product: Optional[Product] = Relationship(back_populates="inventories")
     warehouse: Optional["Warehouse"] = Relationship(back_populates="inventories")
 
+# 每个商品在每个仓库最多一条库存记录；唯一约束不比较空值，未分配仓库的记录由部分索引保证唯一
+Index("uq_inventories_product_warehouse", Inventory.product_id, Inventory.warehouse_id, unique=True)
+Index(
+    "uq_inventories_product_unassigned",
+    Inventory.product_id,
+    unique=True,
+    sqlite_where=Inventory.warehouse_id.is_(None),
+    postgresql_where=Inventory.warehouse_id.is_(None),
+)
+
 class Warehouse(SQLModel, table=True):
     __tablename__ = "warehouses"
     
@@ -38,3 +52,24 @@ class Warehouse(SQLModel, table=True):
     
     # 关联关系
     inventories: List[Inventory] = Relationship(back_populates="warehouse")
+
+class InventoryShard(SQLModel, table=True):
+    """热门商品的库存数量分片，出入库只更新其中一个分片，避免所有操作争用同一库存行"""
+    __tablename__ = "inventory_shards"
+    
+    inventory_id: int = Field(foreign_key="inventories.id", primary_key=True)  # 库存ID
+    shard: int = Field(primary_key=True)  # 分片序号
+    quantity: int = Field(default=0)  # 分片数量
+
+class LowStockItem(SQLModel, table=True):
+    """低于补货点的库存集合，与库存数量在同一事务中维护，查询补货清单时无需扫描库存表"""
+    __tablename__ = "low_stock_items"
+    
+    inventory_id: int = Field(foreign_key="inventories.id", primary_key=True)  # 库存ID
+    product_id: int = Field(foreign_key="products.id", index=True)  # 商品ID
+    warehouse_id: Optional[int] = Field(default=None, index=True)  # 仓库ID
+    quantity: int  # 当前库存数量
+    reorder_point: int  # 生效的补货点
+    
+    # 关联关系
+    product: Optional[Product] = Relationship()
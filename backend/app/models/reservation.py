@@ -0,0 +1,11 @@
+from datetime import datetime, timezone
+from sqlmodel import SQLModel, Field
+
+# 已写入库存的预留确认记录，重复写入同一批确认时据此跳过，保证每个确认只扣减一次库存
+class ConfirmedReservation(SQLModel, table=True):
+    __tablename__ = "confirmed_reservations"
+    
+    id: str = Field(primary_key=True)  # 预留ID
+    product_id: int = Field(foreign_key="products.id", index=True)  # 商品ID
+    quantity: int  # 确认数量
+    applied_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)  # 写入库存的时间，按此清理过期记录
@@ -0,0 +1,11 @@
+from datetime import datetime, timezone
+from sqlmodel import SQLModel, Field
+from typing import Optional
+
+# 数据库结构版本记录，启动时用于跳过不必要的建表操作
+class SchemaVersion(SQLModel, table=True):
+    __tablename__ = "schema_version"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    version: str = Field(nullable=False)  # 表结构指纹
+    applied_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))  # 记录时间
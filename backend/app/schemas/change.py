@@ -0,0 +1,17 @@
+from sqlmodel import SQLModel
+from typing import Optional, Union
+from app.schemas.product import ProductResponse, WarehouseResponse, InventoryResponse
+
+# 一条变更
+class ChangeResponse(SQLModel):
+    seq: int  # 变更序号
+    entity: str  # product / warehouse / inventory
+    id: int  # 实体ID
+    op: str  # upsert / delete
+    data: Optional[Union[ProductResponse, WarehouseResponse, InventoryResponse]] = None  # 当前数据，删除时为空
+
+# 变更列表响应
+class ChangeFeedResponse(SQLModel):
+    changes: list[ChangeResponse]
+    next_since: int  # 下次同步使用的游标
+    has_more: bool  # 是否还有更多变更，为真时应立即继续拉取
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Any, Optional
+
+# 提交任务请求
+class JobCreate(BaseModel):
+    type: str  # 任务类型，如 valuation_report
+    params: dict = {}
+
+# 任务进度
+class JobProgress(BaseModel):
+    done: int
+    total: Optional[int] = None
+    message: Optional[str] = None
+
+# 任务状态响应
+class JobResponse(BaseModel):
+    id: str
+    type: str
+    status: str  # queued / running / succeeded / failed / cancelled
+    progress: Optional[JobProgress] = None
+    result: Any = None  # 成功时的结果
+    error: Optional[str] = None  # 失败原因
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_requested: bool = False
@@ -1,5 +1,5 @@
-from sqlmodel import SQLModel
-from typing import Optional
+from sqlmodel import SQLModel, Field
+from typing import Literal, Optional
 
 # 商品基本信息
 class ProductBase(SQLModel):
@@ -10,6 +10,7 @@ class ProductBase(SQLModel):
     unit: str = "个"
     price: float = 0.0
     cost: float = 0.0
+    reorder_point: int = 0
 
 # 创建商品请求
 class ProductCreate(ProductBase):
@@ -24,6 +25,7 @@ class ProductUpdate(SQLModel):
     unit: Optional[str] = None
     price: Optional[float] = None
     cost: Optional[float] = None
+    reorder_point: Optional[int] = None
 
 # 商品响应
 class ProductResponse(ProductBase):
@@ -60,6 +62,7 @@ class InventoryBase(SQLModel):
     product_id: int
     quantity: int
     warehouse_id: Optional[int] = None
+    reorder_point: Optional[int] = None
 
 # 创建库存请求
 class InventoryCreate(InventoryBase):
@@ -69,6 +72,7 @@ class InventoryCreate(InventoryBase):
 class InventoryUpdate(SQLModel):
     quantity: Optional[int] = None
     warehouse_id: Optional[int] = None
+    reorder_point: Optional[int] = None
 
 # 库存响应
 class InventoryResponse(SQLModel):
@@ -78,6 +82,100 @@ class InventoryResponse(SQLModel):
     quantity: int
     warehouse_id: Optional[int] = None
     warehouse: Optional[WarehouseResponse] = None
+    reorder_point: Optional[int] = None
+    shard_count: int = 1
     
     class Config:
         from_attributes = True
+
+# 低库存（需要补货）项响应
+class LowStockItemResponse(SQLModel):
+    inventory_id: int
+    product_id: int
+    product: ProductResponse
+    warehouse_id: Optional[int] = None
+    quantity: int
+    reorder_point: int
+    
+    class Config:
+        from_attributes = True
+
+# 调拨请求（把同一商品的库存从一个仓库移到另一个仓库，仓库为空表示未分配仓库的库存）
+class TransferCreate(SQLModel):
+    product_id: int
+    from_warehouse_id: Optional[int] = None
+    to_warehouse_id: Optional[int] = None
+    quantity: int = Field(ge=1)
+
+# 调拨单请求，整单在一个事务中执行，任一行失败则整单不生效
+class TransferOrderCreate(SQLModel):
+    lines: list[TransferCreate] = Field(min_length=1, max_length=1000)
+
+# 调拨后的库存数量
+class TransferInventory(SQLModel):
+    inventory_id: int
+    product_id: int
+    warehouse_id: Optional[int] = None
+    quantity: int
+    change: int  # 本次调拨的净变化
+
+# 调拨响应
+class TransferResponse(SQLModel):
+    lines: int  # 调拨行数
+    quantity: int  # 调拨总数量
+    inventories: list[TransferInventory]  # 涉及的库存，按库存ID排序
+
+# 价格调整：percent 按百分比增减，absolute 增减固定金额，set 设为指定值（结果保留两位小数，不小于0）
+class PriceAdjustment(SQLModel):
+    mode: Literal["percent", "absolute", "set"]
+    value: float
+
+# 批量调价的商品筛选条件，多个条件同时满足
+class ProductFilter(SQLModel):
+    category: Optional[str] = None
+    code_prefix: Optional[str] = None
+    ids: Optional[list[int]] = Field(default=None, min_length=1, max_length=50000)
+
+# 按筛选条件批量调整售价和成本
+class BulkPriceUpdate(SQLModel):
+    filter: ProductFilter
+    price: Optional[PriceAdjustment] = None
+    cost: Optional[PriceAdjustment] = None
+
+# 价目表中的一项，按商品ID或编码匹配，只更新给出的字段
+class PriceListItem(SQLModel):
+    product_id: Optional[int] = None
+    product_code: Optional[str] = None
+    price: Optional[float] = Field(default=None, ge=0)
+    cost: Optional[float] = Field(default=None, ge=0)
+
+# 按价目表批量设置售价和成本
+class PriceListUpdate(SQLModel):
+    items: list[PriceListItem] = Field(min_length=1, max_length=50000)
+
+# 批量调价结果
+class BulkPriceResult(SQLModel):
+    matched: int  # 匹配的商品数
+    updated: int  # 价格实际变化的商品数
+    unknown: list[PriceListItem] = []  # 价目表中不存在的商品
+
+# 批量删除商品；on_inventory 为商品仍有库存时的处理：block 拒绝删除，cascade 一并删除库存
+class ProductBulkDelete(SQLModel):
+    filter: ProductFilter
+    on_inventory: Literal["block", "cascade"] = "block"
+
+# 批量删除仓库；on_inventory 为仓库仍有库存时的处理：block 拒绝删除，cascade 一并删除库存，nullify 库存解除与仓库的关联
+class WarehouseBulkDelete(SQLModel):
+    ids: list[int] = Field(min_length=1, max_length=50000)
+    on_inventory: Literal["block", "cascade", "nullify"] = "nullify"
+
+# 批量删除库存
+class InventoryBulkDelete(SQLModel):
+    ids: list[int] = Field(min_length=1, max_length=50000)
+
+# 批量删除结果
+class BulkDeleteResult(SQLModel):
+    matched: int  # 存在的记录数
+    deleted: int  # 删除的记录数
+    inventories_deleted: int = 0  # 一并删除的库存数
+    inventories_detached: int = 0  # 解除仓库关联的库存数
@@ -0,0 +1,39 @@
+from pydantic import BaseModel
+from typing import Optional
+
+# 估值汇总（金额按成本和售价分别计算）
+class ValuationSummary(BaseModel):
+    items: int  # 库存记录数
+    quantity: int
+    cost_value: float  # 按成本计算的库存金额
+    price_value: float  # 按售价计算的库存金额
+    margin: float  # 毛利
+    margin_ratio: Optional[float] = None  # 毛利率，售价金额为0时为空
+
+class WarehouseValuation(ValuationSummary):
+    warehouse_id: Optional[int] = None  # 为空表示未分配仓库
+
+class CategoryValuation(ValuationSummary):
+    category: Optional[str] = None  # 为空表示未分类
+
+class WarehouseCategoryValuation(ValuationSummary):
+    warehouse_id: Optional[int] = None
+    category: Optional[str] = None
+
+# ABC分类汇总
+class ABCClassSummary(BaseModel):
+    abc_class: str  # A / B / C
+    products: int
+    cost_value: float
+    share: float  # 占库存总金额的比例
+
+# 库存估值报表
+class ValuationReport(BaseModel):
+    version: str  # 数据版本，数据未变化时返回缓存的报表
+    generated_at: float  # 生成时间（Unix时间戳，秒）
+    elapsed: float  # 生成耗时（秒）
+    totals: ValuationSummary
+    by_warehouse: list[WarehouseValuation]
+    by_category: list[CategoryValuation]
+    by_warehouse_category: Optional[list[WarehouseCategoryValuation]] = None
+    abc: list[ABCClassSummary]
@@ -0,0 +1,29 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+
+# 创建预留请求
+class ReservationCreate(SQLModel):
+    product_id: int
+    quantity: int = Field(ge=1)
+    ttl_seconds: Optional[int] = Field(default=None, ge=1)  # 有效期，为空时使用默认值
+
+# 预留响应
+class ReservationResponse(SQLModel):
+    id: str
+    product_id: int
+    quantity: int
+    expires_at: float  # 过期时间（Unix时间戳，秒）
+    available: int  # 预留后的可承诺量
+
+# 确认或释放预留的响应
+class ReservationStatusResponse(SQLModel):
+    id: str
+    product_id: int
+    quantity: int
+    status: str  # confirmed / released
+
+# 可承诺量响应
+class AvailabilityResponse(SQLModel):
+    product_id: int
+    on_hand: int  # 库存数量
+    available: int  # 可承诺量
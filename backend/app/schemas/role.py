@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 class RoleBase(BaseModel):
@@ -17,4 +17,12 @@ class RoleResponse(RoleBase):
     id: int
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# 为一批用户设置角色
+class RoleUsersAssign(BaseModel):
+    user_ids: List[int] = Field(min_length=1, max_length=10000)
+
+class RoleUsersAssignResult(BaseModel):
+    matched: int  # 存在的用户数
+    updated: int  # 角色实际变化的用户数
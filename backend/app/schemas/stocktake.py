@@ -0,0 +1,35 @@
+from pydantic import BaseModel
+from typing import Optional
+
+# 一条盘点差异
+class StocktakeVariance(BaseModel):
+    product_id: int
+    product_code: str
+    warehouse_id: Optional[int] = None
+    inventory_id: Optional[int] = None  # 试算时新建的库存为空
+    system_quantity: int  # 账面数量
+    counted_quantity: int  # 盘点数量
+    variance: int  # 盘点数量 - 账面数量
+    variance_value: float  # 差异金额（按成本）
+
+# 跳过的盘点行（商品或仓库不存在）
+class StocktakeSkippedLine(BaseModel):
+    line: int
+    product_id: Optional[int] = None
+    product_code: Optional[str] = None
+    warehouse_id: Optional[int] = None
+    reason: str
+
+# 盘点差异报表
+class StocktakeReport(BaseModel):
+    applied: bool  # 是否已调整库存，试算时为假
+    lines: int  # 盘点表行数
+    counted: int  # 参与核对的行数
+    adjusted: int  # 有差异的行数
+    unchanged: int  # 无差异的行数
+    quantity_gain: int  # 盘盈数量
+    quantity_loss: int  # 盘亏数量
+    gain_value: float  # 盘盈金额
+    loss_value: float  # 盘亏金额
+    variances: list[StocktakeVariance]  # 按差异金额从大到小排列
+    skipped: list[StocktakeSkippedLine]
@@ -0,0 +1,238 @@
+# 大规模测试数据生成：按随机种子生成可复现的商品、仓库、库存、用户和角色数据，
+# 热门商品、类别、仓库和每个商品的库存仓库数服从Zipf分布；SQLite使用批量插入，PostgreSQL使用COPY
+import argparse
+import csv
+import io
+import itertools
+import random
+import time
+from typing import Iterable, Iterator
+from sqlalchemy import create_engine, func, select, text
+from sqlmodel import SQLModel
+from app.core.config import settings
+from app.core.security import get_password_hash
+from app.crud.product import low_stock_refresh_statements
+from app.models.permission import Permission
+from app.models.product import Product, Warehouse, Inventory
+from app.models.role import Role, RolePermission
+from app.models.schema_version import SchemaVersion  # noqa: F401  注册表结构，保证建表完整
+from app.models.user import User
+
+# 权限名称，每个角色按序取前若干项
+PERMISSION_NAMES = [
+    "product:read", "product:write", "product:delete",
+    "warehouse:read", "warehouse:write", "warehouse:delete",
+    "inventory:read", "inventory:write", "inventory:adjust",
+    "user:read", "user:write", "role:read", "role:write",
+]
+UNITS = ["个", "件", "箱", "包", "台", "千克"]
+
+def _sync_database_url(database_url) -> str:
+    """将异步驱动的连接地址转换为同步驱动"""
+    url = str(database_url)
+    return url.replace("+aiosqlite", "").replace("+asyncpg", "+psycopg2")
+
+def _zipf_cum_weights(n: int, exponent: float) -> list[float]:
+    """返回排名1..n服从Zipf分布的累计权重，排名越靠前概率越大"""
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+class ZipfSampler:
+    """按Zipf分布在1..n中抽样；排名经过一次固定的随机置换，热门项不会集中在最小的ID上"""
+
+    def __init__(self, rng: random.Random, n: int, exponent: float):
+        self.rng = rng
+        self.population = list(range(1, n + 1))
+        rng.shuffle(self.population)
+        self.cum_weights = _zipf_cum_weights(n, exponent)
+
+    def sample(self, k: int) -> list[int]:
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+def _chunks(rows: Iterable[tuple], size: int) -> Iterator[list[tuple]]:
+    """将行按批次切分"""
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+class Seeder:
+    """按表依次生成并写入数据"""
+
+    def __init__(self, engine, args: argparse.Namespace):
+        self.engine = engine
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.use_copy = engine.dialect.name == "postgresql"
+
+    def _insert(self, conn, table, columns: list[str], rows: Iterable[tuple]) -> int:
+        """批量写入一张表，返回写入行数"""
+        count = 0
+        for chunk in _chunks(rows, self.args.batch_size):
+            if self.use_copy:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(chunk)
+                buffer.seek(0)
+                cursor = conn.connection.dbapi_connection.cursor()
+                cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+                cursor.close()
+            else:
+                conn.execute(table.insert(), [dict(zip(columns, row)) for row in chunk])
+            count += len(chunk)
+        return count
+
+    def _product_rows(self) -> Iterator[tuple]:
+        args = self.args
+        categories = ZipfSampler(self.rng, args.categories, args.zipf)
+        for start in range(1, args.products + 1, args.batch_size):
+            end = min(start + args.batch_size, args.products + 1)
+            for product_id, category in zip(range(start, end), categories.sample(end - start)):
+                cost = round(self.rng.lognormvariate(3.0, 1.0), 2)
+                price = round(cost * self.rng.uniform(1.1, 2.5), 2)
+                yield (
+                    product_id,
+                    f"Product {product_id:08d}",
+                    f"SKU{product_id:08d}",
+                    f"category-{category:04d}",
+                    self.rng.choice(UNITS),
+                    price,
+                    cost,
+                    self.rng.choice((0, 10, 20, 50, 100)),
+                )
+
+    def _product_warehouses(self, warehouses: ZipfSampler, count: int) -> list[int]:
+        """按Zipf分布抽取count个不同的仓库（每个商品在每个仓库最多一条库存记录）"""
+        chosen: dict[int, None] = {}
+        while len(chosen) < count:
+            chosen.update(dict.fromkeys(warehouses.sample(count - len(chosen))))
+        return list(chosen)
+
+    def _inventory_rows(self) -> Iterator[tuple]:
+        # 每个商品的库存仓库数服从Zipf分布（多数商品只在一个仓库，少数分布在多个仓库），
+        # 仓库按Zipf分布集中在少数大仓，同一商品的仓库互不相同；热门商品库存量更高
+        args = self.args
+        warehouses = ZipfSampler(self.rng, args.warehouses, args.zipf)
+        hot_skus = ZipfSampler(self.rng, args.products, args.zipf)
+        max_count = min(args.max_warehouses_per_product, args.warehouses)
+        count_weights = _zipf_cum_weights(max_count, args.zipf)
+        # 按Zipf抽样次数衡量商品热度
+        popularity: dict[int, int] = {}
+        for product_id in hot_skus.sample(args.products):
+            popularity[product_id] = popularity.get(product_id, 0) + 1
+        inventory_ids = itertools.count(1)
+        for start in range(1, args.products + 1, args.batch_size):
+            end = min(start + args.batch_size, args.products + 1)
+            counts = self.rng.choices(range(1, max_count + 1), cum_weights=count_weights, k=end - start)
+            for product_id, count in zip(range(start, end), counts):
+                for warehouse_id in self._product_warehouses(warehouses, count):
+                    base = self.rng.randint(0, 50)
+                    quantity = base + popularity.get(product_id, 0) * self.rng.randint(20, 200)
+                    yield (next(inventory_ids), product_id, quantity, warehouse_id)
+
+    def _user_rows(self) -> Iterator[tuple]:
+        # 所有用户使用同一个密码哈希，避免bcrypt拖慢生成速度
+        password = get_password_hash(self.args.password)
+        roles = ZipfSampler(self.rng, self.args.roles, self.args.zipf)
+        for user_id, role_id in zip(range(1, self.args.users + 1), roles.sample(self.args.users)):
+            yield (
+                user_id,
+                f"user{user_id:07d}",
+                password,
+                f"user{user_id:07d}@example.com",
+                f"User {user_id}",
+                True,
+                user_id == 1,
+                role_id,
+            )
+
+    def _role_permission_rows(self) -> Iterator[tuple]:
+        for role_id in range(1, self.args.roles + 1):
+            count = self.rng.randint(1, len(PERMISSION_NAMES))
+            for permission_id in range(1, count + 1):
+                yield (role_id, permission_id)
+
+    def _plan(self) -> list[tuple]:
+        """按依赖顺序返回 (表, 列, 行生成器)"""
+        args = self.args
+        return [
+            (Permission.__table__, ["id", "name", "description"],
+             ((i, name, None) for i, name in enumerate(PERMISSION_NAMES, start=1))),
+            (Role.__table__, ["id", "name", "description"],
+             ((i, f"role-{i:03d}", None) for i in range(1, args.roles + 1))),
+            (RolePermission.__table__, ["role_id", "permission_id"], self._role_permission_rows()),
+            (Warehouse.__table__, ["id", "name", "location", "description"],
+             ((i, f"Warehouse {i:05d}", f"region-{i % 50:02d}", None) for i in range(1, args.warehouses + 1))),
+            (Product.__table__, ["id", "name", "code", "category", "unit", "price", "cost", "reorder_point"],
+             self._product_rows()),
+            (Inventory.__table__, ["id", "product_id", "quantity", "warehouse_id"], self._inventory_rows()),
+            (User.__table__,
+             ["id", "username", "password", "email", "full_name", "is_active", "is_superuser", "role_id"],
+             self._user_rows()),
+        ]
+
+    def _check_empty(self, conn):
+        """拒绝写入已有数据的表，避免主键冲突"""
+        for table in (Product.__table__, Warehouse.__table__, User.__table__, Role.__table__, Permission.__table__):
+            if conn.execute(select(func.count()).select_from(table)).scalar_one():
+                raise SystemExit(f"Table '{table.name}' is not empty, rerun with --reset to replace existing data")
+
+    def _reset_sequences(self, conn):
+        """显式写入主键后，将PostgreSQL自增序列推进到当前最大值"""
+        for table in (Permission.__table__, Role.__table__, Warehouse.__table__, Product.__table__,
+                      Inventory.__table__, User.__table__):
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+            ))
+
+    def run(self):
+        if self.args.reset:
+            SQLModel.metadata.drop_all(self.engine)
+        SQLModel.metadata.create_all(self.engine)
+
+        with self.engine.begin() as conn:
+            self._check_empty(conn)
+            if self.engine.dialect.name == "sqlite":
+                # 只影响本次连接，加快批量写入
+                conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            for table, columns, rows in self._plan():
+                started = time.perf_counter()
+                count = self._insert(conn, table, columns, rows)
+                elapsed = time.perf_counter() - started
+                print(f"{table.name:18s} {count:>12,d} rows  {elapsed:8.2f}s  "
+                      f"({count / elapsed if elapsed else 0:,.0f} rows/s)")
+            # 按集合生成低库存记录
+            started = time.perf_counter()
+            for statement in low_stock_refresh_statements():
+                count = conn.execute(statement).rowcount
+            print(f"{'low_stock_items':18s} {count:>12,d} rows  {time.perf_counter() - started:8.2f}s")
+            if self.use_copy:
+                self._reset_sequences(conn)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="生成大规模测试数据")
+    parser.add_argument("--database-url", default=None, help="目标数据库（默认使用DATABASE_URL）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，相同种子生成相同数据")
+    parser.add_argument("--products", type=int, default=1_000_000, help="商品数量")
+    parser.add_argument("--warehouses", type=int, default=1_000, help="仓库数量")
+    parser.add_argument("--max-warehouses-per-product", type=int, default=8,
+                        help="每个商品最多在几个仓库有库存，实际仓库数在1到该值之间服从Zipf分布")
+    parser.add_argument("--categories", type=int, default=500, help="商品类别数量")
+    parser.add_argument("--users", type=int, default=1_000, help="用户数量")
+    parser.add_argument("--roles", type=int, default=10, help="角色数量")
+    parser.add_argument("--zipf", type=float, default=1.1, help="热门商品、类别、仓库和每个商品仓库数的Zipf分布指数")
+    parser.add_argument("--password", default="password", help="所有生成用户的密码")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="每批写入的行数")
+    parser.add_argument("--reset", action="store_true", help="写入前删除并重建所有表")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    engine = create_engine(_sync_database_url(args.database_url or settings.database_url))
+    started = time.perf_counter()
+    try:
+        Seeder(engine, args).run()
+    finally:
+        engine.dispose()
+    print(f"Seeding completed in {time.perf_counter() - started:.2f}s (seed={args.seed})")
+
+if __name__ == "__main__":
+    main()
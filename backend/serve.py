@@ -0,0 +1,66 @@
+# 生产环境启动入口：多工作进程、事件循环/HTTP解析器选择、连接参数调优和优雅退出
+import argparse
+import importlib.util
+import os
+import uvicorn
+
+def _pick_implementation(requested: str, module: str, fallback: str) -> str:
+    """选择事件循环或HTTP解析器实现，指定的实现未安装时回退到纯Python实现"""
+    if requested == "auto":
+        return requested
+    if requested == module and importlib.util.find_spec(module) is None:
+        print(f"{module} is not installed, falling back to {fallback}")
+        return fallback
+    return requested
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="IMS生产环境启动脚本")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        help="工作进程数（默认取WEB_CONCURRENCY或CPU核数）",
+    )
+    parser.add_argument("--loop", choices=["auto", "uvloop", "asyncio"], default="auto", help="事件循环实现")
+    parser.add_argument("--http", choices=["auto", "httptools", "h11"], default="auto", help="HTTP解析器实现")
+    parser.add_argument("--keep-alive", type=int, default=5, help="Keep-Alive连接空闲超时（秒）")
+    parser.add_argument("--backlog", type=int, default=2048, help="等待accept的最大连接数")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="收到SIGTERM后等待进行中请求完成的时间（秒）")
+    parser.add_argument("--log-level", default="info", help="uvicorn日志级别")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    workers = max(1, args.workers)
+
+    # 工作进程在导入应用时读取该变量，按进程数平分数据库和Redis连接预算
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    loop = _pick_implementation(args.loop, "uvloop", "asyncio")
+    http = _pick_implementation(args.http, "httptools", "h11")
+
+    db_budget = os.environ.get("DB_CONNECTION_BUDGET")
+    if db_budget:
+        print(f"Database connection budget {db_budget} shared by {workers} workers "
+              f"({max(1, int(db_budget) // workers)} per worker)")
+
+    # uvicorn收到SIGTERM后停止接受新连接，等待进行中的请求完成（最长graceful_timeout秒），
+    # 然后执行应用的shutdown事件（提交待处理批次、释放连接池）
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+        proxy_headers=True,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+批量删除接口测试：商品、仓库和库存的批量删除，以及一并删除或解除关联的库存的变更事件
+"""
+import itertools
+import pytest
+from app.core.config import settings
+from app.core.events import event_hub
+
+API = "/api/v1/products"
+_sequence = itertools.count(1)
+
+def _create_product(client, category: str = "bulk-delete") -> int:
+    n = next(_sequence)
+    response = client.post(f"{API}/", json={"name": f"bulk-delete-{n}", "code": f"BLK{n:04d}", "category": category})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+def _create_warehouse(client) -> int:
+    n = next(_sequence)
+    response = client.post(f"{API}/warehouses", json={"name": f"bulk-delete-warehouse-{n}"})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+def _create_inventory(client, product_id: int, warehouse_id: int | None = None, quantity: int = 5) -> int:
+    response = client.post(f"{API}/inventories", json={"product_id": product_id, "warehouse_id": warehouse_id, "quantity": quantity})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+@pytest.fixture
+def events():
+    """收集测试期间发布的库存变更事件"""
+    subscriber = event_hub.subscribe()
+    collected = []
+
+    def drain() -> list[dict]:
+        while not subscriber.queue.empty():
+            collected.append(subscriber.queue.get_nowait())
+        return collected
+
+    yield drain
+    event_hub.unsubscribe(subscriber)
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    """每批只删除两条记录，覆盖批与批之间提交的路径"""
+    monkeypatch.setattr(settings, "bulk_delete_batch_size", 2)
+
+def test_product_bulk_delete_blocked_by_inventory(client):
+    product_ids = [_create_product(client, "bulk-block") for _ in range(2)]
+    _create_inventory(client, product_ids[1])
+
+    response = client.post(f"{API}/bulk-delete", json={"filter": {"category": "bulk-block"}})
+    assert response.status_code == 400
+    # 整批不删除
+    for product_id in product_ids:
+        assert client.get(f"{API}/{product_id}").status_code == 200
+
+def test_product_bulk_delete_cascade(client, events, small_batches):
+    product_ids = [_create_product(client, "bulk-cascade") for _ in range(5)]
+    inventory_ids = [_create_inventory(client, product_id) for product_id in product_ids[:3]]
+    events()
+
+    response = client.post(f"{API}/bulk-delete", json={"filter": {"category": "bulk-cascade"}, "on_inventory": "cascade"})
+    assert response.status_code == 200, response.text
+    assert response.json()["matched"] == 5
+    assert response.json()["deleted"] == 5
+    assert response.json()["inventories_deleted"] == 3
+    for product_id in product_ids:
+        assert client.get(f"{API}/{product_id}").status_code == 404
+
+    # 每条一并删除的库存都有删除事件，包括中途提交的批
+    deleted = {event["inventory_id"] for event in events() if event["op"] == "delete"}
+    assert deleted == set(inventory_ids)
+
+def test_product_bulk_delete_by_ids(client):
+    product_ids = [_create_product(client) for _ in range(2)]
+
+    response = client.post(f"{API}/bulk-delete", json={"filter": {"ids": [*product_ids, 999999]}})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"matched": 2, "deleted": 2, "inventories_deleted": 0, "inventories_detached": 0}
+
+def test_product_bulk_delete_requires_filter(client):
+    response = client.post(f"{API}/bulk-delete", json={"filter": {}})
+    assert response.status_code == 400
+    response = client.post(f"{API}/bulk-delete", json={"filter": {"ids": []}})
+    assert response.status_code == 422
+
+def test_warehouse_bulk_delete_nullify(client, events, small_batches):
+    warehouse_ids = [_create_warehouse(client) for _ in range(3)]
+    inventory_ids = [_create_inventory(client, _create_product(client), warehouse_id) for warehouse_id in warehouse_ids]
+    events()
+
+    response = client.post(f"{API}/warehouses/bulk-delete", json={"ids": warehouse_ids})
+    assert response.status_code == 200, response.text
+    assert response.json()["deleted"] == 3
+    assert response.json()["inventories_detached"] == 3
+    for inventory_id in inventory_ids:
+        assert client.get(f"{API}/inventories/{inventory_id}").json()["warehouse_id"] is None
+
+    detached = [event for event in events() if event["op"] == "update"]
+    assert {event["inventory_id"] for event in detached} == set(inventory_ids)
+    assert all(event["warehouse_id"] is None and event["quantity"] == 5 for event in detached)
+
+def test_warehouse_bulk_delete_cascade(client, events):
+    warehouse_id = _create_warehouse(client)
+    inventory_id = _create_inventory(client, _create_product(client), warehouse_id)
+    events()
+
+    response = client.post(f"{API}/warehouses/bulk-delete", json={"ids": [warehouse_id], "on_inventory": "cascade"})
+    assert response.status_code == 200, response.text
+    assert response.json()["inventories_deleted"] == 1
+    assert client.get(f"{API}/inventories/{inventory_id}").status_code == 404
+    assert [event["inventory_id"] for event in events() if event["op"] == "delete"] == [inventory_id]
+
+def test_warehouse_bulk_delete_block(client):
+    warehouse_id = _create_warehouse(client)
+    _create_inventory(client, _create_product(client), warehouse_id)
+
+    response = client.post(f"{API}/warehouses/bulk-delete", json={"ids": [warehouse_id], "on_inventory": "block"})
+    assert response.status_code == 400
+    assert client.get(f"{API}/warehouses/{warehouse_id}").status_code == 200
+
+def test_inventory_bulk_delete(client, small_batches):
+    inventory_ids = [_create_inventory(client, _create_product(client)) for _ in range(3)]
+
+    response = client.post(f"{API}/inventories/bulk-delete", json={"ids": [*inventory_ids, 999999]})
+    assert response.status_code == 200, response.text
+    assert response.json()["deleted"] == 3
+    for inventory_id in inventory_ids:
+        assert client.get(f"{API}/inventories/{inventory_id}").status_code == 404
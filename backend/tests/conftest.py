@@ -1,30 +1,61 @@
+import os
+
+# 测试环境默认配置，必须在导入应用之前设置
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+# 预留和库存事件使用进程内实现，接口测试不依赖Redis
+os.environ.setdefault("RESERVATION_BACKEND", "local")
+os.environ.setdefault("INVENTORY_EVENTS_BACKEND", "local")
+
+import asyncio
 import pytest
-from sqlmodel import SQLModel, Session, create_engine
-from app.core.database import get_db
-from app.main import app
+from sqlmodel import SQLModel
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
+from app.core.cache import publish_pending_invalidations
+from app.core.database import get_async_db, get_async_read_db, _create_session_factory
+from app.core.events import publish_pending_events
+from app.main import app
+
+# 创建测试数据库引擎（不复用连接，避免跨事件循环共享aiosqlite连接）
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingSessionLocal = _create_session_factory(engine)
 
-# 创建测试数据库引擎
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+async def _create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def _drop_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
 
 # 创建测试客户端
 @pytest.fixture(scope="module")
 def client():
     # 创建所有表
-    SQLModel.metadata.create_all(bind=engine)
-    
-    # 重写依赖，使用测试数据库
-    def override_get_db():
-        with Session(engine) as session:
-            yield session
-    
-    app.dependency_overrides[get_db] = override_get_db
-    
+    asyncio.run(_create_tables())
+
+    # 重写依赖，使用测试数据库（与get_async_db一样，请求结束时统一提交，提交后发布事件和缓存失效）；
+    # 作用域由路由声明的 Depends(get_async_db, scope="function") 决定，重写后同样在响应发送前提交
+    async def override_get_db():
+        async with TestingSessionLocal() as session:
+            try:
+                yield session
+                await session.commit()
+                await publish_pending_events(session)
+                await publish_pending_invalidations(session)
+            except Exception:
+                await session.rollback()
+                raise
+
+    app.dependency_overrides[get_async_db] = override_get_db
+    app.dependency_overrides[get_async_read_db] = override_get_db
+
     yield TestClient(app)
-    
+
     # 清理测试数据库
-    SQLModel.metadata.drop_all(bind=engine)
\ No newline at end of file
+    app.dependency_overrides.clear()
+    asyncio.run(_drop_tables())
@@ -0,0 +1,98 @@
+"""
+库存接口测试：商品在多个仓库有库存（调拨后）时的入库、出库、可承诺量和唯一性约束
+"""
+import itertools
+
+API = "/api/v1/products"
+_sequence = itertools.count(1)
+
+def _create_product(client) -> int:
+    n = next(_sequence)
+    response = client.post(f"{API}/", json={"name": f"inventory-test-{n}", "code": f"INV{n:04d}", "price": 10, "cost": 5})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+def _create_warehouse(client) -> int:
+    n = next(_sequence)
+    response = client.post(f"{API}/warehouses", json={"name": f"inventory-test-warehouse-{n}"})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+def _split_stock(client, quantity: int = 10, transferred: int = 4) -> tuple[int, int]:
+    """入库到未分配仓库，再调拨一部分到新仓库，返回 (商品ID, 仓库ID)"""
+    product_id = _create_product(client)
+    warehouse_id = _create_warehouse(client)
+    response = client.put(f"{API}/inventories/{product_id}/inbound", params={"quantity": quantity})
+    assert response.status_code == 200, response.text
+    response = client.post(f"{API}/inventories/transfer", json={
+        "product_id": product_id, "from_warehouse_id": None, "to_warehouse_id": warehouse_id, "quantity": transferred,
+    })
+    assert response.status_code == 200, response.text
+    return product_id, warehouse_id
+
+def test_inbound_after_transfer(client):
+    product_id, warehouse_id = _split_stock(client)
+
+    # 商品在两个位置有库存，未指定仓库时无法确定入库到哪一条
+    response = client.put(f"{API}/inventories/{product_id}/inbound", params={"quantity": 5})
+    assert response.status_code == 400
+    assert "warehouse_id" in response.json()["detail"]
+
+    response = client.put(f"{API}/inventories/{product_id}/inbound", params={"quantity": 5, "warehouse_id": warehouse_id})
+    assert response.status_code == 200, response.text
+    assert response.json()["warehouse_id"] == warehouse_id
+    assert response.json()["quantity"] == 9
+
+def test_outbound_after_transfer(client):
+    product_id, warehouse_id = _split_stock(client)
+
+    response = client.put(f"{API}/inventories/{product_id}/outbound", params={"quantity": 1})
+    assert response.status_code == 400
+
+    response = client.put(f"{API}/inventories/{product_id}/outbound", params={"quantity": 3, "warehouse_id": warehouse_id})
+    assert response.status_code == 200, response.text
+    assert response.json()["quantity"] == 1
+
+    # 只检查该仓库的库存，其他仓库的库存不计入
+    response = client.put(f"{API}/inventories/{product_id}/outbound", params={"quantity": 2, "warehouse_id": warehouse_id})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Insufficient inventory"
+
+def test_availability_after_transfer(client):
+    product_id, _ = _split_stock(client, quantity=10, transferred=4)
+
+    response = client.get(f"/api/v1/reservations/availability/{product_id}")
+    assert response.status_code == 200, response.text
+    assert response.json()["on_hand"] == 10
+    assert response.json()["available"] == 10
+
+def test_inbound_to_new_warehouse(client):
+    product_id, _ = _split_stock(client)
+    other_warehouse_id = _create_warehouse(client)
+
+    response = client.put(f"{API}/inventories/{product_id}/inbound", params={"quantity": 2, "warehouse_id": other_warehouse_id})
+    assert response.status_code == 200, response.text
+    assert response.json()["warehouse_id"] == other_warehouse_id
+    assert response.json()["quantity"] == 2
+
+    response = client.put(f"{API}/inventories/{product_id}/inbound", params={"quantity": 2, "warehouse_id": 999999})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Warehouse not found"
+
+def test_duplicate_inventory_rejected(client):
+    product_id, warehouse_id = _split_stock(client)
+
+    response = client.post(f"{API}/inventories", json={"product_id": product_id, "warehouse_id": warehouse_id, "quantity": 1})
+    assert response.status_code == 400
+
+    # 未分配仓库的库存也只能有一条
+    response = client.post(f"{API}/inventories", json={"product_id": product_id, "quantity": 1})
+    assert response.status_code == 400
+
+def test_nullify_warehouse_conflict(client):
+    product_id, warehouse_id = _split_stock(client)
+
+    # 解除关联后商品会有两条未分配仓库的库存
+    response = client.delete(f"{API}/warehouses/{warehouse_id}", params={"on_inventory": "nullify"})
+    assert response.status_code == 400
+    assert client.get(f"{API}/warehouses/{warehouse_id}").status_code == 200
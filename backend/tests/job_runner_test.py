@@ -0,0 +1,165 @@
+"""
+后台任务测试：进程内队列和执行器的领取、并发上限、取消和心跳超时
+"""
+import asyncio
+import time
+import pytest
+from app.core.config import settings
+from app.jobs import queue as job_queue_module, registry, runner as runner_module
+from app.jobs.queue import LocalJobQueue, QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED
+from app.jobs.registry import JobContext, job
+from app.jobs.runner import JobRunner
+
+@pytest.fixture
+def queue(monkeypatch):
+    """每个测试使用新的进程内队列和空的任务类型注册表，心跳和轮询间隔缩短"""
+    local_queue = LocalJobQueue()
+    for module in (job_queue_module, registry, runner_module):
+        monkeypatch.setattr(module, "job_queue", local_queue)
+    monkeypatch.setattr(registry, "_job_types", {})
+    monkeypatch.setattr(settings, "job_poll_interval", 0.01)
+    monkeypatch.setattr(settings, "job_heartbeat_interval", 0.01)
+    monkeypatch.setattr(settings, "job_heartbeat_timeout", 60.0)
+    return local_queue
+
+async def _wait_for(queue: LocalJobQueue, job_id: str, *statuses: str, timeout: float = 2.0):
+    """轮询直到任务进入指定状态"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job_state = await queue.get(job_id)
+        if job_state.status in statuses:
+            return job_state
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} is still {job_state.status}")
+
+def _run(test, slots: int = 4):
+    """启动执行器运行测试协程，结束后停止执行器"""
+    async def main():
+        job_runner = JobRunner(slots)
+        job_runner.start()
+        try:
+            return await test()
+        finally:
+            await job_runner.stop(timeout=1)
+    return asyncio.run(main())
+
+def test_submit_and_succeed(queue):
+    @job("test_add")
+    async def add(context: JobContext) -> int:
+        await context.progress(1, 1)
+        return context.params["a"] + context.params["b"]
+
+    async def test():
+        submitted = await queue.submit("test_add", {"a": 1, "b": 2})
+        assert submitted.status == QUEUED
+        finished = await _wait_for(queue, submitted.id, SUCCEEDED, FAILED)
+        assert finished.status == SUCCEEDED
+        assert finished.result == 3
+        assert finished.progress == {"done": 1, "total": 1, "message": None}
+        assert finished.started_at is not None and finished.finished_at is not None
+    _run(test)
+
+def test_concurrency_limit(queue):
+    release = asyncio.Event()
+    running = 0
+    peak = 0
+
+    @job("test_limited", concurrency=2)
+    async def limited(context: JobContext):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await release.wait()
+        running -= 1
+
+    async def test():
+        jobs = [await queue.submit("test_limited", {}) for _ in range(5)]
+        await _wait_for(queue, jobs[1].id, RUNNING)
+        await asyncio.sleep(0.05)
+        # 执行器有空闲槽位，但该类型同时只运行两个任务
+        assert [(await queue.get(j.id)).status for j in jobs].count(RUNNING) == 2
+        release.set()
+        for j in jobs:
+            assert (await _wait_for(queue, j.id, SUCCEEDED, FAILED)).status == SUCCEEDED
+        assert peak == 2
+    _run(test)
+
+def test_cancel_queued(queue):
+    @job("test_queued")
+    async def never_claimed(context: JobContext):
+        raise AssertionError("cancelled job must not run")
+
+    async def test():
+        submitted = await queue.submit("test_queued", {})
+        cancelled = await queue.request_cancel(submitted.id)
+        assert cancelled.status == CANCELLED
+        # 已取消的任务不会被领取
+        assert await queue.claim({"test_queued": 1}) is None
+        with pytest.raises(ValueError, match="Job already finished"):
+            await queue.request_cancel(submitted.id)
+    asyncio.run(test())
+
+def test_cancel_running(queue):
+    started = asyncio.Event()
+
+    @job("test_long")
+    async def long_running(context: JobContext):
+        started.set()
+        await asyncio.sleep(60)
+
+    async def test():
+        submitted = await queue.submit("test_long", {})
+        await started.wait()
+        assert (await queue.request_cancel(submitted.id)).cancel_requested
+        finished = await _wait_for(queue, submitted.id, CANCELLED, FAILED, SUCCEEDED)
+        assert finished.status == CANCELLED
+    _run(test)
+
+def test_heartbeat_timeout_reaped(queue):
+    started = asyncio.Event()
+    aborted = asyncio.Event()
+
+    @job("test_stuck")
+    async def stuck(context: JobContext):
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            aborted.set()
+            raise
+
+    async def test():
+        submitted = await queue.submit("test_stuck", {})
+        await started.wait()
+        # 心跳在超时之前：不清理
+        assert await queue.reap(timeout=60) == 0
+        # 模拟工作进程失联：心跳停在很久以前
+        queue._heartbeats[submitted.id] = time.time() - 3600
+        assert await queue.reap(timeout=60) == 1
+        reaped = await queue.get(submitted.id)
+        assert reaped.status == FAILED
+        assert reaped.error == "Worker lost"
+
+        # 执行器通过心跳得知任务已不在运行中，中断任务，且不覆盖失败状态
+        await asyncio.wait_for(aborted.wait(), timeout=2)
+        await asyncio.sleep(0.05)
+        assert (await queue.get(submitted.id)).status == FAILED
+        assert await queue.finish(submitted.id, SUCCEEDED, result="late") is False
+        assert (await queue.get(submitted.id)).result is None
+    _run(test)
+
+def test_late_finish_does_not_overwrite(queue):
+    @job("test_late")
+    async def late(context: JobContext):
+        return "done"
+
+    async def test():
+        submitted = await queue.submit("test_late", {})
+        claimed = await queue.claim({"test_late": 1})
+        assert claimed.id == submitted.id
+        queue._heartbeats[submitted.id] = time.time() - 3600
+        assert await queue.reap(timeout=60) == 1
+        assert await queue.heartbeat(submitted.id) == FAILED
+        assert await queue.finish(submitted.id, SUCCEEDED, result="done") is False
+        assert (await queue.get(submitted.id)).status == FAILED
+    asyncio.run(test())
@@ -1,94 +1,315 @@
+"""
+场景化负载测试
+按权重混合执行各路由的典型请求（商品查询与分页浏览、库存列表、热点商品入库/出库、登录等），
+使用固定并发数、预热阶段、HDR风格的延迟直方图和错误分类统计，输出JSON报告并可与基线报告对比。
+
+运行方式（在backend目录下，服务需已启动）：
+    python -m tests.performance_test --concurrency 50 --requests 5000 --report report.json
+    python -m tests.performance_test --baseline baseline.json --max-regression 10
+"""
+import argparse
 import asyncio
-import httpx
+import json
+import math
+import random
+import sys
 import time
-from typing import List, Dict, Any
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+import httpx
 
 # 测试配置
 BASE_URL = "http://localhost:8000/api/v1"
-NUM_REQUESTS = 100  # 总请求数
-CONCURRENCY = 10  # 并发请求数
-
-# 测试函数
-async def test_api_endpoint(client: httpx.AsyncClient, endpoint: str, method: str = "GET", data: Dict[str, Any] = None) -> float:
-    """测试单个API端点的响应时间"""
-    start_time = time.time()
-    try:
-        if method == "GET":
-            response = await client.get(endpoint)
-        elif method == "POST":
-            response = await client.post(endpoint, json=data)
-        elif method == "PUT":
-            response = await client.put(endpoint, json=data)
-        elif method == "DELETE":
-            response = await client.delete(endpoint)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        # 确保请求成功
-        response.raise_for_status()
-        
-        end_time = time.time()
-        return end_time - start_time
-    except Exception as e:
-        print(f"Error testing {endpoint}: {e}")
-        return float("inf")
-
-async def run_concurrent_tests(endpoint: str, method: str = "GET", data: Dict[str, Any] = None) -> List[float]:
-    """运行并发测试"""
-    async with httpx.AsyncClient(base_url=BASE_URL, timeout=30.0) as client:
-        # 创建测试任务
-        tasks = [
-            test_api_endpoint(client, endpoint, method, data)
-            for _ in range(NUM_REQUESTS)
+NUM_REQUESTS = 2000  # 计入统计的请求总数
+CONCURRENCY = 20  # 并发请求数
+WARMUP_REQUESTS = 200  # 预热请求数，不计入统计
+HOT_SKUS = 5  # 入库/出库集中访问的热点商品数
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+class LatencyHistogram:
+    """HDR风格的延迟直方图：按3位有效数字分桶记录微秒级延迟，内存占用与样本数无关"""
+
+    def __init__(self, significant_digits: int = 3):
+        self.significant_digits = significant_digits
+        self.counts: Counter = Counter()
+        self.total = 0
+        self.sum_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us = 0
+
+    def _bucket(self, value_us: int) -> int:
+        if value_us <= 0:
+            return 0
+        magnitude = 10 ** max(0, int(math.log10(value_us)) + 1 - self.significant_digits)
+        return value_us // magnitude * magnitude
+
+    def record(self, seconds: float):
+        value_us = int(seconds * 1_000_000)
+        self.counts[self._bucket(value_us)] += 1
+        self.total += 1
+        self.sum_us += value_us
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other: "LatencyHistogram"):
+        """合并另一个直方图的样本"""
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def percentile(self, percent: float) -> int:
+        """返回第percent百分位的延迟（微秒）"""
+        if not self.total:
+            return 0
+        threshold = math.ceil(self.total * percent / 100)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= threshold:
+                return bucket
+        return self.max_us
+
+    def summary(self) -> Dict[str, float]:
+        """以毫秒为单位的统计摘要"""
+        if not self.total:
+            return {}
+        result = {
+            "min": self.min_us / 1000,
+            "mean": self.sum_us / self.total / 1000,
+            "max": self.max_us / 1000,
+        }
+        for percent in PERCENTILES:
+            result[f"p{percent:g}"] = self.percentile(percent) / 1000
+        return result
+
+@dataclass
+class ScenarioStats:
+    """单个场景的统计信息"""
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    requests: int = 0
+    errors: Counter = field(default_factory=Counter)
+
+    def to_dict(self, elapsed: float) -> Dict[str, Any]:
+        error_count = sum(self.errors.values())
+        return {
+            "requests": self.requests,
+            "errors": error_count,
+            "error_rate": error_count / self.requests if self.requests else 0.0,
+            "error_breakdown": dict(self.errors),
+            "throughput": self.requests / elapsed if elapsed else 0.0,
+            "latency_ms": self.histogram.summary(),
+        }
+
+@dataclass
+class Scenario:
+    """负载场景：名称、权重和发送请求的函数"""
+    name: str
+    weight: int
+    send: Callable[[httpx.AsyncClient, random.Random], Any]
+
+class LoadContext:
+    """测试数据上下文：商品ID、热点商品、登录凭据"""
+
+    def __init__(self, product_ids: List[int], hot_skus: int, username: Optional[str], password: Optional[str]):
+        self.product_ids = product_ids
+        self.hot_product_ids = product_ids[:hot_skus]
+        self.username = username
+        self.password = password
+
+    def scenarios(self) -> List[Scenario]:
+        """按权重定义的场景列表"""
+        scenarios = [
+            Scenario("product_get", 25, lambda c, r: c.get(f"/products/{r.choice(self.product_ids)}")),
+            Scenario("product_page", 15, lambda c, r: c.get("/products/", params={"skip": r.randint(0, 20) * 50, "limit": 50})),
+            Scenario("warehouse_list", 5, lambda c, r: c.get("/products/warehouses", params={"limit": 100})),
+            Scenario("inventory_list", 15, lambda c, r: c.get("/products/inventories", params={"skip": r.randint(0, 20) * 50, "limit": 50})),
+            Scenario("inventory_inbound", 10, lambda c, r: c.put(f"/products/inventories/{r.choice(self.hot_product_ids)}/inbound", params={"quantity": 1})),
+            Scenario("inventory_outbound", 10, lambda c, r: c.put(f"/products/inventories/{r.choice(self.hot_product_ids)}/outbound", params={"quantity": 1})),
+            Scenario("user_list", 5, lambda c, r: c.get("/users/", params={"limit": 50})),
+            Scenario("role_list", 5, lambda c, r: c.get("/roles/", params={"limit": 50})),
+            Scenario("permission_list", 5, lambda c, r: c.get("/permissions/", params={"limit": 100})),
         ]
-        
-        # 并发执行任务
-        results = await asyncio.gather(*tasks)
-        return results
-
-async def main():
-    """主测试函数"""
-    print(f"开始性能测试，共发送 {NUM_REQUESTS} 个请求，并发数 {CONCURRENCY}")
-    print("=" * 60)
-    
-    # 测试端点列表
-    test_endpoints = [
-        ("/users", "GET"),
-    ]
-    
-    for endpoint, method in test_endpoints:
-        print(f"测试 {method} {endpoint}...")
-        
-        # 运行测试
-        results = await run_concurrent_tests(endpoint, method)
-        
-        # 计算统计信息
-        valid_results = [r for r in results if r != float("inf")]
-        if not valid_results:
-            print("  所有请求都失败了")
+        if self.username and self.password:
+            scenarios.append(Scenario("login", 5, lambda c, r: c.post(
+                "/auth/login", data={"username": self.username, "password": self.password}
+            )))
+        return [s for s in scenarios if s.weight > 0]
+
+async def prepare_context(client: httpx.AsyncClient, args) -> LoadContext:
+    """读取已有商品；商品不足时创建测试商品，并为热点商品准备充足库存"""
+    response = await client.get("/products/", params={"limit": 1000})
+    response.raise_for_status()
+    product_ids = [item["id"] for item in response.json()]
+
+    for i in range(len(product_ids), args.min_products):
+        response = await client.post("/products/", json={"name": f"loadtest-{i}", "code": f"LOADTEST-{i:05d}"})
+        response.raise_for_status()
+        product_ids.append(response.json()["id"])
+
+    if not product_ids:
+        raise RuntimeError("No products available for load testing")
+
+    # 热点商品先入库足量库存，保证出库场景不会因库存不足失败
+    for product_id in product_ids[:args.hot_skus]:
+        response = await client.put(f"/products/inventories/{product_id}/inbound", params={"quantity": 1_000_000})
+        response.raise_for_status()
+
+    return LoadContext(product_ids, args.hot_skus, args.username, args.password)
+
+async def run_load(client: httpx.AsyncClient, scenarios: List[Scenario], total: int, concurrency: int,
+                   seed: int, stats: Optional[Dict[str, ScenarioStats]] = None) -> float:
+    """以固定并发数执行total个请求，返回实际耗时（秒）；stats为None时不记录（预热）"""
+    remaining = total
+    weights = [s.weight for s in scenarios]
+
+    async def worker(worker_id: int):
+        nonlocal remaining
+        rng = random.Random(seed * 10007 + worker_id)
+        while remaining > 0:
+            remaining -= 1
+            scenario = rng.choices(scenarios, weights)[0]
+            start_time = time.perf_counter()
+            error = None
+            try:
+                response = await scenario.send(client, rng)
+                if response.status_code >= 400:
+                    error = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - start_time
+
+            if stats is not None:
+                scenario_stats = stats.setdefault(scenario.name, ScenarioStats())
+                scenario_stats.requests += 1
+                if error:
+                    scenario_stats.errors[error] += 1
+                else:
+                    scenario_stats.histogram.record(elapsed)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return time.perf_counter() - start_time
+
+def build_report(args, stats: Dict[str, ScenarioStats], elapsed: float) -> Dict[str, Any]:
+    """生成JSON报告"""
+    overall = ScenarioStats()
+    for scenario_stats in stats.values():
+        overall.requests += scenario_stats.requests
+        overall.errors.update(scenario_stats.errors)
+        overall.histogram.merge(scenario_stats.histogram)
+
+    return {
+        "meta": {
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup_requests": args.warmup,
+            "seed": args.seed,
+            "elapsed": elapsed,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "overall": overall.to_dict(elapsed),
+        "scenarios": {name: s.to_dict(elapsed) for name, s in sorted(stats.items())},
+    }
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """与基线报告对比，返回回归项描述列表"""
+    regressions = []
+    tolerance = max_regression / 100
+    sections = {"overall": (report["overall"], baseline.get("overall"))}
+    for name, current in report["scenarios"].items():
+        sections[name] = (current, baseline.get("scenarios", {}).get(name))
+
+    for name, (current, base) in sections.items():
+        if not base:
             continue
-        
-        min_time = min(valid_results)
-        max_time = max(valid_results)
-        avg_time = sum(valid_results) / len(valid_results)
-        p95_time = sorted(valid_results)[int(len(valid_results) * 0.95)]
-        p99_time = sorted(valid_results)[int(len(valid_results) * 0.99)]
-        success_rate = len(valid_results) / len(results) * 100
-        
-        # 打印结果
-        print(f"  请求总数: {NUM_REQUESTS}")
-        print(f"  成功请求: {len(valid_results)}")
-        print(f"  成功率: {success_rate:.2f}%")
-        print(f"  最小响应时间: {min_time:.4f}s")
-        print(f"  最大响应时间: {max_time:.4f}s")
-        print(f"  平均响应时间: {avg_time:.4f}s")
-        print(f"  95% 响应时间: {p95_time:.4f}s")
-        print(f"  99% 响应时间: {p99_time:.4f}s")
-        print(f"  吞吐量: {NUM_REQUESTS / sum(valid_results):.2f} 请求/秒")
-        print()
-    
-    print("性能测试完成")
+        for percentile in ("p95", "p99"):
+            now_value = current["latency_ms"].get(percentile)
+            base_value = base["latency_ms"].get(percentile)
+            if now_value and base_value and now_value > base_value * (1 + tolerance):
+                regressions.append(f"{name}: {percentile} {base_value:.2f}ms -> {now_value:.2f}ms")
+        if base["throughput"] and current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput']:.1f}/s -> {current['throughput']:.1f}/s")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {base['error_rate']:.2%} -> {current['error_rate']:.2%}")
+    return regressions
+
+def print_report(report: Dict[str, Any]):
+    """打印报告摘要"""
+    def line(name: str, data: Dict[str, Any]):
+        latency = data["latency_ms"]
+        print(
+            f"  {name:20s} 请求 {data['requests']:6d}  错误 {data['errors']:5d}  "
+            f"吞吐量 {data['throughput']:8.1f}/s  "
+            f"p50 {latency.get('p50', 0):7.2f}ms  p95 {latency.get('p95', 0):7.2f}ms  "
+            f"p99 {latency.get('p99', 0):7.2f}ms  max {latency.get('max', 0):7.2f}ms"
+        )
+        if data["error_breakdown"]:
+            print(f"  {'':20s} 错误分类: {data['error_breakdown']}")
+
+    for name, data in report["scenarios"].items():
+        line(name, data)
+    print("-" * 60)
+    line("overall", report["overall"])
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="IMS场景化负载测试")
+    parser.add_argument("--base-url", default=BASE_URL, help="API基础地址")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="并发请求数")
+    parser.add_argument("--requests", type=int, default=NUM_REQUESTS, help="计入统计的请求总数")
+    parser.add_argument("--warmup", type=int, default=WARMUP_REQUESTS, help="预热请求数")
+    parser.add_argument("--hot-skus", type=int, default=HOT_SKUS, help="入库/出库集中访问的热点商品数")
+    parser.add_argument("--min-products", type=int, default=50, help="商品不足时自动创建的测试商品数")
+    parser.add_argument("--username", help="登录场景使用的用户名（不提供则跳过登录场景）")
+    parser.add_argument("--password", help="登录场景使用的密码")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--report", help="JSON报告输出路径")
+    parser.add_argument("--baseline", help="用于对比的基线JSON报告")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="允许的性能回退百分比")
+    return parser.parse_args()
+
+async def main() -> int:
+    """主测试函数，发现性能回归时返回非0"""
+    args = parse_args()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0, limits=limits) as client:
+        context = await prepare_context(client, args)
+        scenarios = context.scenarios()
+
+        print(f"开始负载测试：并发数 {args.concurrency}，预热 {args.warmup} 个请求，统计 {args.requests} 个请求")
+        print("=" * 60)
+        if args.warmup:
+            await run_load(client, scenarios, args.warmup, args.concurrency, args.seed + 1)
+
+        stats: Dict[str, ScenarioStats] = {}
+        elapsed = await run_load(client, scenarios, args.requests, args.concurrency, args.seed, stats)
+
+    report = build_report(args, stats, elapsed)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已写入 {args.report}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.max_regression)
+        if regressions:
+            print("发现性能回归：")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("与基线相比未发现性能回归")
+
     print("=" * 60)
+    return 0
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(asyncio.run(main()))
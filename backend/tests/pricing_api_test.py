@@ -0,0 +1,84 @@
+"""
+批量调价接口测试：按筛选条件调价和按价目表设置价格
+"""
+import itertools
+
+API = "/api/v1/products"
+_sequence = itertools.count(1)
+
+def _create_products(client, count: int, category: str, price: float = 10.0, cost: float = 5.0) -> list[dict]:
+    products = []
+    for _ in range(count):
+        n = next(_sequence)
+        response = client.post(f"{API}/", json={
+            "name": f"pricing-test-{n}", "code": f"PRC{n:04d}", "category": category, "price": price, "cost": cost,
+        })
+        assert response.status_code == 200, response.text
+        products.append(response.json())
+    return products
+
+def _price(client, product_id: int) -> tuple[float, float]:
+    product = client.get(f"{API}/{product_id}").json()
+    return product["price"], product["cost"]
+
+def test_bulk_update_by_category(client):
+    products = _create_products(client, 3, "pricing-category")
+    _create_products(client, 1, "pricing-other")
+
+    response = client.post(f"{API}/bulk-update", json={
+        "filter": {"category": "pricing-category"},
+        "price": {"mode": "percent", "value": 10},
+        "cost": {"mode": "absolute", "value": -1.5},
+    })
+    assert response.status_code == 200, response.text
+    assert response.json() == {"matched": 3, "updated": 3, "unknown": []}
+    for product in products:
+        assert _price(client, product["id"]) == (11.0, 3.5)
+
+def test_bulk_update_by_ids(client):
+    products = _create_products(client, 3, "pricing-ids")
+    ids = [products[0]["id"], products[2]["id"], 999999]
+
+    response = client.post(f"{API}/bulk-update", json={"filter": {"ids": ids}, "price": {"mode": "set", "value": 7}})
+    assert response.status_code == 200, response.text
+    assert response.json()["matched"] == 2
+    assert response.json()["updated"] == 2
+    assert _price(client, products[1]["id"])[0] == 10.0
+
+    # 价格没有变化的商品不计入updated
+    response = client.post(f"{API}/bulk-update", json={"filter": {"ids": ids}, "price": {"mode": "set", "value": 7}})
+    assert response.json()["updated"] == 0
+
+def test_bulk_update_rejects_empty_ids(client):
+    response = client.post(f"{API}/bulk-update", json={"filter": {"ids": []}, "price": {"mode": "set", "value": 1}})
+    assert response.status_code == 422
+
+def test_bulk_update_requires_filter(client):
+    response = client.post(f"{API}/bulk-update", json={"filter": {}, "price": {"mode": "set", "value": 1}})
+    assert response.status_code == 400
+
+def test_price_list(client):
+    products = _create_products(client, 2, "pricing-list")
+
+    response = client.post(f"{API}/price-list", json={"items": [
+        {"product_id": products[0]["id"], "price": 12.5},
+        {"product_code": products[1]["code"], "cost": 4},
+        {"product_code": "NO-SUCH-CODE", "price": 1},
+    ]})
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["matched"] == 2
+    assert result["updated"] == 2
+    assert [item["product_code"] for item in result["unknown"]] == ["NO-SUCH-CODE"]
+    assert _price(client, products[0]["id"]) == (12.5, 5.0)
+    assert _price(client, products[1]["id"]) == (10.0, 4.0)
+
+def test_price_list_rejects_duplicates(client):
+    product = _create_products(client, 1, "pricing-duplicate")[0]
+
+    response = client.post(f"{API}/price-list", json={"items": [
+        {"product_id": product["id"], "price": 1},
+        {"product_code": product["code"], "price": 2},
+    ]})
+    assert response.status_code == 400
+    assert _price(client, product["id"])[0] == 10.0
@@ -0,0 +1,66 @@
+"""
+预留接口测试：确认写入库存与预留之间的可承诺量计算
+"""
+import asyncio
+import itertools
+from app.crud import reservation as reservation_crud
+from conftest import TestingSessionLocal
+
+_sequence = itertools.count(1)
+
+def _create_stocked_product(client, quantity: int) -> int:
+    n = next(_sequence)
+    response = client.post("/api/v1/products/", json={"name": f"reservation-test-{n}", "code": f"RSV{n:04d}"})
+    assert response.status_code == 200, response.text
+    product_id = response.json()["id"]
+    response = client.put(f"/api/v1/products/inventories/{product_id}/inbound", params={"quantity": quantity})
+    assert response.status_code == 200, response.text
+    return product_id
+
+def _reserve(client, product_id: int, quantity: int):
+    return client.post("/api/v1/reservations/", json={"product_id": product_id, "quantity": quantity})
+
+def _available(client, product_id: int) -> int:
+    return client.get(f"/api/v1/reservations/availability/{product_id}").json()["available"]
+
+def test_confirmed_reservation_counts_until_flushed(client, monkeypatch):
+    monkeypatch.setattr(reservation_crud, "AsyncSessionLocal", TestingSessionLocal)
+    product_id = _create_stocked_product(client, 10)
+
+    response = _reserve(client, product_id, 6)
+    assert response.status_code == 200, response.text
+    assert client.post(f"/api/v1/reservations/{response.json()['id']}/confirm").status_code == 200
+    assert _available(client, product_id) == 4
+
+    # 确认的数量写入库存后不再单独扣除，可承诺量不变
+    assert asyncio.run(reservation_crud.flush_confirmed_reservations()) == 1
+    availability = client.get(f"/api/v1/reservations/availability/{product_id}").json()
+    assert availability == {"product_id": product_id, "on_hand": 4, "available": 4}
+
+def test_flush_between_read_and_reserve(client, monkeypatch):
+    monkeypatch.setattr(reservation_crud, "AsyncSessionLocal", TestingSessionLocal)
+    product_id = _create_stocked_product(client, 10)
+    response = _reserve(client, product_id, 6)
+    assert client.post(f"/api/v1/reservations/{response.json()['id']}/confirm").status_code == 200
+
+    # 读取库存数量（确认尚未写入，为10）之后、预留之前，确认写入库存（变为4）并移出待写入队列
+    get_on_hand = reservation_crud._get_on_hand_async
+    reads = []
+
+    async def get_on_hand_then_flush(db, product_id):
+        on_hand = await get_on_hand(db, product_id)
+        reads.append(on_hand)
+        if len(reads) == 1:
+            assert await reservation_crud.flush_confirmed_reservations() == 1
+        return on_hand
+
+    monkeypatch.setattr(reservation_crud, "_get_on_hand_async", get_on_hand_then_flush)
+    # 按读到的10减去已不再计入的确认数量，可承诺量会被高估为10
+    response = _reserve(client, product_id, 5)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Insufficient available stock"
+    assert reads == [10, 4]
+
+    response = _reserve(client, product_id, 4)
+    assert response.status_code == 200, response.text
+    assert response.json()["available"] == 0
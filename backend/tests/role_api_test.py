@@ -0,0 +1,80 @@
+"""
+角色接口测试：角色权限同步和批量设置用户角色
+"""
+import asyncio
+import itertools
+from sqlmodel import select
+from app.models.role import RolePermission
+from conftest import TestingSessionLocal
+
+_sequence = itertools.count(1)
+
+def _create_permissions(client, count: int) -> list[int]:
+    ids = []
+    for _ in range(count):
+        response = client.post("/api/v1/permissions/", json={"name": f"role-test:permission-{next(_sequence)}"})
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+def _create_user(client) -> int:
+    n = next(_sequence)
+    response = client.post("/api/v1/users/", json={
+        "username": f"role-test-user-{n}", "email": f"role-test-user-{n}@example.com", "password": "password",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+def _role_permissions(role_id: int) -> set[int]:
+    async def load():
+        async with TestingSessionLocal() as db:
+            statement = select(RolePermission.permission_id).where(RolePermission.role_id == role_id)
+            return set((await db.execute(statement)).scalars().all())
+    return asyncio.run(load())
+
+def test_role_permission_sync(client):
+    p1, p2, p3 = _create_permissions(client, 3)
+    response = client.post("/api/v1/roles/", json={"name": f"role-test-{next(_sequence)}", "permission_ids": [p1, p2]})
+    assert response.status_code == 200, response.text
+    role_id = response.json()["id"]
+    assert _role_permissions(role_id) == {p1, p2}
+
+    # 不存在的权限ID被忽略
+    response = client.put(f"/api/v1/roles/{role_id}", json={"permission_ids": [p2, p3, 999999]})
+    assert response.status_code == 200, response.text
+    assert _role_permissions(role_id) == {p2, p3}
+
+    # 不提供permission_ids时权限不变
+    response = client.put(f"/api/v1/roles/{role_id}", json={"description": "updated"})
+    assert response.status_code == 200, response.text
+    assert response.json()["description"] == "updated"
+    assert _role_permissions(role_id) == {p2, p3}
+
+    response = client.put(f"/api/v1/roles/{role_id}", json={"permission_ids": []})
+    assert response.status_code == 200, response.text
+    assert _role_permissions(role_id) == set()
+
+def test_assign_role_to_users(client):
+    response = client.post("/api/v1/roles/", json={"name": f"role-test-{next(_sequence)}"})
+    role_id = response.json()["id"]
+    user_ids = [_create_user(client) for _ in range(2)]
+
+    response = client.put(f"/api/v1/roles/{role_id}/users", json={"user_ids": [*user_ids, 999999]})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"matched": 2, "updated": 2}
+    for user_id in user_ids:
+        assert client.get(f"/api/v1/users/{user_id}").json()["role_id"] == role_id
+
+    # 已经是该角色的用户不计入updated
+    response = client.put(f"/api/v1/roles/{role_id}/users", json={"user_ids": user_ids})
+    assert response.json() == {"matched": 2, "updated": 0}
+
+def test_assign_role_validation(client):
+    user_id = _create_user(client)
+
+    response = client.put("/api/v1/roles/999999/users", json={"user_ids": [user_id]})
+    assert response.status_code == 404
+
+    response = client.post("/api/v1/roles/", json={"name": f"role-test-{next(_sequence)}"})
+    response = client.put(f"/api/v1/roles/{response.json()['id']}/users", json={"user_ids": []})
+    assert response.status_code == 422
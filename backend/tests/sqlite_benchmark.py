@@ -0,0 +1,134 @@
+"""
+SQLite部署模式基准测试
+对比默认配置（共享QueuePool、无PRAGMA）与调优配置（WAL、单写连接+读连接池）下的并发出入库吞吐量
+
+运行方式（在backend目录下）：
+    python -m tests.sqlite_benchmark --workers 50 --movements 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("APP_DEBUG", "True")
+
+from sqlmodel import SQLModel
+from app.core.database import create_db_engine, _create_session_factory
+from app.crud.product import get_inventory_by_product_async, update_inventory_quantity_async
+from app.models.product import Product, Inventory, Warehouse  # noqa: F401  注册表结构
+
+NUM_PRODUCTS = 20  # 参与测试的商品数
+INITIAL_QUANTITY = 100000  # 初始库存，保证出库不会因库存不足失败
+
+async def _prepare(engine):
+    """创建表结构并写入初始商品和库存"""
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_factory = _create_session_factory(engine)
+    async with session_factory() as db:
+        for i in range(1, NUM_PRODUCTS + 1):
+            db.add(Product(id=i, name=f"bench-{i}", code=f"BENCH-{i:04d}"))
+        await db.flush()
+        for i in range(1, NUM_PRODUCTS + 1):
+            db.add(Inventory(product_id=i, quantity=INITIAL_QUANTITY))
+        await db.commit()
+
+async def _run(write_factory, read_factory, workers: int, movements: int, reads: int) -> dict:
+    """并发执行出入库和查询，返回吞吐量统计"""
+    errors: dict[str, int] = {}
+    completed = 0
+    rng = random.Random(42)
+
+    async def movement_worker():
+        nonlocal completed
+        for _ in range(movements):
+            product_id = rng.randint(1, NUM_PRODUCTS)
+            change = rng.choice((1, -1))
+            try:
+                async with write_factory() as db:
+                    await update_inventory_quantity_async(db, product_id, change)
+                    await db.commit()
+                completed += 1
+            except Exception as e:
+                name = type(e).__name__
+                errors[name] = errors.get(name, 0) + 1
+
+    async def read_worker():
+        for _ in range(reads):
+            try:
+                async with read_factory() as db:
+                    await get_inventory_by_product_async(db, rng.randint(1, NUM_PRODUCTS))
+            except Exception as e:
+                name = type(e).__name__
+                errors[name] = errors.get(name, 0) + 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(
+        *(movement_worker() for _ in range(workers)),
+        *(read_worker() for _ in range(workers // 2)),
+    )
+    elapsed = time.perf_counter() - start_time
+    return {
+        "movements": completed,
+        "elapsed": elapsed,
+        "throughput": completed / elapsed if elapsed else 0.0,
+        "errors": errors,
+    }
+
+async def bench_default(path: str, args) -> dict:
+    """默认配置：读写共用 pool_size=10/max_overflow=20 的连接池，不设置PRAGMA"""
+    engine = create_db_engine(f"sqlite:///{path}", tuned=False, echo=False)
+    await _prepare(engine)
+    session_factory = _create_session_factory(engine)
+    try:
+        return await _run(session_factory, session_factory, args.workers, args.movements, args.reads)
+    finally:
+        await engine.dispose()
+
+async def bench_tuned(path: str, args) -> dict:
+    """调优配置：WAL + 单写连接 + 独立读连接池"""
+    writer = create_db_engine(f"sqlite:///{path}", pool_size=1, max_overflow=0, echo=False)
+    reader = create_db_engine(f"sqlite:///{path}", pool_size=8, max_overflow=0, echo=False)
+    await _prepare(writer)
+    try:
+        return await _run(
+            _create_session_factory(writer), _create_session_factory(reader),
+            args.workers, args.movements, args.reads,
+        )
+    finally:
+        await writer.dispose()
+        await reader.dispose()
+
+def _print_result(title: str, result: dict):
+    print(f"{title}:")
+    print(f"  成功出入库: {result['movements']}")
+    print(f"  耗时: {result['elapsed']:.2f}s")
+    print(f"  吞吐量: {result['throughput']:.1f} 次/秒")
+    print(f"  错误: {result['errors'] or '无'}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="SQLite并发出入库基准测试")
+    parser.add_argument("--workers", type=int, default=50, help="并发出入库协程数")
+    parser.add_argument("--movements", type=int, default=20, help="每个协程的出入库次数")
+    parser.add_argument("--reads", type=int, default=20, help="每个读协程的查询次数")
+    args = parser.parse_args()
+
+    print(f"并发数 {args.workers}，每个协程 {args.movements} 次出入库")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        default_result = await bench_default(os.path.join(tmpdir, "default.db"), args)
+        tuned_result = await bench_tuned(os.path.join(tmpdir, "tuned.db"), args)
+
+    _print_result("默认配置", default_result)
+    _print_result("调优配置", tuned_result)
+    if default_result["throughput"]:
+        print(f"吞吐量提升: {tuned_result['throughput'] / default_result['throughput']:.2f}x")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+盘点接口测试：按盘点表核对差异并调整库存（包括新建库存和分片库存的重新分配）
+"""
+import asyncio
+import itertools
+from sqlmodel import select
+from app.models.product import InventoryShard
+from conftest import TestingSessionLocal
+
+API = "/api/v1/products"
+_sequence = itertools.count(1)
+
+def _create_product(client, cost: float = 2.0) -> dict:
+    n = next(_sequence)
+    response = client.post(f"{API}/", json={"name": f"stocktake-test-{n}", "code": f"STK{n:04d}", "price": 5, "cost": cost})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def _create_warehouse(client) -> int:
+    response = client.post(f"{API}/warehouses", json={"name": f"stocktake-test-warehouse-{next(_sequence)}"})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+def _create_inventory(client, product_id: int, warehouse_id: int | None, quantity: int) -> int:
+    response = client.post(f"{API}/inventories", json={"product_id": product_id, "warehouse_id": warehouse_id, "quantity": quantity})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+def _quantity(client, inventory_id: int) -> int:
+    return client.get(f"{API}/inventories/{inventory_id}").json()["quantity"]
+
+def _submit(client, sheet: str, dry_run: bool = False):
+    return client.post("/api/v1/stocktakes/", content=sheet.encode(), params={"dry_run": dry_run})
+
+def _shards(inventory_id: int) -> list[int]:
+    async def load():
+        async with TestingSessionLocal() as db:
+            statement = select(InventoryShard.quantity).where(InventoryShard.inventory_id == inventory_id).order_by(InventoryShard.shard)
+            return list((await db.execute(statement)).scalars().all())
+    return asyncio.run(load())
+
+def test_product_code_lookup(client):
+    product = _create_product(client)
+    warehouse_id = _create_warehouse(client)
+    inventory_id = _create_inventory(client, product["id"], warehouse_id, 10)
+
+    response = _submit(client, f"product_code,warehouse_id,quantity\n{product['code']},{warehouse_id},7\n")
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["applied"] is True
+    assert report["counted"] == 1
+    assert report["quantity_loss"] == 3
+    assert report["loss_value"] == 6.0
+    assert report["variances"] == [{
+        "product_id": product["id"], "product_code": product["code"], "warehouse_id": warehouse_id,
+        "inventory_id": inventory_id, "system_quantity": 10, "counted_quantity": 7, "variance": -3, "variance_value": -6.0,
+    }]
+    assert _quantity(client, inventory_id) == 7
+
+def test_unknown_lines_skipped(client):
+    product = _create_product(client)
+    inventory_id = _create_inventory(client, product["id"], None, 4)
+
+    sheet = (
+        "product_id,product_code,warehouse_id,quantity\n"
+        f"{product['id']},,,5\n"
+        ",NO-SUCH-CODE,,1\n"
+        "999999,,,1\n"
+        f"{product['id']},,999999,1\n"
+    )
+    response = _submit(client, sheet)
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["lines"] == 4
+    assert report["counted"] == 1
+    assert [(line["line"], line["reason"]) for line in report["skipped"]] == [
+        (3, "Product not found"), (4, "Product not found"), (5, "Warehouse not found"),
+    ]
+    assert report["skipped"][0]["product_code"] == "NO-SUCH-CODE"
+    assert _quantity(client, inventory_id) == 5
+
+def test_duplicate_lines_rejected(client):
+    product = _create_product(client)
+    warehouse_id = _create_warehouse(client)
+    inventory_id = _create_inventory(client, product["id"], warehouse_id, 10)
+
+    # 同一商品分别按ID和编码出现，按编码补全ID后重复
+    sheet = f"product_id,product_code,warehouse_id,quantity\n{product['id']},,{warehouse_id},1\n,{product['code']},{warehouse_id},2\n"
+    response = _submit(client, sheet)
+    assert response.status_code == 400
+    assert "counted twice" in response.json()["detail"]
+    assert _quantity(client, inventory_id) == 10
+
+def test_dry_run_leaves_inventory_unchanged(client):
+    product = _create_product(client)
+    inventory_id = _create_inventory(client, product["id"], None, 10)
+    other = _create_product(client)
+
+    response = _submit(client, f"product_id,quantity\n{product['id']},12\n{other['id']},3\n", dry_run=True)
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["applied"] is False
+    assert report["quantity_gain"] == 5
+    # 试算不新建库存，新库存的ID为空
+    assert {row["product_id"]: row["inventory_id"] for row in report["variances"]} == {product["id"]: inventory_id, other["id"]: None}
+    assert _quantity(client, inventory_id) == 10
+    assert client.get(f"/api/v1/reservations/availability/{other['id']}").json()["on_hand"] == 0
+
+def test_missing_inventory_created(client):
+    product = _create_product(client)
+    warehouse_id = _create_warehouse(client)
+    empty = _create_product(client)
+
+    response = _submit(client, f"product_id,warehouse_id,quantity\n{product['id']},{warehouse_id},6\n{empty['id']},,0\n")
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["adjusted"] == 1
+    assert report["unchanged"] == 1
+    created = report["variances"][0]
+    assert created["system_quantity"] == 0
+    assert created["counted_quantity"] == 6
+
+    inventory = client.get(f"{API}/inventories/{created['inventory_id']}").json()
+    assert (inventory["product_id"], inventory["warehouse_id"], inventory["quantity"]) == (product["id"], warehouse_id, 6)
+    # 盘点数量为0的行不新建库存
+    assert client.get(f"/api/v1/reservations/availability/{empty['id']}").json()["on_hand"] == 0
+
+def test_sharded_inventory_redistributed(client):
+    product = _create_product(client)
+    inventory_id = _create_inventory(client, product["id"], None, 10)
+    response = client.put(f"{API}/inventories/{inventory_id}/shards", params={"count": 4})
+    assert response.status_code == 200, response.text
+    assert _shards(inventory_id) == [3, 3, 2, 2]
+
+    response = _submit(client, f"product_id,quantity\n{product['id']},21\n")
+    assert response.status_code == 200, response.text
+    assert response.json()["variances"][0]["variance"] == 11
+    # 盘点数量重新平均分配到各分片
+    assert _shards(inventory_id) == [6, 5, 5, 5]
+    assert _quantity(client, inventory_id) == 21
@@ -0,0 +1,52 @@
+"""
+请求级工作单元测试：事务在响应发送前提交，提交失败时客户端收到500
+"""
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.v1 import users, roles, permissions, auth, products, reservations, stream, changes, metrics, reports, jobs, stocktakes
+from app.core.database import get_async_db
+from app.main import app
+
+_ROUTERS = [
+    module.router for module in
+    (users, roles, permissions, auth, products, reservations, stream, changes, metrics, reports, jobs, stocktakes)
+]
+
+def _dependants(dependant):
+    for sub_dependant in dependant.dependencies:
+        yield sub_dependant
+        yield from _dependants(sub_dependant)
+
+def test_write_sessions_are_function_scoped():
+    """所有写会话依赖都是函数级的，请求级依赖的退出在响应发送之后"""
+    checked = 0
+    for router in _ROUTERS:
+        for route in router.routes:
+            if not isinstance(route, APIRoute):
+                continue
+            for dependant in _dependants(route.dependant):
+                if dependant.call is get_async_db:
+                    assert dependant.scope == "function", f"{route.path} uses a request-scoped get_async_db"
+                    checked += 1
+    assert checked
+
+def test_failed_commit_returns_500(client, monkeypatch):
+    async def failing_commit(self):
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(AsyncSession, "commit", failing_commit)
+    response = TestClient(app, raise_server_exceptions=False).post(
+        "/api/v1/products/", json={"name": "uow-failed-commit", "code": "UOW0001"}
+    )
+    assert response.status_code == 500
+    monkeypatch.undo()
+
+    # 回滚的商品不存在
+    response = client.get("/api/v1/products/", params={"limit": 1000})
+    assert all(product["code"] != "UOW0001" for product in response.json())
+
+def test_committed_before_response(client):
+    response = client.post("/api/v1/products/", json={"name": "uow-committed", "code": "UOW0002"})
+    assert response.status_code == 200, response.text
+    assert client.get(f"/api/v1/products/{response.json()['id']}").status_code == 200
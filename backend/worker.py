@@ -0,0 +1,46 @@
+# 后台任务工作进程：从Redis队列领取并执行任务，与API工作进程分开部署，长任务不占用请求处理能力
+import argparse
+import asyncio
+import signal
+from app.core.config import settings
+from app.core.cache import cache
+from app.core.database import async_close_db
+from app.core.logger import logger
+from app.core import redis as redis_core
+from app.jobs import handlers  # noqa: F401  注册任务类型
+from app.jobs.registry import concurrency_limits
+from app.jobs.runner import JobRunner
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="IMS后台任务工作进程")
+    parser.add_argument("--slots", type=int, default=settings.job_worker_slots, help="同时执行的最大任务数")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="收到SIGTERM后等待执行中任务完成的时间（秒）")
+    return parser.parse_args()
+
+async def run(args: argparse.Namespace):
+    await redis_core.init_redis_pool()
+    runner = JobRunner(max(1, args.slots))
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    runner.start()
+    limits = ", ".join(f"{name}={limit}" for name, limit in concurrency_limits().items())
+    logger.info(f"Job worker started with {runner.slots} slots ({limits})")
+    await stopping.wait()
+
+    # 停止领取新任务，等待执行中的任务完成后释放连接
+    logger.info("Job worker stopping")
+    await runner.stop(timeout=args.graceful_timeout)
+    await cache.close()
+    await async_close_db()
+    await redis_core.close_redis_pool()
+
+def main():
+    if settings.job_backend != "redis":
+        raise SystemExit("worker.py requires JOB_BACKEND=redis (local jobs run inside the API process)")
+    asyncio.run(run(parse_args()))
+
+if __name__ == "__main__":
+    main()